@@ -7,20 +7,15 @@ descriptions that explain what the BPMN model represents.
 """
 
 import xml.etree.ElementTree as ET
+import asyncio
 import json
 import os
 from typing import Dict, List, Set, Optional, Any
-from utils.agent import generate_prompt_from_config
+from utils.agent import generate_prompt_from_config, generate_prompt_from_config_async
+from utils.batch import run_batch
 from utils.configure import get_workplace, get_verification_config_path, get_output_file_name
 
 
-# Configuration paths loaded from configure.yml
-REQUIREMENT_CONFIG_PATH = get_verification_config_path(
-    "REQUIREMENT_CONFIG_PATH") or "benchmark/config/requirement.json"
-REQUIREMENT_OUTPUT_FILE = get_output_file_name(
-    "REQUIREMENT_OUTPUT_FILE") or "requirement_description.json"
-
-
 def detect_bpmn_type(bpmn_xml_content: str) -> str:
     """
     Detect whether the BPMN model is a collaboration diagram or process diagram.
@@ -328,7 +323,34 @@ def generate_requirement_description(bpmn_structure: Dict[str, Any]) -> Dict[str
     }
 
     # Generate requirement description using agent
-    result = generate_prompt_from_config(REQUIREMENT_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_verification_config_path("REQUIREMENT_CONFIG_PATH"), input_vars)
+
+    # Extract the output
+    extracted_output = result.get('extracted_output', {})
+
+    # Save full results for debugging
+    save_requirement_result(result, "requirement_generation")
+
+    return extracted_output
+
+
+async def generate_requirement_description_async(bpmn_structure: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate requirement description using LLM without blocking the event loop.
+
+    Args:
+        bpmn_structure: Dictionary containing BPMN structural information
+
+    Returns:
+        Dictionary containing requirement description
+    """
+    # Prepare input variables for LLM
+    input_vars = {
+        "BPMN_STRUCTURE": json.dumps(bpmn_structure, ensure_ascii=False, indent=2)
+    }
+
+    # Generate requirement description using agent
+    result = await generate_prompt_from_config_async(get_verification_config_path("REQUIREMENT_CONFIG_PATH"), input_vars)
 
     # Extract the output
     extracted_output = result.get('extracted_output', {})
@@ -348,7 +370,7 @@ def save_requirement_result(result: Dict[str, Any], operation: str):
         operation: Operation description
     """
     workplace = get_workplace()
-    output_file = os.path.join(workplace, REQUIREMENT_OUTPUT_FILE)
+    output_file = os.path.join(workplace, get_output_file_name("REQUIREMENT_OUTPUT_FILE"))
 
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -445,6 +467,119 @@ def process_bpmn_directory(directory_path: str) -> List[Dict[str, Any]]:
     return results
 
 
+async def process_bpmn_file_async(bpmn_file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Process a single BPMN file to generate requirement description asynchronously.
+
+    Args:
+        bpmn_file_path: Path to BPMN file
+
+    Returns:
+        Dictionary containing requirement description and structure
+    """
+    # Load BPMN content
+    bpmn_xml_content = load_bpmn_from_file(bpmn_file_path)
+    if not bpmn_xml_content:
+        return None
+
+    # Extract structure
+    bpmn_structure = extract_bpmn_structure(bpmn_xml_content)
+
+    # Generate requirement description
+    try:
+        requirement_description = await generate_requirement_description_async(bpmn_structure)
+    except ValueError as e:
+        print(f"Requirement generation failed for {bpmn_file_path}: {e}")
+        return None
+
+    return {
+        'bpmn_file': bpmn_file_path,
+        'bpmn_structure': bpmn_structure,
+        'requirement_description': requirement_description
+    }
+
+
+async def process_bpmn_directory_async(directory_path: str) -> List[Dict[str, Any]]:
+    """
+    Process all BPMN files in a directory with concurrent LLM calls.
+
+    The number of requests in flight is bounded by LLM.MAX_CONCURRENCY.
+
+    Args:
+        directory_path: Path to directory containing BPMN files
+
+    Returns:
+        List of results for each BPMN file
+    """
+    try:
+        file_paths = [
+            os.path.join(directory_path, filename)
+            for filename in sorted(os.listdir(directory_path))
+            if filename.endswith('.bpmn') or filename.endswith('.xml')
+        ]
+    except Exception as e:
+        print(f"Error processing directory {directory_path}: {e}")
+        return []
+
+    results = await asyncio.gather(
+        *(process_bpmn_file_async(file_path) for file_path in file_paths))
+    return [result for result in results if result]
+
+
+def process_bpmn_directory_batch(directory_path: str, job_name: str = "requirement") -> List[Dict[str, Any]]:
+    """
+    Process all BPMN files in a directory as one offline batch job.
+
+    All requirement prompts are submitted together through the BATCH backend
+    configured in configure.yml and each answer is mapped back to its BPMN file.
+    Re-running with the same files resumes the submitted job.
+
+    Args:
+        directory_path: Path to directory containing BPMN files
+        job_name: Name of the batch job files under BATCH.JOB_DIR
+
+    Returns:
+        List of results for each BPMN file
+    """
+    try:
+        filenames = [
+            filename for filename in sorted(os.listdir(directory_path))
+            if filename.endswith('.bpmn') or filename.endswith('.xml')
+        ]
+    except Exception as e:
+        print(f"Error processing directory {directory_path}: {e}")
+        return []
+
+    structures = {}
+    for filename in filenames:
+        bpmn_xml_content = load_bpmn_from_file(os.path.join(directory_path, filename))
+        if bpmn_xml_content:
+            # The file name is the batch custom_id
+            structures[filename] = extract_bpmn_structure(bpmn_xml_content)
+
+    items = [
+        (filename, get_verification_config_path("REQUIREMENT_CONFIG_PATH"),
+         {"BPMN_STRUCTURE": json.dumps(bpmn_structure, ensure_ascii=False, indent=2)})
+        for filename, bpmn_structure in structures.items()
+    ]
+    if not items:
+        return []
+    batch_results = run_batch(items, job_name)
+
+    results = []
+    for filename, bpmn_structure in structures.items():
+        result = batch_results[filename]
+        if 'error' in result:
+            print(f"Requirement generation failed for {filename}: {result['error']}")
+            continue
+        results.append({
+            'bpmn_file': os.path.join(directory_path, filename),
+            'bpmn_structure': bpmn_structure,
+            'requirement_description': result.get('extracted_output', {})
+        })
+    return results
+
+
 if __name__ == '__main__':
     try:
         print("Starting BPMN requirement description generation...")
@@ -460,7 +595,7 @@ if __name__ == '__main__':
                 print(json.dumps(
                     result['requirement_description'], ensure_ascii=False, indent=2))
                 print(
-                    f"Results saved to: {get_workplace()}/{REQUIREMENT_OUTPUT_FILE}")
+                    f"Results saved to: {get_workplace()}/{get_output_file_name('REQUIREMENT_OUTPUT_FILE')}")
             else:
                 print("Requirement generation failed")
         else:
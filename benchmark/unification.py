@@ -10,23 +10,10 @@ import xml.etree.ElementTree as ET
 import json
 import os
 from utils.agent import generate_prompt_from_config
-from utils.configure import get_workplace
+from utils.configure import get_workplace, get_verification_config_path, get_output_file_name
 from utils.dump import get_data_from_file_or_generate, save_result
 
 
-# Configuration paths loaded from configure.yml
-from utils.configure import get_verification_config_path, get_output_file_name
-
-UNIFICATION_CONFIG_PATH = get_verification_config_path(
-    "UNIFICATION_CONFIG_PATH") or "benchmark/config/unification.json"
-UNIFICATION_OUTPUT_FILE = get_output_file_name(
-    "UNIFICATION_OUTPUT_FILE") or "unification_output.json"
-BENCHMARK_SYMBOL_OUTPUT_FILE = get_output_file_name(
-    "BENCHMARK_SYMBOL_OUTPUT_FILE") or "benchmark_symbol_output.json"
-TARGET_SYMBOL_OUTPUT_FILE = get_output_file_name(
-    "TARGET_SYMBOL_OUTPUT_FILE") or "target_symbol_output.json"
-
-
 def validate_mapping_quality(extracted_output):
     """
     Validate the quality of mappings in the extracted output.
@@ -81,7 +68,7 @@ def get_unification_data():
     Returns:
         Dictionary containing unification data
     """
-    return get_data_from_file_or_generate(UNIFICATION_OUTPUT_FILE, generate_unification, "unification data")
+    return get_data_from_file_or_generate(get_output_file_name("UNIFICATION_OUTPUT_FILE"), generate_unification, "unification data")
 
 
 def generate_unification(bench_symbol_data=None, target_symbol_data=None):
@@ -99,7 +86,7 @@ def generate_unification(bench_symbol_data=None, target_symbol_data=None):
     if bench_symbol_data is None:
         workplace = get_workplace()
         bench_file_path = os.path.join(
-            workplace, BENCHMARK_SYMBOL_OUTPUT_FILE)
+            workplace, get_output_file_name("BENCHMARK_SYMBOL_OUTPUT_FILE"))
         try:
             with open(bench_file_path, 'r', encoding='utf-8') as f:
                 bench_symbol_data = json.load(f)
@@ -110,7 +97,7 @@ def generate_unification(bench_symbol_data=None, target_symbol_data=None):
 
     if target_symbol_data is None:
         workplace = get_workplace()
-        target_file_path = os.path.join(workplace, TARGET_SYMBOL_OUTPUT_FILE)
+        target_file_path = os.path.join(workplace, get_output_file_name("TARGET_SYMBOL_OUTPUT_FILE"))
         try:
             with open(target_file_path, 'r', encoding='utf-8') as f:
                 target_symbol_data = json.load(f)
@@ -121,12 +108,12 @@ def generate_unification(bench_symbol_data=None, target_symbol_data=None):
 
     # Prepare input variables
     input_vars = {
-        "BENCHSYMBOL": json.dumps(bench_symbol_data, ensure_ascii=False, indent=2),
-        "TARGETSYMBOL": json.dumps(target_symbol_data, ensure_ascii=False, indent=2)
+        "BENCHSYMBOL": bench_symbol_data,
+        "TARGETSYMBOL": target_symbol_data
     }
 
     # Generate unification output using agent
-    result = generate_prompt_from_config(UNIFICATION_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_verification_config_path("UNIFICATION_CONFIG_PATH"), input_vars)
 
     # Extract the output
     extracted_output = result.get('extracted_output', {})
@@ -135,7 +122,7 @@ def generate_unification(bench_symbol_data=None, target_symbol_data=None):
     extracted_output = validate_mapping_quality(extracted_output)
 
     # Save full results for debugging
-    save_result(result, UNIFICATION_OUTPUT_FILE, "Unification generation")
+    save_result(result, get_output_file_name("UNIFICATION_OUTPUT_FILE"), "Unification generation")
 
     print("Extracted output:")
     print(json.dumps(extracted_output, ensure_ascii=False, indent=2))
@@ -363,7 +350,7 @@ def unify_bpmn_models(bench_symbol_file=None, target_bpmn_file=None, bench_symbo
         if bench_symbol_file is None:
             workplace = get_workplace()
             bench_symbol_file = os.path.join(
-                workplace, BENCHMARK_SYMBOL_OUTPUT_FILE)
+                workplace, get_output_file_name("BENCHMARK_SYMBOL_OUTPUT_FILE"))
 
         try:
             with open(bench_symbol_file, 'r', encoding='utf-8') as f:
@@ -0,0 +1,332 @@
+"""
+Run the generation pipeline for many requirements.
+
+Requirements are read from JSONL files (one object per line) or CSV files,
+e.g. the business_scenario/LTC rows of benchmark/dataset/GitHub/raw/test-XX/*.csv.
+Each requirement becomes a job with its own workplace, <RUNS_DIR>/<job id>/,
+holding its req.txt, every pipeline output, the pipeline log and, with
+TELEMETRY.ENABLED, the telemetry of its LLM calls (stamped with the job id as
+run id). Up to
+PIPELINE.BATCH_JOBS pipelines run at once on threads of this process, each
+inside a utils.workspace scope pointing at its job directory, so jobs never
+overwrite each other's outputs while sharing the warm LLM client, rate
+limiter and caches. Everything a job prints goes to its pipeline.log.
+Progress is printed as jobs finish, and a summary of throughput, job
+durations and failures is printed and written to <RUNS_DIR>/summary.json.
+
+Rerunning a batch into the same directory is incremental per job (see
+generation/pipeline.py): unchanged jobs make no LLM calls.
+
+Usage:
+    python -m generation.batch requirements.jsonl
+    python -m generation.batch benchmark/dataset/GitHub/raw/test-01/1.csv --id-field business_model_idx --limit 20 --jobs 4
+"""
+
+import argparse
+import contextvars
+import csv
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.configure import get_pipeline_config
+from utils.hedge import print_hedge_stats
+from utils.scheduler import StageError
+from utils.telemetry import percentile
+from utils.tokens import print_token_usage
+from utils.workspace import workspace
+from generation.pipeline import run_pipeline
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fields making up the requirement text, the first group present in a row is used
+DEFAULT_TEXT_FIELDS = (('requirement',), ('business_scenario', 'LTC'))
+
+# Log file of the job running in the current context
+_JOB_LOG: contextvars.ContextVar = contextvars.ContextVar('batch_job_log', default=None)
+
+
+class _ContextStdout:
+    """
+    sys.stdout replacement sending output to the log of the job running in
+    the current context, and everything else to the original stream
+
+    Background threads started by a job (e.g. a hedged request that lost) can
+    outlive it; once the job's log is closed their output goes to the
+    original stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _target(self):
+        log = _JOB_LOG.get()
+        return log if log is not None and not log.closed else self.stream
+
+    def write(self, text):
+        target = self._target()
+        try:
+            return target.write(text)
+        except ValueError:
+            # The job closed its log since _target() checked it
+            if target is self.stream:
+                raise
+            return self.stream.write(text)
+
+    def flush(self):
+        target = self._target()
+        try:
+            target.flush()
+        except ValueError:
+            if target is self.stream:
+                raise
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _read_rows(path: str) -> Iterable[Dict[str, Any]]:
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Error:{path}:{line_number}: {e}")
+                continue
+            yield row if isinstance(row, dict) else {'requirement': row}
+
+
+def _requirement_text(row: Dict[str, Any], text_fields: Optional[List[str]]) -> str:
+    groups = [text_fields] if text_fields else DEFAULT_TEXT_FIELDS
+    for fields in groups:
+        if all(row.get(field) for field in fields):
+            return '\n'.join(str(row[field]).strip() for field in fields)
+    return ''
+
+
+def _slug(value: Any) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', str(value)).strip('-')[:60]
+
+
+def read_requirements(paths: List[str], text_fields: Optional[List[str]] = None,
+                      id_field: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Read requirements from JSONL or CSV files.
+
+    Args:
+        paths: Input files, .csv files are read as CSV and all others as JSONL
+        text_fields: Fields joined into the requirement text (default: 'requirement',
+            or 'business_scenario' and 'LTC')
+        id_field: Field appended to the job number to name the job directory
+        limit: Maximum number of requirements
+
+    Returns:
+        List of jobs with 'id', 'requirement' and 'source'
+    """
+    jobs = []
+    for path in paths:
+        for row_number, row in enumerate(_read_rows(path), 1):
+            if limit is not None and len(jobs) >= limit:
+                return jobs
+            requirement = _requirement_text(row, text_fields)
+            if not requirement:
+                print(f"Warning: no requirement text in {path} row {row_number}, skipped")
+                continue
+            job_id = f"{len(jobs) + 1:04d}"
+            if id_field and row.get(id_field):
+                job_id = f"{job_id}_{_slug(row[id_field])}"
+            jobs.append({'id': job_id, 'requirement': requirement, 'source': f"{path}:{row_number}"})
+    return jobs
+
+
+def run_job(job: Dict[str, Any], runs_dir: str, verify: bool = True,
+            force: bool = False) -> Dict[str, Any]:
+    """
+    Run the pipeline for one requirement in its own workspace.
+
+    Args:
+        job: Job as returned by read_requirements()
+        runs_dir: Directory holding the job workplaces
+        verify: Include Petri net conversion and CTL generation
+        force: Regenerate every stage instead of reusing up-to-date outputs
+
+    Returns:
+        Job result with 'id', 'status' ('ok' or 'failed'), 'seconds',
+        'workplace' and 'error'
+    """
+    workplace = os.path.join(runs_dir, job['id'])
+    os.makedirs(workplace, exist_ok=True)
+    with open(os.path.join(workplace, 'req.txt'), 'w', encoding='utf-8') as f:
+        f.write(job['requirement'])
+
+    error = None
+    start = time.perf_counter()
+    with open(os.path.join(workplace, 'pipeline.log'), 'w', encoding='utf-8') as log:
+        token = _JOB_LOG.set(log)
+        try:
+            with workspace(workplace, run_id=job['id']):
+                run_pipeline(verify=verify, force=force, requirement=job['requirement'])
+        except (StageError, ValueError) as e:
+            error = str(e)
+            print(f"Pipeline failed: {e}")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            traceback.print_exc(file=log)
+        finally:
+            _JOB_LOG.reset(token)
+    return {
+        'id': job['id'],
+        'source': job['source'],
+        'status': 'ok' if error is None else 'failed',
+        'seconds': time.perf_counter() - start,
+        'workplace': workplace,
+        'error': error
+    }
+
+
+def summarize_jobs(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """
+    Aggregate job results.
+
+    Args:
+        results: Job results from run_job()
+        wall_seconds: Elapsed time of the whole batch
+
+    Returns:
+        Summary with job counts, throughput, duration percentiles and failures
+    """
+    durations = [result['seconds'] for result in results]
+    failures = [result for result in results if result['status'] != 'ok']
+    return {
+        'jobs': len(results),
+        'succeeded': len(results) - len(failures),
+        'failed': len(failures),
+        'wall_seconds': wall_seconds,
+        'jobs_per_minute': 60 * len(results) / wall_seconds if wall_seconds else None,
+        'duration_p50': percentile(durations, 50),
+        'duration_p95': percentile(durations, 95),
+        'duration_max': max(durations) if durations else None,
+        'failures': [{'id': f['id'], 'source': f['source'], 'error': f['error']} for f in failures]
+    }
+
+
+def run_requirements(jobs: List[Dict[str, Any]], runs_dir: Optional[str] = None,
+                     max_jobs: Optional[int] = None, verify: bool = True,
+                     force: bool = False) -> Dict[str, Any]:
+    """
+    Run the pipeline for every job with bounded concurrency.
+
+    Args:
+        jobs: Jobs as returned by read_requirements()
+        runs_dir: Directory holding the job workplaces (default: PIPELINE.RUNS_DIR)
+        max_jobs: Pipelines running at once (default: PIPELINE.BATCH_JOBS)
+        verify: Include Petri net conversion and CTL generation
+        force: Regenerate every stage instead of reusing up-to-date outputs
+
+    Returns:
+        Summary as returned by summarize_jobs(), plus the per-job 'results'
+    """
+    runs_dir = os.path.join(PROJECT_ROOT, runs_dir or get_pipeline_config("RUNS_DIR"))
+    if max_jobs is None:
+        max_jobs = get_pipeline_config("BATCH_JOBS")
+    os.makedirs(runs_dir, exist_ok=True)
+
+    results = []
+    start = time.perf_counter()
+    stdout = sys.stdout
+    sys.stdout = _ContextStdout(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_jobs), thread_name_prefix='batch') as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run_job, job, runs_dir, verify, force)
+                       for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                elapsed = time.perf_counter() - start
+                remaining = elapsed / len(results) * (len(jobs) - len(results))
+                failed = sum(1 for r in results if r['status'] != 'ok')
+                print(f"[{len(results)}/{len(jobs)}] {result['id']} {result['status']} in "
+                      f"{result['seconds']:.1f}s ({failed} failed, ~{remaining:.0f}s left)")
+                if result['error']:
+                    print(f"    {result['error']}")
+    finally:
+        sys.stdout = stdout
+
+    summary = summarize_jobs(results, time.perf_counter() - start)
+    summary['results'] = sorted(results, key=lambda r: r['id'])
+    with open(os.path.join(runs_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def print_job_summary(summary: Dict[str, Any]) -> None:
+    """
+    Print a batch summary as produced by summarize_jobs().
+
+    Args:
+        summary: Batch summary
+    """
+    print(f"\nBatch finished: {summary['succeeded']}/{summary['jobs']} succeeded, "
+          f"{summary['failed']} failed in {summary['wall_seconds']:.1f}s")
+    if summary['jobs']:
+        print(f"Throughput: {summary['jobs_per_minute']:.2f} jobs/min, job duration "
+              f"p50 {summary['duration_p50']:.1f}s, p95 {summary['duration_p95']:.1f}s, "
+              f"max {summary['duration_max']:.1f}s")
+    for failure in summary['failures']:
+        print(f"- {failure['id']} ({failure['source']}): {failure['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the BPMN generation pipeline for many requirements')
+    parser.add_argument('inputs', nargs='+', help='JSONL or CSV files with one requirement per row')
+    parser.add_argument('--text-field', action='append', dest='text_fields', metavar='FIELD',
+                        help="Field(s) joined into the requirement (repeatable, default: "
+                             "'requirement', or 'business_scenario' and 'LTC')")
+    parser.add_argument('--id-field', default=None, help='Field naming the job directory')
+    parser.add_argument('--limit', type=int, default=None, help='Maximum number of requirements')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Pipelines running at once (default: PIPELINE.BATCH_JOBS)')
+    parser.add_argument('--output-dir', default=None,
+                        help='Directory holding one workplace per job (default: PIPELINE.RUNS_DIR)')
+    parser.add_argument('--no-verify', action='store_true',
+                        help='Skip Petri net conversion and CTL generation')
+    parser.add_argument('--force', action='store_true',
+                        help='Regenerate every stage instead of reusing up-to-date outputs')
+    args = parser.parse_args()
+
+    try:
+        jobs = read_requirements(args.inputs, args.text_fields, args.id_field, args.limit)
+    except (FileNotFoundError, csv.Error) as e:
+        print(f'Error:{e}')
+        sys.exit(1)
+    if not jobs:
+        print("No requirements found")
+        sys.exit(1)
+
+    print(f"Running {len(jobs)} requirement(s)")
+    output_dir = os.path.abspath(args.output_dir) if args.output_dir else None
+    summary = run_requirements(jobs, output_dir, args.jobs,
+                               verify=not args.no_verify, force=args.force)
+    print_job_summary(summary)
+    print_token_usage()
+    print_hedge_stats()
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
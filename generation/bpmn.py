@@ -8,7 +8,11 @@ by integrating actors, tasks, control flows, and gateways.
 import json
 import os
 import datetime
+from utils.agent import single_flight_run
 from utils.configure import get_workplace
+from utils.dump import is_dump_enabled
+from utils.hedge import print_hedge_stats
+from utils.tokens import print_token_usage
 from generation.symbol import generate_symbol, get_symbol_data
 from generation.task import generate_task_with_extra, get_full_task_data
 from generation.seq import generate_updated_flow
@@ -16,14 +20,13 @@ import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
 # Configuration constants
-ENABLE_DUMP = True  # Toggle switch for dump functionality
 # BPMN output file configuration (customize file name and path as needed)
-BPMN_OUTPUT_FILE = os.path.join(
-    get_workplace(), "bpmn_output.json")  # BPMN data output file
-BPMN_XML_OUTPUT_FILE = os.path.join(
-    get_workplace(), "bpmn_output.bpmn")  # BPMN XML output file
+# Both are relative to the workplace directory, resolved when a file is written
+BPMN_OUTPUT_FILE = "bpmn_output.json"  # BPMN data output file
+BPMN_XML_OUTPUT_FILE = "bpmn_output.bpmn"  # BPMN XML output file
 
 
+@single_flight_run()
 def generate_bpmn_data():
     """
     Generate complete BPMN data by integrating all components.
@@ -43,7 +46,7 @@ def generate_bpmn_data():
 
     # 1. Get actors from symbol generation
     print("\n1. Getting actors from symbol generation...")
-    if ENABLE_DUMP:
+    if is_dump_enabled():
         # Use existing get_symbol_data function
         symbol_result = get_symbol_data()
         actors = symbol_result.get('actor', [])
@@ -61,9 +64,9 @@ def generate_bpmn_data():
 
     # 2. Get tasks and task types from task generation
     print("\n2. Getting tasks and task types from task generation...")
-    if ENABLE_DUMP:
-        # Use existing get_task_data function for tasks
-        tasks = get_symbol_data().get('tasks', [])
+    if is_dump_enabled():
+        # Tasks come from the symbol data loaded in step 1
+        tasks = symbol_result.get('tasks', [])
 
         # Use existing get_full_task_data function for task types
         full_task_data = get_full_task_data()
@@ -79,7 +82,7 @@ def generate_bpmn_data():
                 # Merge task_types
                 task_types.extend(message_task_types)
 
-        print(f"Loaded tasks using get_symbol_data()")
+        print(f"Loaded tasks from symbol data")
         print(f"Loaded task types using get_full_task_data()")
         print(f"Number of tasks: {len(tasks)}")
         print(f"Number of task types: {len(task_types)}")
@@ -102,6 +105,25 @@ def generate_bpmn_data():
         print("Failed to get updated control flow!")
         return None
 
+    return assemble_bpmn_data(actors, tasks, task_types, updated_flow_result)
+
+
+def assemble_bpmn_data(actors, tasks, task_types, updated_flow_result, dump=None):
+    """
+    Assemble complete BPMN data from generated components and save it if dump is enabled.
+
+    Args:
+        actors: Actors from symbol generation
+        tasks: Tasks with actor_symbol, task_symbol and task_description fields
+        task_types: Task types from task and message task generation
+        updated_flow_result: Updated control flow with gateways (see generation.seq.build_updated_flow)
+        dump: Save the BPMN data to the workplace (default: is_dump_enabled())
+
+    Returns:
+        Dictionary containing complete BPMN data
+    """
+    if dump is None:
+        dump = is_dump_enabled()
     updated_control_flow = updated_flow_result['updated_control_flow']
     gateways = updated_flow_result['gateways']
     print(f"Got {len(updated_control_flow)} updated control flows")
@@ -131,22 +153,23 @@ def generate_bpmn_data():
         "is_collaboration": is_collaboration,
         "actor_count": actor_count,
         "generation_info": {
-            "dump_enabled": ENABLE_DUMP,
+            "dump_enabled": dump,
             "generation_timestamp": str(datetime.datetime.now()),
             "source_files": {
-                "symbol": "symbol_output.json" if ENABLE_DUMP else "generated",
-                "task": "task_output.json" if ENABLE_DUMP else "generated",
-                "sequence": "seq_output.json" if ENABLE_DUMP else "generated",
-                "gate": "gate_output.json" if ENABLE_DUMP else "generated"
+                "symbol": "symbol_output.json" if dump else "generated",
+                "task": "task_output.json" if dump else "generated",
+                "sequence": "seq_output.json" if dump else "generated",
+                "gate": "gate_output.json" if dump else "generated"
             }
         }
     }
 
     # 6. Save complete BPMN data if dump is enabled
-    if ENABLE_DUMP:
-        with open(BPMN_OUTPUT_FILE, 'w', encoding='utf-8') as f:
+    if dump:
+        output_path = os.path.join(get_workplace(), BPMN_OUTPUT_FILE)
+        with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(bpmn_data, f, ensure_ascii=False, indent=2)
-        print(f"Complete BPMN data saved to: {BPMN_OUTPUT_FILE}")
+        print(f"Complete BPMN data saved to: {output_path}")
 
     print("\n" + "="*60)
     print("BPMN generation completed successfully!")
@@ -158,7 +181,7 @@ def generate_bpmn_data():
     print(f"- Control Flows: {len(updated_control_flow)}")
     print(f"- Gateways: {len(gateways)}")
     print(f"- Collaboration: {is_collaboration}")
-    print(f"- Dump Mode: {ENABLE_DUMP}")
+    print(f"- Dump Mode: {dump}")
 
     return bpmn_data
 
@@ -170,12 +193,14 @@ def prettify_xml(elem):
     return reparsed.toprettyxml(indent="  ")
 
 
-def generate_collaboration_bpmn(bpmn_data):
+def generate_collaboration_bpmn(bpmn_data, message_flows=None, message_tasks=None):
     """
     Generate BPMN 2.0 XML for collaboration diagram (multiple actors).
 
     Args:
         bpmn_data: Dictionary containing BPMN data from generate_bpmn()
+        message_flows: Message flows from sequence generation, read from seq_output.json if None
+        message_tasks: Message tasks from message task generation, read from the task file if None
 
     Returns:
         XML string in BPMN 2.0 format
@@ -312,39 +337,38 @@ def generate_collaboration_bpmn(bpmn_data):
     print("Adding message flows from seq_output.json message_flow data...")
     message_flows_added = 0
 
-    # Get message flows from seq_output.json
-    workplace = get_workplace()
-    seq_file_path = os.path.join(workplace, "seq_output.json")
-
     # Store existing message flows to avoid duplicates
     existing_message_flows = set()
 
     try:
-        with open(seq_file_path, 'r', encoding='utf-8') as f:
-            seq_data = json.load(f)
+        if message_flows is None:
+            # Get message flows from seq_output.json
+            seq_file_path = os.path.join(get_workplace(), "seq_output.json")
+            with open(seq_file_path, 'r', encoding='utf-8') as f:
+                seq_data = json.load(f)
             message_flows = seq_data.get(
                 'extracted_output', {}).get('message_flow', [])
             print(
                 f"Found {len(message_flows)} message flows in seq_output.json")
 
-            for msg_flow in message_flows:
-                from_actor = msg_flow['from_actor']
-                to_actor = msg_flow['to_actor']
-                from_task = msg_flow['from']
-                to_task = msg_flow['to']
+        for msg_flow in message_flows:
+            from_actor = msg_flow['from_actor']
+            to_actor = msg_flow['to_actor']
+            from_task = msg_flow['from']
+            to_task = msg_flow['to']
 
-                # Store this flow to avoid duplicates
-                existing_message_flows.add((from_task, to_task))
+            # Store this flow to avoid duplicates
+            existing_message_flows.add((from_task, to_task))
 
-                # Create message flow in collaboration
-                ET.SubElement(collaboration, 'messageFlow', {
-                    'id': f"MessageFlow_{from_task}_to_{to_task}",
-                    'sourceRef': from_task,
-                    'targetRef': to_task
-                })
-                message_flows_added += 1
-                print(
-                    f"Added message flow: {from_task} ({from_actor}) -> {to_task} ({to_actor})")
+            # Create message flow in collaboration
+            ET.SubElement(collaboration, 'messageFlow', {
+                'id': f"MessageFlow_{from_task}_to_{to_task}",
+                'sourceRef': from_task,
+                'targetRef': to_task
+            })
+            message_flows_added += 1
+            print(
+                f"Added message flow: {from_task} ({from_actor}) -> {to_task} ({to_actor})")
 
     except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
         print(f"Failed to load message flows from seq_output.json: {e}")
@@ -352,13 +376,14 @@ def generate_collaboration_bpmn(bpmn_data):
     # Add message flows based on task and extra.message correspondence rule
     print("Adding message flows based on task and extra.message correspondence...")
 
-    # Get full task data to access extra.message
-    full_task_data = get_full_task_data()
-    extra = full_task_data.get('extra', {})
-
-    if 'message' in extra:
-        message_tasks = extra['message'].get(
+    if message_tasks is None:
+        # Get full task data to access extra.message
+        full_task_data = get_full_task_data()
+        extra = full_task_data.get('extra', {})
+        message_tasks = extra.get('message', {}).get(
             'extracted_output', {}).get('tasks', [])
+
+    if message_tasks:
         print(f"Found {len(message_tasks)} message tasks in extra.message")
 
         # Create a set of original task symbols for quick lookup
@@ -532,32 +557,46 @@ def generate_process_bpmn(bpmn_data):
     return prettify_xml(definitions)
 
 
-def generate_bpmn_xml(bpmn_data, output_file=None):
+def build_bpmn_xml(bpmn_data, message_flows=None, message_tasks=None):
     """
-    Generate BPMN 2.0 XML file based on the BPMN data.
+    Build BPMN 2.0 XML from the BPMN data without writing it.
 
     Args:
         bpmn_data: Dictionary containing BPMN data from generate_bpmn()
-        output_file: Optional output file path. If None, saves to workplace.
+        message_flows: Message flows for collaboration diagrams, read from file if None
+        message_tasks: Message tasks for collaboration diagrams, read from file if None
 
     Returns:
-        Path to the generated XML file
+        BPMN XML string
     """
-    workplace = get_workplace()
-
     # Determine which function to use based on collaboration flag
     if bpmn_data['is_collaboration']:
         print("Generating collaboration BPMN XML...")
-        xml_content = generate_collaboration_bpmn(bpmn_data)
-        diagram_type = "collaboration"
-    else:
-        print("Generating process BPMN XML...")
-        xml_content = generate_process_bpmn(bpmn_data)
-        diagram_type = "process"
+        return generate_collaboration_bpmn(
+            bpmn_data, message_flows=message_flows, message_tasks=message_tasks)
+    print("Generating process BPMN XML...")
+    return generate_process_bpmn(bpmn_data)
+
+
+def generate_bpmn_xml(bpmn_data, output_file=None, message_flows=None, message_tasks=None):
+    """
+    Generate BPMN 2.0 XML file based on the BPMN data.
+
+    Args:
+        bpmn_data: Dictionary containing BPMN data from generate_bpmn()
+        output_file: Optional output file path. If None, saves to workplace.
+        message_flows: Message flows for collaboration diagrams, read from file if None
+        message_tasks: Message tasks for collaboration diagrams, read from file if None
+
+    Returns:
+        Path to the generated XML file
+    """
+    xml_content = build_bpmn_xml(bpmn_data, message_flows, message_tasks)
+    diagram_type = "collaboration" if bpmn_data['is_collaboration'] else "process"
 
     # Determine output file path
     if output_file is None:
-        output_file = BPMN_XML_OUTPUT_FILE
+        output_file = os.path.join(get_workplace(), BPMN_XML_OUTPUT_FILE)
 
     # Write XML to file
     with open(output_file, 'w', encoding='utf-8') as f:
@@ -595,3 +634,5 @@ if __name__ == '__main__':
             print("Failed to generate BPMN data!")
     except (FileNotFoundError, ValueError, json.JSONDecodeError, KeyError) as e:
         print(f"BPMN generation failed: {e}")
+    print_token_usage()
+    print_hedge_stats()
@@ -0,0 +1,308 @@
+"""
+BPMN generation and verification as a stage graph.
+
+Every step is declared once in build_generation_stages() together with the
+outputs it consumes, and utils.scheduler runs each of them exactly once per
+run, starting independent steps concurrently:
+
+    requirement -> symbol -> task -> message_task -> formatted_tasks
+    formatted_tasks -> seq -> gate -> updated_flow -> bpmn_data -> bpmn_xml -> petri_net
+    seq -> ctl, then ctl + petri_net -> ctl_on_pt
+
+CTL generation therefore overlaps gateway generation and XML/Petri net export.
+
+Stages hand their outputs to each other as Python objects: the BPMN XML is
+passed on as a string, the Petri net as a dictionary, and no stage reads
+another stage's file. Persistence is a side effect. With PIPELINE.PERSIST
+(the default), every stage also writes its usual file to the workplace
+(symbol_output.json, ..., bpmn_output.bpmn, bpmn_output_petri_net.pnml).
+With persistence off (--in-memory, or run_pipeline(requirement=..., persist=False)
+when embedding) nothing is read from or written to the workplace.
+
+With PIPELINE.INCREMENTAL enabled, the LLM stages (symbol, task, message_task,
+seq, gate, ctl) are stored in <workplace>/stages/ stamped with a hash of
+their inputs: the requirement text, upstream outputs, the prompt config file,
+the system prompt, the model settings of the stage and the PROMPT section.
+A rerun only calls the LLM for stages whose inputs changed and for the
+stages depending on them, e.g. editing only generation/config/gate.json
+regenerates the gateways and nothing else. The remaining stages are cheap
+and always rerun.
+
+Usage:
+    python -m generation.pipeline
+    python -m generation.pipeline --target bpmn_xml --no-verify --workers 2
+    python -m generation.pipeline --force
+    python -m generation.pipeline --workplace workplace/runs/0001
+    python -m generation.pipeline --in-memory
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.agent import single_flight_run
+from utils.combine import combine_results
+from utils.configure import (get_generation_config_path, get_generator_prompt, get_llm_config,
+                             get_llm_route, get_pipeline_config, get_prompt_config,
+                             get_repair_config, get_verification_config_path, get_workplace)
+from utils.hedge import print_hedge_stats
+from utils.load_requirement import get_reqstring
+from utils.scheduler import Stage, StageCache, StageError, run_stages
+from utils.tokens import print_token_usage
+from utils.workspace import workspace
+from generation.symbol import generate_symbol
+from generation.task import generate_message_task, generate_task
+from generation.seq import build_updated_flow, generate_gate, generate_sequence
+from generation.bpmn import BPMN_XML_OUTPUT_FILE, assemble_bpmn_data, build_bpmn_xml
+from verification.bpmn_to_pt import build_petri_net, save_petri_net_as_pnml
+from verification.ctl import apply_ctl_transformation, generate_ctl, save_standard_ctl_constraints
+
+
+# Model settings that change the generated output (timeouts and hedging do not)
+ROUTE_FINGERPRINT_KEYS = ('MODEL', 'MAX_TOKENS', 'FALLBACK', 'REPAIR_ATTEMPTS')
+
+REPAIR_FINGERPRINT_KEYS = ('ENABLED', 'MAX_ATTEMPTS', 'FRAGMENT_TOKENS')
+
+PROMPT_FINGERPRINT_KEYS = ('COMPACT_JSON', 'DEDUPLICATE_INJECTION', 'TRUNCATION',
+                           'VARIABLE_TOKEN_LIMITS', 'LAYOUT')
+
+
+def _llm_fingerprint(config_path: str, message: bool = False):
+    """
+    Build the fingerprint of an LLM stage: everything besides its input
+    stages that its prompt and model call depend on.
+
+    Args:
+        config_path: Prompt config file of the stage
+        message: Use the extra.message sub-config (message tasks)
+
+    Returns:
+        Function returning the fingerprint
+    """
+    def fingerprint():
+        with open(config_path, 'rb') as f:
+            content = f.read()
+        config = json.loads(content)
+        if message:
+            config = config.get('extra', {}).get('message', {})
+            stage = config.get('stage')
+        else:
+            stage = config.get('stage') or os.path.splitext(os.path.basename(config_path))[0]
+        route = get_llm_route(stage)
+        return {
+            'config': hashlib.sha256(content).hexdigest(),
+            'system_prompt': get_generator_prompt(),
+            'route': {key: route.get(key) for key in ROUTE_FINGERPRINT_KEYS},
+            'structured_output': get_llm_config("STRUCTURED_OUTPUT"),
+            'prompt': {key: get_prompt_config(key) for key in PROMPT_FINGERPRINT_KEYS},
+            'repair': {key: get_repair_config(key) for key in REPAIR_FINGERPRINT_KEYS}
+        }
+    return fingerprint
+
+
+def _symbol(requirement, persist):
+    return generate_symbol(requirement, dump=persist)
+
+
+def _task(requirement, symbol, persist):
+    return generate_task(requirement, symbol, dump=persist)
+
+
+def _message_task(requirement, symbol, task, persist):
+    return generate_message_task(tasks_data=task, symbol_data=symbol, requirement=requirement,
+                                 dump=persist)
+
+
+def _formatted_tasks(symbol, task, message_task):
+    return combine_results(combine_results(symbol, task), message_task)
+
+
+def _seq(requirement, formatted_tasks, persist):
+    return generate_sequence(requirement, formatted_tasks, dump=persist)
+
+
+def _gate(requirement, formatted_tasks, seq, persist):
+    return generate_gate(requirement, formatted_tasks, seq.get('control_flow', []), dump=persist)
+
+
+def _updated_flow(seq, gate, persist):
+    return build_updated_flow(seq.get('control_flow', []), gate.get('gateways', []), dump=persist)
+
+
+def _bpmn_data(symbol, formatted_tasks, updated_flow, persist):
+    actors = symbol.get('actor', [])
+    tasks = formatted_tasks.get('tasks', [])
+    if not actors or not tasks:
+        raise ValueError("No actors or tasks found")
+    return assemble_bpmn_data(actors, tasks, formatted_tasks.get('task_types', []), updated_flow,
+                              dump=persist)
+
+
+def _bpmn_xml(bpmn_data, seq, message_task, persist):
+    xml_content = build_bpmn_xml(bpmn_data, message_flows=seq.get('message_flow', []),
+                                 message_tasks=message_task.get('tasks', []))
+    if persist:
+        output_file = os.path.join(get_workplace(), BPMN_XML_OUTPUT_FILE)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(xml_content)
+        print(f"BPMN XML file generated: {output_file}")
+    return xml_content
+
+
+def _petri_net(bpmn_xml, persist):
+    petri_net = build_petri_net(bpmn_xml)
+    if persist:
+        output_file = os.path.join(get_workplace(), get_verification_config_path("DEFAULT_PETRI_NET_FILE"))
+        save_petri_net_as_pnml(petri_net, output_file)
+        print(f"Petri net saved to: {output_file}")
+    return petri_net
+
+
+def _ctl(requirement, symbol, seq, persist):
+    return generate_ctl(requirement, symbol, seq, dump=persist)
+
+
+def _ctl_on_pt(ctl, petri_net, symbol, persist):
+    constraints = ctl.get('ctl_constraints', [])
+    if persist:
+        save_standard_ctl_constraints(constraints)
+    return apply_ctl_transformation(constraints, symbol_data=symbol, petri_net=petri_net)
+
+
+def build_generation_stages(verify: bool = True, persist: bool = True,
+                            requirement: Optional[str] = None) -> List[Stage]:
+    """
+    Declare the generation pipeline.
+
+    Args:
+        verify: Include Petri net conversion and CTL generation
+        persist: Also write every stage output to the workplace
+        requirement: Requirement text (default: read from <workplace>/req.txt)
+
+    Returns:
+        List of stages (see utils.scheduler.Stage)
+    """
+    def stage(name, func, inputs=(), **kwargs):
+        return Stage(name, functools.partial(func, persist=persist), inputs, **kwargs)
+
+    read_requirement = get_reqstring if requirement is None else lambda: requirement
+    task_config = get_generation_config_path("TASK_CONFIG_PATH")
+    stages = [
+        Stage('requirement', read_requirement),
+        stage('symbol', _symbol, ['requirement'], cache=True,
+              fingerprint=_llm_fingerprint(get_generation_config_path("SYMBOL_CONFIG_PATH"))),
+        stage('task', _task, ['requirement', 'symbol'], cache=True,
+              fingerprint=_llm_fingerprint(task_config)),
+        stage('message_task', _message_task, ['requirement', 'symbol', 'task'], cache=True,
+              fingerprint=_llm_fingerprint(task_config, message=True)),
+        Stage('formatted_tasks', _formatted_tasks, ['symbol', 'task', 'message_task']),
+        stage('seq', _seq, ['requirement', 'formatted_tasks'], cache=True,
+              fingerprint=_llm_fingerprint(get_generation_config_path("SEQ_CONFIG_PATH"))),
+        stage('gate', _gate, ['requirement', 'formatted_tasks', 'seq'], cache=True,
+              fingerprint=_llm_fingerprint(get_generation_config_path("GATE_CONFIG_PATH"))),
+        stage('updated_flow', _updated_flow, ['seq', 'gate']),
+        stage('bpmn_data', _bpmn_data, ['symbol', 'formatted_tasks', 'updated_flow']),
+        stage('bpmn_xml', _bpmn_xml, ['bpmn_data', 'seq', 'message_task']),
+    ]
+    if verify:
+        stages += [
+            stage('petri_net', _petri_net, ['bpmn_xml']),
+            stage('ctl', _ctl, ['requirement', 'symbol', 'seq'], cache=True,
+                  fingerprint=_llm_fingerprint(get_verification_config_path("CTL_CONFIG_PATH"))),
+            stage('ctl_on_pt', _ctl_on_pt, ['ctl', 'petri_net', 'symbol']),
+        ]
+    return stages
+
+
+def get_stage_cache(refresh: bool = False) -> StageCache:
+    """
+    Get the store of incremental stage outputs in the workplace.
+
+    Args:
+        refresh: Regenerate every stage, replacing the stored outputs
+
+    Returns:
+        StageCache for <workplace>/stages
+    """
+    return StageCache(os.path.join(get_workplace(), "stages"), refresh)
+
+
+def run_pipeline(targets: Optional[Iterable[str]] = None, verify: bool = True,
+                 max_workers: Optional[int] = None,
+                 incremental: Optional[bool] = None, force: bool = False,
+                 persist: Optional[bool] = None, requirement: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run the generation pipeline.
+
+    Args:
+        targets: Stage names to produce, with everything they depend on (default: all stages)
+        verify: Include Petri net conversion and CTL generation
+        max_workers: Maximum stages running at once (default: PIPELINE.MAX_WORKERS)
+        incremental: Reuse LLM stage outputs whose inputs are unchanged and store
+            new ones (default: PIPELINE.INCREMENTAL, off without persistence)
+        force: Regenerate every stage even if its stored output is up to date
+        persist: Write every stage output to the workplace (default: PIPELINE.PERSIST)
+        requirement: Requirement text (default: read from <workplace>/req.txt)
+
+    Returns:
+        Dictionary mapping each needed stage to its output, e.g. 'bpmn_xml'
+        holds the BPMN XML and 'petri_net' the Petri net
+
+    Raises:
+        StageError: If a stage fails
+    """
+    if persist is None:
+        persist = get_pipeline_config("PERSIST")
+    if incremental is None:
+        incremental = persist and get_pipeline_config("INCREMENTAL")
+    cache = get_stage_cache(refresh=force) if incremental else None
+    stages = build_generation_stages(verify, persist, requirement)
+    with single_flight_run():
+        return run_stages(stages, targets, max_workers, cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the BPMN generation pipeline')
+    parser.add_argument('--target', action='append', dest='targets', metavar='STAGE',
+                        help='Stage to produce with its dependencies (repeatable, default: all)')
+    parser.add_argument('--no-verify', action='store_true',
+                        help='Skip Petri net conversion and CTL generation')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Maximum stages running at once (default: PIPELINE.MAX_WORKERS)')
+    parser.add_argument('--force', action='store_true',
+                        help='Regenerate every stage instead of reusing up-to-date outputs')
+    parser.add_argument('--workplace', default=None,
+                        help='Directory with req.txt receiving all outputs (default: WORKPLACE)')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='Write no stage outputs to the workplace')
+    args = parser.parse_args()
+
+    try:
+        with workspace(args.workplace):
+            results = run_pipeline(args.targets, verify=not args.no_verify, max_workers=args.workers,
+                                   force=args.force, persist=False if args.in_memory else None)
+    except (StageError, ValueError) as e:
+        print(f"Pipeline failed: {e}")
+        sys.exit(1)
+    finally:
+        print_token_usage()
+        print_hedge_stats()
+
+    print("\nPipeline completed:")
+    if 'bpmn_xml' in results:
+        print(f"- BPMN XML: {len(results['bpmn_xml'])} characters")
+    if 'petri_net' in results:
+        petri_net = results['petri_net']
+        print(f"- Petri net: {len(petri_net['places'])} places, "
+              f"{len(petri_net['transitions'])} transitions, {len(petri_net['arcs'])} arcs")
+    if 'ctl_on_pt' in results:
+        print("- CTL constraints on the Petri net:")
+        print(json.dumps(results['ctl_on_pt'], ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
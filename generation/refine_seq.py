@@ -4,23 +4,12 @@ Refine sequence flows based on revision advice using LLM.
 
 import json
 import os
-from utils.agent import generate_prompt_from_config
-from utils.configure import get_workplace
+from utils.agent import generate_prompt_from_config, single_flight_run
+from utils.configure import get_workplace, get_generation_config_path, get_output_file_name
 from generation.task import generate_task_with_extra
 
-# Configuration and file path constants loaded from configure.yml
-from utils.configure import get_generation_config_path, get_output_file_name
-
-REFINE_SEQ_CONFIG_PATH = get_generation_config_path(
-    "REFINE_SEQ_CONFIG_PATH") or "generation/config/refine_seq.json"
-SEQ_OUTPUT_FILE = get_output_file_name("SEQ_OUTPUT_FILE") or "seq_output.json"
-SYMBOL_OUTPUT_FILE = get_output_file_name(
-    "SYMBOL_OUTPUT_FILE") or "symbol_output.json"
-REVISION_FILE = get_output_file_name("REVISION_FILE") or "revision.txt"
-REFINED_SEQ_OUTPUT_FILE = get_output_file_name(
-    "REFINED_SEQ_OUTPUT_FILE") or "revised_seq_output.json"
-
 
+@single_flight_run()
 def generate_refined_sequence():
     """
     Read requirement, task data, sequence output, and revision advice, then call LLM to generate refined control_flow and message_flow.
@@ -32,16 +21,15 @@ def generate_refined_sequence():
     with open(req_path, 'r', encoding='utf-8') as f:
         requirement = f.read().strip()
     # Generate formattask (same as in seq.py)
-    formattask_data = generate_task_with_extra()
-    formattask = json.dumps(formattask_data, ensure_ascii=False, indent=2)
+    formattask = generate_task_with_extra()
     # Read seq_output.json
-    seq_path = os.path.join(workplace, SEQ_OUTPUT_FILE)
+    seq_path = os.path.join(workplace, get_output_file_name("SEQ_OUTPUT_FILE"))
     with open(seq_path, 'r', encoding='utf-8') as f:
         seq_data = json.load(f)
         flow = json.dumps(seq_data.get('extracted_output',
                           seq_data), ensure_ascii=False)
     # Read revision.txt
-    revision_path = os.path.join(workplace, REVISION_FILE)
+    revision_path = os.path.join(workplace, get_output_file_name("REVISION_FILE"))
     with open(revision_path, 'r', encoding='utf-8') as f:
         revision_advice = f.read().strip()
     # Assemble input
@@ -51,10 +39,10 @@ def generate_refined_sequence():
         "FLOW": flow,
         "REVISION": revision_advice
     }
-    config_path = REFINE_SEQ_CONFIG_PATH
+    config_path = get_generation_config_path("REFINE_SEQ_CONFIG_PATH")
     result = generate_prompt_from_config(config_path, input_vars)
     # Save result
-    output_path = os.path.join(workplace, REFINED_SEQ_OUTPUT_FILE)
+    output_path = os.path.join(workplace, get_output_file_name("REFINED_SEQ_OUTPUT_FILE"))
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
     print(f"Refined sequence saved to: {output_path}")
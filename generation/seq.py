@@ -7,43 +7,23 @@ sequence flows and message flows for BPMN generation.
 
 import json
 import os
-from utils.agent import generate_prompt_from_config
-from utils.configure import get_workplace
+from utils.agent import generate_prompt_from_config, single_flight_run
+from utils.configure import get_workplace, get_generation_config_path, get_output_file_name
 from utils.load_requirement import get_reqstring
 from utils.combine import combine_results
+from utils.dump import get_data_from_file_or_generate, is_dump_enabled
 from generation.task import generate_task_with_extra, get_full_task_data
 from generation.symbol import get_symbol_data
 
 
-# Configuration paths loaded from configure.yml
-from utils.configure import get_generation_config_path, get_output_file_name
-
-SEQ_CONFIG_PATH = get_generation_config_path(
-    "SEQ_CONFIG_PATH") or "generation/config/seq.json"
-GATE_CONFIG_PATH = get_generation_config_path(
-    "GATE_CONFIG_PATH") or "generation/config/gate.json"
-SEQ_OUTPUT_FILE = get_output_file_name("SEQ_OUTPUT_FILE") or "seq_output.json"
-GATE_OUTPUT_FILE = get_output_file_name(
-    "GATE_OUTPUT_FILE") or "gate_output.json"
-TASK_OUTPUT_FILE = get_output_file_name(
-    "TASK_OUTPUT_FILE") or "task_output.json"
-SYMBOL_OUTPUT_FILE = get_output_file_name(
-    "SYMBOL_OUTPUT_FILE") or "symbol_output.json"
-ENABLE_DUMP = True  # Toggle switch for dump functionality
-
-
-def generate_sequence():
+def get_formatted_tasks():
     """
-    Generate sequence flows from requirements and task data.
+    Get symbol, task and message task data combined into one task table.
 
     Returns:
-        Dictionary containing extracted sequence flows and message flows
+        Dictionary containing the combined symbol and task data
     """
-    # Get requirement string
-    requirement = get_reqstring()
-
-    # Get and format task data based on dump switch
-    if ENABLE_DUMP:
+    if is_dump_enabled():
         # Read from existing files and combine all extracted_output
         print("Dump enabled: Reading from symbol_output.json and task_output.json...")
         symbol_data = get_symbol_data()
@@ -60,31 +40,75 @@ def generate_sequence():
                     combined_data = combine_results(
                         combined_data, extra_data['extracted_output'])
 
-        formatted_tasks = json.dumps(
-            combined_data, ensure_ascii=False, indent=2)
-    else:
-        # Generate new data using generate_task_with_extra
-        print("Dump disabled: Generating new task data...")
-        task_data = generate_task_with_extra()
-        formatted_tasks = json.dumps(
-            task_data, ensure_ascii=False, indent=2)
+        return combined_data
+
+    # Generate new data using generate_task_with_extra
+    print("Dump disabled: Generating new task data...")
+    return generate_task_with_extra()
+
+
+def get_sequence_data():
+    """
+    Get sequence data either from file or by generating.
+
+    Returns:
+        Dictionary containing sequence flows and message flows
+    """
+    return get_data_from_file_or_generate(get_output_file_name("SEQ_OUTPUT_FILE"), generate_sequence, "sequence data")
+
+
+def get_gate_data(control_flow=None):
+    """
+    Get gate data either from file or by generating.
+
+    Args:
+        control_flow: Control flow the gateways are derived from, used when generating
 
-    # Prepare input variables
+    Returns:
+        Dictionary containing gateways
+    """
+    return get_data_from_file_or_generate(
+        get_output_file_name("GATE_OUTPUT_FILE"), lambda: generate_gate(control_flow=control_flow), "gate data")
+
+
+def generate_sequence(requirement=None, formatted_tasks=None, dump=None):
+    """
+    Generate sequence flows from requirements and task data.
+
+    Args:
+        requirement: Requirement text to avoid reloading it
+        formatted_tasks: Pre-combined task table (see get_formatted_tasks) to avoid duplicate calls
+        dump: Save the full result to the workplace (default: is_dump_enabled())
+
+    Returns:
+        Dictionary containing extracted sequence flows and message flows
+    """
+    # Get requirement string - use provided text or load it
+    if requirement is None:
+        requirement = get_reqstring()
+
+    # Get and format task data - use provided data or get from files/generate
+    if formatted_tasks is None:
+        formatted_tasks = get_formatted_tasks()
+
+    # Prepare input variables (serialized by the prompt template, see PROMPT.COMPACT_JSON)
     input_vars = {
         "REQUIREMENT": requirement,
         "FORMATTASK": formatted_tasks
     }
 
     # Generate sequence output using agent
-    result = generate_prompt_from_config(SEQ_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_generation_config_path("SEQ_CONFIG_PATH"), input_vars)
 
     # Extract the output and return directly
     extracted_output = result.get('extracted_output', {})
 
     # Save full results for debugging (if enabled)
-    if ENABLE_DUMP:
+    if dump is None:
+        dump = is_dump_enabled()
+    if dump:
         workplace = get_workplace()
-        output_path = os.path.join(workplace, SEQ_OUTPUT_FILE)
+        output_path = os.path.join(workplace, get_output_file_name("SEQ_OUTPUT_FILE"))
 
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
@@ -98,51 +122,37 @@ def generate_sequence():
     return extracted_output
 
 
-def generate_gate():
+@single_flight_run()
+def generate_gate(requirement=None, formatted_tasks=None, control_flow=None, dump=None):
     """
     Generate gate conditions from requirements and task data.
 
+    Args:
+        requirement: Requirement text to avoid reloading it
+        formatted_tasks: Pre-combined task table (see get_formatted_tasks) to avoid duplicate calls
+        control_flow: Pre-generated control flow to avoid regenerating the sequence
+        dump: Save the full result to the workplace (default: is_dump_enabled())
+
     Returns:
         Dictionary containing extracted gate conditions
     """
-    # Get requirement string
-    requirement = get_reqstring()
+    # Get requirement string - use provided text or load it
+    if requirement is None:
+        requirement = get_reqstring()
 
-    # Get sequence data first to extract pairs
-    print("Getting sequence data to extract pairs...")
-    seq_result = generate_sequence()
+    # Get sequence data first to extract pairs - use provided flow or get from file/generate
+    if control_flow is None:
+        print("Getting sequence data to extract pairs...")
+        control_flow = get_sequence_data().get('control_flow', [])
 
     # Extract pairs from control_flow
-    pairs = extract_pairs_from_control_flow(seq_result.get('control_flow', []))
-
-    # Get and format task data based on dump switch
-    if ENABLE_DUMP:
-        # Read from existing files and combine all extracted_output
-        print("Dump enabled: Reading from symbol_output.json and task_output.json for gate generation...")
-        symbol_data = get_symbol_data()
-        task_data = get_full_task_data()
-
-        # Combine main task extracted_output with symbol data
-        combined_data = combine_results(
-            symbol_data, task_data.get('extracted_output', {}))
-
-        # Add all extra sections
-        if 'extra' in task_data:
-            for _, extra_data in task_data['extra'].items():
-                if isinstance(extra_data, dict) and 'extracted_output' in extra_data:
-                    combined_data = combine_results(
-                        combined_data, extra_data['extracted_output'])
+    pairs = extract_pairs_from_control_flow(control_flow)
 
-        formatted_tasks = json.dumps(
-            combined_data, ensure_ascii=False, indent=2)
-    else:
-        # Generate new data using generate_task_with_extra
-        print("Dump disabled: Generating new task data for gate generation...")
-        task_data = generate_task_with_extra()
-        formatted_tasks = json.dumps(
-            task_data, ensure_ascii=False, indent=2)
+    # Get and format task data - use provided data or get from files/generate
+    if formatted_tasks is None:
+        formatted_tasks = get_formatted_tasks()
 
-    # Prepare input variables
+    # Prepare input variables (serialized by the prompt template, see PROMPT.COMPACT_JSON)
     input_vars = {
         "REQUIREMENT": requirement,
         "PAIRS": pairs,
@@ -150,15 +160,17 @@ def generate_gate():
     }
 
     # Generate gate output using agent
-    result = generate_prompt_from_config(GATE_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_generation_config_path("GATE_CONFIG_PATH"), input_vars)
 
     # Extract the output and return directly
     extracted_output = result.get('extracted_output', {})
 
     # Save full results for debugging (if enabled)
-    if ENABLE_DUMP:
+    if dump is None:
+        dump = is_dump_enabled()
+    if dump:
         workplace = get_workplace()
-        output_path = os.path.join(workplace, GATE_OUTPUT_FILE)
+        output_path = os.path.join(workplace, get_output_file_name("GATE_OUTPUT_FILE"))
 
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
@@ -343,25 +355,26 @@ def update_seq_with_gate(control_flow, gateways):
     return F_prime
 
 
+@single_flight_run()
 def generate_updated_flow():
     """
-    Generate updated flow with gateway information based on ENABLE_DUMP setting.
+    Generate updated flow with gateway information based on the dump setting.
 
     This function intelligently decides whether to:
-    - Read from existing files (when ENABLE_DUMP=True)
-    - Generate new data and update flow (when ENABLE_DUMP=False)
+    - Read from existing files (when dump is enabled)
+    - Generate new data and update flow (when dump is disabled)
 
     Returns:
         Dictionary containing updated control flow with gateway connections
     """
     workplace = get_workplace()
 
-    if ENABLE_DUMP:
+    if is_dump_enabled():
         # Read from existing files to avoid duplicate LLM calls
         print("Dump enabled: Reading from existing seq_output.json and gate_output.json...")
 
         # Read control flow from seq_output.json
-        seq_file_path = os.path.join(workplace, SEQ_OUTPUT_FILE)
+        seq_file_path = os.path.join(workplace, get_output_file_name("SEQ_OUTPUT_FILE"))
         try:
             with open(seq_file_path, 'r', encoding='utf-8') as f:
                 seq_data = json.load(f)
@@ -374,7 +387,7 @@ def generate_updated_flow():
             return None
 
         # Read gateways from gate_output.json
-        gate_file_path = os.path.join(workplace, GATE_OUTPUT_FILE)
+        gate_file_path = os.path.join(workplace, get_output_file_name("GATE_OUTPUT_FILE"))
         try:
             with open(gate_file_path, 'r', encoding='utf-8') as f:
                 gate_data = json.load(f)
@@ -386,45 +399,56 @@ def generate_updated_flow():
             print(f"Failed to load gateways from {gate_file_path}: {e}")
             return None
 
-        if not control_flow:
-            print("No control flow data found!")
-            return None
-
-        if not gateways:
-            print("No gateway data found!")
-            return None
-
     else:
         # Generate new data without saving intermediate files
         print("Dump disabled: Generating new sequence and gate data...")
 
-        # Generate sequence data
+        # Generate sequence data and task table once, shared with gate generation
         print("Generating sequence data...")
-        seq_result = generate_sequence()
+        formatted_tasks = get_formatted_tasks()
+        seq_result = generate_sequence(formatted_tasks=formatted_tasks)
         control_flow = seq_result.get('control_flow', [])
         print(f"Generated {len(control_flow)} control flows")
 
         # Generate gate data
         print("Generating gate data...")
-        gate_data = generate_gate()
+        gate_data = generate_gate(formatted_tasks=formatted_tasks, control_flow=control_flow)
         gateways = gate_data.get('gateways', [])
         print(f"Generated {len(gateways)} gateways")
 
-        if not control_flow:
-            print("No control flow data generated!")
-            return None
+    return build_updated_flow(control_flow, gateways)
 
-        if not gateways:
-            print("No gateway data generated!")
-            return None
+
+def build_updated_flow(control_flow, gateways, dump=None):
+    """
+    Connect a control flow to its gateways and save the result if dump is enabled.
+
+    Args:
+        control_flow: List of control flow objects with actor, from, to fields
+        gateways: List of gateway objects with gateway_symbol, from_tasks, to_tasks fields
+        dump: Save the result to the workplace (default: is_dump_enabled())
+
+    Returns:
+        Dictionary containing original control flow, gateways and updated control flow,
+        or None if either input is empty
+    """
+    if not control_flow:
+        print("No control flow data found!")
+        return None
+
+    if not gateways:
+        print("No gateway data found!")
+        return None
 
     # Update flow with gateway information
     print("Updating flow with gateway information...")
     updated_flow = update_seq_with_gate(control_flow, gateways)
 
     # Save results if dump is enabled
-    if ENABLE_DUMP:
-        updated_flow_file = os.path.join(workplace, "updated_flow_output.json")
+    if dump is None:
+        dump = is_dump_enabled()
+    if dump:
+        updated_flow_file = os.path.join(get_workplace(), "updated_flow_output.json")
         with open(updated_flow_file, 'w', encoding='utf-8') as f:
             json.dump({
                 "original_control_flow": control_flow,
@@ -453,7 +477,7 @@ def test_extract_pairs():
     workplace = get_workplace()
 
     # Read control flow from seq_output.json
-    seq_file_path = os.path.join(workplace, SEQ_OUTPUT_FILE)
+    seq_file_path = os.path.join(workplace, get_output_file_name("SEQ_OUTPUT_FILE"))
     try:
         with open(seq_file_path, 'r', encoding='utf-8') as f:
             seq_data = json.load(f)
@@ -498,7 +522,7 @@ def test_update_seq_with_gate():
     workplace = get_workplace()
 
     # Read control flow from seq_output.json
-    seq_file_path = os.path.join(workplace, SEQ_OUTPUT_FILE)
+    seq_file_path = os.path.join(workplace, get_output_file_name("SEQ_OUTPUT_FILE"))
     try:
         with open(seq_file_path, 'r', encoding='utf-8') as f:
             seq_data = json.load(f)
@@ -511,7 +535,7 @@ def test_update_seq_with_gate():
         return None
 
     # Read gateways from gate_output.json
-    gate_file_path = os.path.join(workplace, GATE_OUTPUT_FILE)
+    gate_file_path = os.path.join(workplace, get_output_file_name("GATE_OUTPUT_FILE"))
     try:
         with open(gate_file_path, 'r', encoding='utf-8') as f:
             gate_data = json.load(f)
@@ -8,20 +8,11 @@ and generates a structured symbol table for BPMN generation.
 import json
 import os
 from utils.agent import generate_prompt_from_config
-from utils.configure import get_workplace
+from utils.configure import get_workplace, get_generation_config_path, get_output_file_name
 from utils.load_requirement import get_reqstring
 from utils.dump import get_data_from_file_or_generate, save_result
 
 
-# Configuration paths loaded from configure.yml
-from utils.configure import get_generation_config_path, get_output_file_name
-
-SYMBOL_CONFIG_PATH = get_generation_config_path(
-    "SYMBOL_CONFIG_PATH") or "generation/config/symbol.json"
-SYMBOL_OUTPUT_FILE = get_output_file_name(
-    "SYMBOL_OUTPUT_FILE") or "symbol_output.json"
-
-
 def add_start_end_tasks(extracted_output):
     """
     Add start and end tasks for each actor in the extracted output.
@@ -70,18 +61,23 @@ def get_symbol_data():
     Returns:
         Dictionary containing symbol data
     """
-    return get_data_from_file_or_generate(SYMBOL_OUTPUT_FILE, generate_symbol, "symbol data")
+    return get_data_from_file_or_generate(get_output_file_name("SYMBOL_OUTPUT_FILE"), generate_symbol, "symbol data")
 
 
-def generate_symbol():
+def generate_symbol(requirement=None, dump=None):
     """
     Generate symbol table from requirements.
 
+    Args:
+        requirement: Requirement text to avoid reloading it
+        dump: Save the full result to the workplace (default: is_dump_enabled())
+
     Returns:
         Dictionary containing extracted actors and tasks
     """
-    # Get requirement string
-    requirement = get_reqstring()
+    # Get requirement string - use provided text or load it
+    if requirement is None:
+        requirement = get_reqstring()
 
     # Prepare input variables
     input_vars = {
@@ -89,7 +85,7 @@ def generate_symbol():
     }
 
     # Generate symbol output using agent
-    result = generate_prompt_from_config(SYMBOL_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_generation_config_path("SYMBOL_CONFIG_PATH"), input_vars)
 
     # Extract the output and return directly
     extracted_output = result.get('extracted_output', {})
@@ -98,7 +94,7 @@ def generate_symbol():
     extracted_output = add_start_end_tasks(extracted_output)
 
     # Save full results for debugging (if enabled)
-    save_result(result, SYMBOL_OUTPUT_FILE, "Symbol generation")
+    save_result(result, get_output_file_name("SYMBOL_OUTPUT_FILE"), "Symbol generation", dump=dump)
 
     print("Extracted output:")
     print(json.dumps(extracted_output, ensure_ascii=False, indent=2))
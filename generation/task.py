@@ -7,24 +7,15 @@ for BPMN generation.
 
 import json
 import os
-import tempfile
-from utils.agent import generate_prompt_from_config
-from utils.configure import get_workplace
+from utils.agent import generate_prompt_from_config, single_flight_run
+from utils.configure import get_workplace, get_generation_config_path, get_output_file_name
 from utils.load_requirement import get_reqstring
+from utils.template import load_config
 from utils.combine import combine_results
-from utils.dump import get_data_from_file_or_generate, save_result, save_result_with_extra, ENABLE_DUMP
+from utils.dump import get_data_from_file_or_generate, is_dump_enabled, save_result, save_result_with_extra
 from generation.symbol import get_symbol_data
 
 
-# Configuration paths loaded from configure.yml
-from utils.configure import get_generation_config_path, get_output_file_name
-
-TASK_CONFIG_PATH = get_generation_config_path(
-    "TASK_CONFIG_PATH") or "generation/config/task.json"
-TASK_OUTPUT_FILE = get_output_file_name(
-    "TASK_OUTPUT_FILE") or "task_output.json"
-
-
 def get_task_data():
     """
     Get task data either from file or by generating.
@@ -32,7 +23,7 @@ def get_task_data():
     Returns:
         Dictionary containing task data
     """
-    return get_data_from_file_or_generate(TASK_OUTPUT_FILE, generate_task, "task data")
+    return get_data_from_file_or_generate(get_output_file_name("TASK_OUTPUT_FILE"), generate_task, "task data")
 
 
 def get_full_task_data():
@@ -43,7 +34,7 @@ def get_full_task_data():
         Dictionary containing complete task data with extra sections
     """
     workplace = get_workplace()
-    task_file_path = os.path.join(workplace, TASK_OUTPUT_FILE)
+    task_file_path = os.path.join(workplace, get_output_file_name("TASK_OUTPUT_FILE"))
 
     try:
         with open(task_file_path, 'r', encoding='utf-8') as f:
@@ -55,18 +46,27 @@ def get_full_task_data():
         return {}
 
 
-def generate_task():
+def generate_task(requirement=None, symbol_data=None, dump=None):
     """
     Generate tasks from requirements and symbol table.
 
+    Args:
+        requirement: Requirement text to avoid reloading it
+        symbol_data: Pre-generated symbol data to avoid duplicate calls
+        dump: Save the full result to the workplace (default: is_dump_enabled())
+
     Returns:
         Dictionary containing extracted tasks
     """
-    # Get requirement string
-    requirement = get_reqstring()
+    # Get requirement string - use provided text or load it
+    if requirement is None:
+        requirement = get_reqstring()
 
-    # Get symbol data
-    symbol_result = get_symbol_data()
+    # Get symbol data - use provided data or get from file/generate
+    if symbol_data is not None:
+        symbol_result = symbol_data
+    else:
+        symbol_result = get_symbol_data()
 
     # Prepare input variables
     input_vars = {
@@ -75,13 +75,13 @@ def generate_task():
     }
 
     # Generate task output using agent
-    result = generate_prompt_from_config(TASK_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_generation_config_path("TASK_CONFIG_PATH"), input_vars)
 
     # Extract the output and return directly
     extracted_output = result.get('extracted_output', {})
 
     # Save results
-    save_result(result, TASK_OUTPUT_FILE, "Task generation")
+    save_result(result, get_output_file_name("TASK_OUTPUT_FILE"), "Task generation", dump=dump)
 
     print("Extracted output:")
     print(json.dumps(extracted_output, ensure_ascii=False, indent=2))
@@ -89,19 +89,22 @@ def generate_task():
     return extracted_output
 
 
-def generate_message_task(tasks_data=None, symbol_data=None):
+def generate_message_task(tasks_data=None, symbol_data=None, requirement=None, dump=None):
     """
     Generate message tasks from requirements and symbol table using extra.message config.
 
     Args:
         tasks_data: Pre-generated task data to avoid duplicate calls
         symbol_data: Pre-generated symbol data to avoid duplicate calls
+        requirement: Requirement text to avoid reloading it
+        dump: Save the full result to the workplace (default: is_dump_enabled())
 
     Returns:
         Dictionary containing extracted message tasks
     """
-    # Get requirement string
-    requirement = get_reqstring()
+    # Get requirement string - use provided text or load it
+    if requirement is None:
+        requirement = get_reqstring()
 
     # Get symbol data - use provided data or get from file/generate
     if symbol_data is not None:
@@ -123,32 +126,23 @@ def generate_message_task(tasks_data=None, symbol_data=None):
     }
 
     # Load the main config and extract the message config
-    with open(TASK_CONFIG_PATH, 'r', encoding='utf-8') as f:
-        main_config = json.load(f)
+    main_config = load_config(get_generation_config_path("TASK_CONFIG_PATH"))
 
     message_config = main_config.get('extra', {}).get('message', {})
     if not message_config:
         raise ValueError(
             "Message configuration not found in task.json extra.message field")
 
-    # Create a temporary config file for the message config
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as temp_file:
-        json.dump(message_config, temp_file, ensure_ascii=False, indent=2)
-        temp_config_path = temp_file.name
-
-    try:
-        # Generate message task output using agent with the extracted config
-        result = generate_prompt_from_config(temp_config_path, input_vars)
-    finally:
-        # Clean up temporary file
-        os.unlink(temp_config_path)
+    # Generate message task output using agent with the in-memory message config
+    result = generate_prompt_from_config(message_config, input_vars)
 
     # Extract the output and return directly
     extracted_output = result.get('extracted_output', {})
 
     # Save results with message data in extra.message field
     save_result_with_extra(
-        {}, TASK_OUTPUT_FILE, "Message task generation", "message", result)
+        {}, get_output_file_name("TASK_OUTPUT_FILE"), "Message task generation", "message", result,
+        dump=dump)
 
     print("Extracted output:")
     print(json.dumps(extracted_output, ensure_ascii=False, indent=2))
@@ -156,6 +150,28 @@ def generate_message_task(tasks_data=None, symbol_data=None):
     return extracted_output
 
 
+def get_message_task_data(tasks_data=None, symbol_data=None, requirement=None):
+    """
+    Get message task data either from the extra.message section of the task file or by generating.
+
+    Args:
+        tasks_data: Pre-generated task data to avoid duplicate calls
+        symbol_data: Pre-generated symbol data to avoid duplicate calls
+        requirement: Requirement text to avoid reloading it
+
+    Returns:
+        Dictionary containing message task data
+    """
+    if is_dump_enabled():
+        message_data = get_full_task_data().get('extra', {}).get('message', {})
+        if 'extracted_output' in message_data:
+            print("Loaded message task data from extra.message")
+            return message_data['extracted_output']
+        print("No message task data in task file, generating new message task data...")
+    return generate_message_task(tasks_data=tasks_data, symbol_data=symbol_data, requirement=requirement)
+
+
+@single_flight_run()
 def generate_and_combine_data():
     """
     Generate symbol, tasks and message tasks, combining results appropriately.
@@ -166,12 +182,13 @@ def generate_and_combine_data():
     Returns:
         Dictionary containing combined symbol, task and message task results
     """
-    if ENABLE_DUMP:
-        # When dump is enabled, call all functions sequentially
-        print("Dump enabled: Generating symbol, tasks and message tasks sequentially...")
+    if is_dump_enabled():
+        # When dump is enabled, reuse the saved outputs and generate only what is missing
+        print("Dump enabled: Loading symbol, tasks and message tasks, generating missing ones...")
         symbol_output = get_symbol_data()
-        tasks_output = generate_task()
-        message_result = generate_message_task()
+        tasks_output = get_task_data()
+        message_result = get_message_task_data(
+            tasks_data=tasks_output, symbol_data=symbol_output)
     else:
         # When dump is disabled, generate symbol and tasks once and pass to message task
         print("Dump disabled: Generating symbol and tasks once and combining results...")
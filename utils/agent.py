@@ -3,36 +3,53 @@ Prompt template generation and LLM interaction utilities.
 
 This module provides functions to load JSON configurations, generate prompts,
 call LLM APIs, and extract structured output from responses.
+
+Identical requests are coalesced (single-flight): while a request (system
+and user prompt, model, max_tokens and response format) is in flight,
+further identical calls wait for it and receive a copy of its result instead
+of calling the LLM again. Inside single_flight_run() (opened by the pipeline
+and the legacy generate_* entry points) completed results are also reused
+until the run ends; outside a run, reuse across calls is left to the
+response cache (LLM_CACHE). test_single_flight_run() checks this offline.
 """
 
+import contextlib
+import contextvars
+import copy
+import functools
+import hashlib
 import json
 import re
 import os
-from typing import Dict, List, Any
-
-from utils.configure import get_generator_prompt
-from utils.prompt import ask_openai
-
-
-def load_config(file_path: str) -> Dict[str, Any]:
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
+
+from utils.cassette import CassetteMissError, get_cassette
+from utils.configure import (get_generator_prompt, get_llm_config, get_llm_route, get_prompt_config,
+                             get_repair_config)
+from utils.hedge import hedged_call, hedged_call_async
+from utils.prompt import ask_openai, ask_openai_async, ask_openai_stream, ask_openai_stream_async
+from utils.repair import build_repair_prompt, validate_output
+from utils.schema import get_response_format
+from utils.telemetry import call_span, note_cache, update_call
+# load_config is re-exported for callers that import it from utils.agent
+from utils.template import get_prompt_template, load_config, serialize_variable  # noqa: F401
+from utils.tokens import estimate_tokens, record_prompt_tokens, stage_scope
+
+
+# Single-flight registry: request hash -> Future of the call in flight
+_SINGLE_FLIGHT: Dict[str, Future] = {}
+_SINGLE_FLIGHT_LOCK = threading.Lock()
+# Futures of the calls made in the current single_flight_run(), by request hash
+_SINGLE_FLIGHT_RUN: contextvars.ContextVar = contextvars.ContextVar('single_flight_run', default=None)
+
+
+class _LeaderCancelled(Exception):
     """
-    Load configuration from JSON file
-
-    Args:
-        file_path: Configuration file path
-
-    Returns:
-        Configuration dictionary
+    Set on a shared future whose leader was cancelled, so waiting calls start over
     """
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError as exc:
-        raise FileNotFoundError(
-            f"Configuration file not found: {file_path}") from exc
-    except json.JSONDecodeError as exc:
-        raise ValueError(
-            f"Configuration file format error: {file_path}") from exc
 
 
 def inject_variables(prompt_template: str, variables: Dict[str, Any]) -> str:
@@ -50,13 +67,8 @@ def inject_variables(prompt_template: str, variables: Dict[str, Any]) -> str:
 
     # Replace variable placeholders
     for var_name, var_value in variables.items():
-        placeholder = f"${var_name}"
-        if isinstance(var_value, str):
-            injected_prompt = injected_prompt.replace(placeholder, var_value)
-        else:
-            # If it's a complex object, convert to JSON string
-            injected_prompt = injected_prompt.replace(
-                placeholder, json.dumps(var_value, ensure_ascii=False, indent=2))
+        injected_prompt = injected_prompt.replace(
+            f"${var_name}", serialize_variable(var_value))
 
     return injected_prompt
 
@@ -92,10 +104,106 @@ def clean_json_string(json_str: str) -> str:
     return cleaned_json
 
 
+# Pattern kinds in the order they are tried by extract_output_variables
+_VALUE, _MARKDOWN_BRACKET_LIST, _MARKDOWN_LIST, _MARKDOWN_SECTION = range(4)
+
+_MARKDOWN_BRACKET_ITEM = re.compile(r'- \[(.*?)\]')
+_MARKDOWN_ITEM = re.compile(r'- (.*?)(?:\n|$)')
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_output_patterns(var_name: str) -> Tuple[Tuple[int, Any], ...]:
+    """
+    Compile the patterns that match an output variable, once per variable name.
+
+    Args:
+        var_name: Output variable name
+
+    Returns:
+        Tuple of (pattern kind, compiled pattern) pairs in match priority order
+    """
+    # Escape special characters in variable name
+    escaped_var_name = re.escape(var_name)
+    flags = re.DOTALL | re.IGNORECASE
+    patterns = [
+        # JSON array format with quotes
+        (_VALUE, rf'"{escaped_var_name}":\s*(\[.*?\])'),
+        # JSON object format with quotes
+        (_VALUE, rf'"{escaped_var_name}":\s*(\{{.*?\}})'),
+        (_VALUE, rf'"{escaped_var_name}":\s*"([^"]*)"'),  # String format with quotes
+        # Other formats with quotes
+        (_VALUE, rf'"{escaped_var_name}":\s*([^,\n\r]+)'),
+        (_VALUE, rf'{escaped_var_name}:\s*(\[.*?\])'),  # No quotes array format
+        (_VALUE, rf'{escaped_var_name}:\s*(\{{.*?\}})'),  # No quotes object format
+        (_VALUE, rf'{escaped_var_name}:\s*"([^"]*)"'),  # No quotes string format
+        (_VALUE, rf'{escaped_var_name}:\s*([^,\n\r]+)'),  # No quotes other format
+        # Pattern for when variable appears in markdown format like "**Variable:**"
+        # Markdown list format
+        (_MARKDOWN_BRACKET_LIST, rf'\*\*{escaped_var_name}:\*\*\s*\n((?:- \[.*?\]\n?)+)'),
+        # Markdown section format
+        (_MARKDOWN_SECTION, rf'\*\*{escaped_var_name}:\*\*\s*\n(.*?)(?=\n\*\*|\n\n|\Z)'),
+        # Markdown list format without brackets
+        (_MARKDOWN_LIST, rf'\*\*{escaped_var_name}:\*\*\s*\n((?:- .*?\n?)+)'),
+    ]
+    return tuple((kind, re.compile(pattern, flags)) for kind, pattern in patterns)
+
+
+def _parse_outer_json(response: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse the outermost JSON object of a response, or None if there is none.
+    """
+    json_start = response.find('{')
+    json_end = response.rfind('}')
+    if json_start == -1 or json_end == -1 or json_end <= json_start:
+        return None
+    try:
+        # Clean the JSON content to remove comments
+        full_json = json.loads(clean_json_string(response[json_start:json_end + 1]))
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return None  # Not a valid JSON object, fall back to regex patterns
+    return full_json if isinstance(full_json, dict) else None
+
+
+def _match_output_variable(response: str, var_name: str) -> Tuple[bool, Any]:
+    """
+    Find an output variable in the response text with the compiled patterns.
+
+    Returns:
+        Tuple of (whether the variable was found, its value)
+    """
+    for kind, pattern in _compile_output_patterns(var_name):
+        match = pattern.search(response)
+        if not match:
+            continue
+        if kind == _VALUE:
+            # Clean the matched content to remove comments
+            matched_content = match.group(1).strip()
+            try:
+                # Try to parse as JSON
+                return True, json.loads(clean_json_string(matched_content))
+            except json.JSONDecodeError:
+                # If not JSON, use string value directly
+                return True, matched_content
+        if kind == _MARKDOWN_SECTION:
+            content = match.group(1).strip()
+            if content:
+                return True, content
+            continue
+        # List format: extract all list items
+        item_pattern = _MARKDOWN_BRACKET_ITEM if kind == _MARKDOWN_BRACKET_LIST else _MARKDOWN_ITEM
+        list_matches = item_pattern.findall(match.group(1))
+        if list_matches:
+            return True, [item.strip() for item in list_matches]
+    return False, None
+
+
 def extract_output_variables(response: str, output_vars: List[str]) -> Dict[str, Any]:
     """
     Extract specified output variables from LLM response
 
+    The outermost JSON object is parsed once and shared by all variables;
+    variables it does not contain are matched with cached compiled patterns.
+
     Args:
         response: LLM response text
         output_vars: List of output variables to extract
@@ -104,182 +212,222 @@ def extract_output_variables(response: str, output_vars: List[str]) -> Dict[str,
         Dictionary of extracted variables
     """
     extracted_result = {}
+    full_json = _parse_outer_json(response)
 
     for var_name in output_vars:
-        # Escape special characters in variable name
-        escaped_var_name = re.escape(var_name)
-
-        # First, try to extract JSON content from the response
-        json_content = None
-        try:
-            # Try to find JSON object in the response
-            json_start = response.find('{')
-            json_end = response.rfind('}')
-            if json_start != -1 and json_end != -1 and json_end > json_start:
-                json_content = response[json_start:json_end + 1]
-                # Clean the JSON content to remove comments
-                cleaned_json = clean_json_string(json_content)
-                full_json = json.loads(cleaned_json)
-                if var_name in full_json:
-                    extracted_result[var_name] = full_json[var_name]
-                    continue
-        except (json.JSONDecodeError, TypeError, ValueError):
-            pass  # Not a valid JSON object, continue with regex patterns
-
-        # Try multiple patterns to match output variables (case insensitive)
-        patterns = [
-            # JSON array format with quotes
-            rf'"{escaped_var_name}":\s*(\[.*?\])',
-            # JSON object format with quotes
-            rf'"{escaped_var_name}":\s*(\{{.*?\}})',
-            rf'"{escaped_var_name}":\s*"([^"]*)"',  # String format with quotes
-            # Other formats with quotes
-            rf'"{escaped_var_name}":\s*([^,\n\r]+)',
-            rf'{escaped_var_name}:\s*(\[.*?\])',  # No quotes array format
-            rf'{escaped_var_name}:\s*(\{{.*?\}})',  # No quotes object format
-            rf'{escaped_var_name}:\s*"([^"]*)"',  # No quotes string format
-            rf'{escaped_var_name}:\s*([^,\n\r]+)',  # No quotes other format
-            # Pattern for when variable appears in markdown format like "**Variable:**"
-            # Markdown list format
-            rf'\*\*{escaped_var_name}:\*\*\s*\n((?:- \[.*?\]\n?)+)',
-            # Markdown section format
-            rf'\*\*{escaped_var_name}:\*\*\s*\n(.*?)(?=\n\*\*|\n\n|\Z)',
-            # Pattern for when variable appears in markdown format like "**Variable:**" with different list format
-            # Markdown list format without brackets
-            rf'\*\*{escaped_var_name}:\*\*\s*\n((?:- .*?\n?)+)',
-        ]
-
-        for pattern in patterns:
-            try:
-                match = re.search(pattern, response, re.DOTALL | re.IGNORECASE)
-                if match:
-                    if '**' in pattern:
-                        # Handle markdown format
-                        if r'((?:- \[.*?\]\n?)+)' in pattern:
-                            # List format: extract all list items
-                            list_text = match.group(1)
-                            list_matches = re.findall(
-                                r'- \[(.*?)\]', list_text)
-                            if list_matches:
-                                extracted_result[var_name] = [
-                                    item.strip() for item in list_matches]
-                                break
-                        elif r'((?:- .*?\n?)+)' in pattern:
-                            # List format without brackets: extract all list items
-                            list_text = match.group(1)
-                            list_matches = re.findall(
-                                r'- (.*?)(?:\n|$)', list_text)
-                            if list_matches:
-                                extracted_result[var_name] = [
-                                    item.strip() for item in list_matches]
-                                break
-                        else:
-                            # Section format: extract the content
-                            content = match.group(1).strip()
-                            if content:
-                                extracted_result[var_name] = content
-                                break
-                    else:
-                        try:
-                            # Clean the matched content to remove comments
-                            matched_content = match.group(1).strip()
-                            cleaned_content = clean_json_string(
-                                matched_content)
-
-                            # Try to parse as JSON
-                            value = json.loads(cleaned_content)
-                            extracted_result[var_name] = value
-                            break
-                        except json.JSONDecodeError:
-                            # If not JSON, use string value directly
-                            extracted_result[var_name] = matched_content
-                            break
-            except re.error as e:
-                # If regex has error, skip this pattern
-                print(f"Regex error {pattern}: {e}")
-                continue
+        if full_json is not None and var_name in full_json:
+            extracted_result[var_name] = full_json[var_name]
+            continue
+        found, value = _match_output_variable(response, var_name)
+        if found:
+            extracted_result[var_name] = value
 
     return extracted_result
 
 
-def generate_prompt_from_config(config_file_path: str, input_variables: Dict[str, Any]) -> Dict[str, Any]:
+class IncrementalOutputExtractor:
     """
-    Generate prompt from configuration file and execute
+    Incremental extractor for output variables of a streamed JSON response
+
+    Chunks are scanned once as they arrive. Each top-level key of the first
+    JSON object is tracked, and as soon as the value of a declared output
+    variable closes it is parsed and reported through on_output.
+    """
+
+    def __init__(self, output_vars: List[str],
+                 on_output: Optional[Callable[[str, Any], None]] = None):
+        """
+        Args:
+            output_vars: Output variables to extract
+            on_output: Optional callback invoked with (name, value) per completed output
+        """
+        self.wanted = list(output_vars)
+        self.on_output = on_output
+        self.outputs: Dict[str, Any] = {}
+        self.text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # key -> colon -> value -> value_end -> after_value -> key ...
+        self._expect = None
+        self._key = None
+        self._key_start = 0
+        self._value_start = 0
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether every declared output variable has been extracted.
+        """
+        return all(var in self.outputs for var in self.wanted)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume the next chunk of the response.
+
+        Args:
+            chunk: Response text chunk
+
+        Returns:
+            True once all declared output variables are complete
+        """
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._expect == 'key':
+                            self._key = text[self._key_start + 1:i]
+                            self._expect = 'colon'
+                        elif self._expect == 'value_end':
+                            self._finish_value(i + 1)
+                continue
+            if self._expect is None:
+                # Skip any text before the first JSON object
+                if c == '{':
+                    self._depth = 1
+                    self._expect = 'key'
+                continue
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._expect == 'key':
+                        self._key_start = i
+                    elif self._expect == 'value':
+                        self._value_start = i
+                        self._expect = 'value_end'
+            elif c in '{[':
+                if self._depth == 1 and self._expect == 'value':
+                    self._value_start = i
+                    self._expect = 'value_end'
+                self._depth += 1
+            elif c in '}]':
+                if self._depth == 1 and self._expect == 'value_end':
+                    # Primitive value closed by the end of the object
+                    self._finish_value(i)
+                self._depth -= 1
+                if self._depth == 1 and self._expect == 'value_end':
+                    self._finish_value(i + 1)
+                elif self._depth == 0:
+                    self._expect = 'done'
+            elif self._depth == 1:
+                if c == ':' and self._expect == 'colon':
+                    self._expect = 'value'
+                elif c == ',':
+                    if self._expect == 'value_end':
+                        self._finish_value(i)
+                    self._expect = 'key'
+                elif self._expect == 'value' and not c.isspace():
+                    self._value_start = i
+                    self._expect = 'value_end'
+        self._pos = len(text)
+        return self.complete
+
+    def _finish_value(self, end: int) -> None:
+        self._expect = 'after_value'
+        key = self._key
+        if key not in self.wanted or key in self.outputs:
+            return
+        raw = self.text[self._value_start:end].strip()
+        try:
+            value = json.loads(clean_json_string(raw))
+        except json.JSONDecodeError:
+            return
+        self.outputs[key] = value
+        if self.on_output:
+            self.on_output(key, value)
+
+
+def build_prompt_from_config(config_source: Union[str, Dict[str, Any]],
+                             input_variables: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """
+    Build the complete prompt from a compiled configuration template
 
     Args:
-        config_file_path: Configuration file path
+        config_source: Configuration file path or in-memory configuration dictionary
         input_variables: Input variable dictionary
 
     Returns:
-        Dictionary containing output results
+        Tuple of (configuration dictionary, complete prompt)
     """
-    # 1. Load configuration file
-    config = load_config(config_file_path)
+    template = get_prompt_template(config_source)
+    full_prompt, variable_tokens = template.render_with_usage(
+        input_variables,
+        compact=get_prompt_config("COMPACT_JSON"),
+        deduplicate=get_prompt_config("DEDUPLICATE_INJECTION"),
+        token_limits=get_prompt_config("VARIABLE_TOKEN_LIMITS"),
+        truncation=get_prompt_config("TRUNCATION"),
+        layout=get_prompt_config("LAYOUT"))
+    if get_prompt_config("TOKEN_ACCOUNTING"):
+        prompt_tokens = estimate_tokens(full_prompt)
+        record_prompt_tokens(template.config['name'], prompt_tokens, variable_tokens)
+    return template.config, full_prompt
+
+
+def parse_structured_output(response: str, output_vars: List[str]) -> Dict[str, Any]:
+    """
+    Extract output variables from a schema-constrained (pure JSON) response
 
-    # 2. Validate required configuration fields
-    required_fields = ['name', 'variables', 'prompt', 'output']
-    for field in required_fields:
-        if field not in config:
-            raise ValueError(
-                f"Configuration file missing required field: {field}")
+    Args:
+        response: LLM response text
+        output_vars: List of output variable names
 
-    # 3. Validate input variables
-    config_variables = config['variables']
-    missing_vars = [
-        var for var in config_variables if var not in input_variables]
-    if missing_vars:
-        raise ValueError(f"Missing required input variables: {missing_vars}")
-
-    # 4. Build complete prompt
-    prompt_template = config['prompt']
-
-    # Add format requirements to prompt
-    if 'format' in config:
-        format_info = config['format']
-        format_str = "\n\nOutput format requirements:\n"
-        for key, value in format_info.items():
-            if isinstance(value, str):
-                format_str += f"- {key}: {value}\n"
-            elif isinstance(value, list):
-                format_str += f"- {key}: {', '.join(value)}\n"
-            elif isinstance(value, dict):
-                format_str += f"- {key}:\n"
-                for sub_key, sub_value in value.items():
-                    format_str += f"  - {sub_key}: {sub_value}\n"
-
-        prompt_template += format_str
-
-    # 5. Inject variables
-    full_prompt = inject_variables(prompt_template, input_variables)
-
-    # 6. Add task description and input variable template
-    task_description = f"Task: {config['name']}\n\n"
-
-    # Add input variable template
-    input_template = "Input variables:\n"
-    for var_name in config_variables:
-        if var_name in input_variables:
-            var_value = input_variables[var_name]
-            if isinstance(var_value, str):
-                input_template += f"{var_name}: {var_value}\n"
-            else:
-                input_template += f"{var_name}: {json.dumps(var_value, ensure_ascii=False, indent=2)}\n"
-    input_template += "\n"
-
-    full_prompt = task_description + input_template + full_prompt
-
-    # 7. Call LLM
-    response = ask_openai(system=get_generator_prompt(), prompt=full_prompt)
+    Returns:
+        Dictionary of the output variables present in the response
+    """
+    try:
+        data = json.loads(response)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {var: data[var] for var in output_vars if var in data}
+
+
+def build_result(config: Dict[str, Any], input_variables: Dict[str, Any],
+                 full_prompt: str, response: Optional[str],
+                 streamed_output: Optional[Dict[str, Any]] = None,
+                 stream_stats: Optional[Dict[str, Any]] = None,
+                 structured: bool = False, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract output variables from LLM response and assemble the result
+
+    Args:
+        config: Configuration dictionary
+        input_variables: Input variable dictionary
+        full_prompt: Complete prompt sent to LLM
+        response: LLM response text
+        streamed_output: Output variables already extracted while streaming
+        stream_stats: Timing statistics of a streamed response
+        structured: Whether the response was requested as schema-constrained JSON
+        model: Model that produced the response
 
+    Returns:
+        Dictionary containing output results
+    """
     # Check if response is None
     if response is None:
         raise ValueError("Failed to get response from LLM")
 
-    # 8. Extract output variables
+    # Extract output variables
     output_vars = config['output']
-    extracted_results = extract_output_variables(response, output_vars)
+    extracted_results = dict(streamed_output or {})
+    missing_vars = [var for var in output_vars if var not in extracted_results]
+    if missing_vars and structured:
+        # A schema-constrained response is a single JSON object
+        extracted_results.update(parse_structured_output(response, missing_vars))
+        missing_vars = [var for var in output_vars if var not in extracted_results]
+    if missing_vars:
+        extracted_results.update(extract_output_variables(response, missing_vars))
 
-    # 9. Return results
     final_result = {
         'config_name': config['name'],
         'input_variables': input_variables,
@@ -287,10 +435,490 @@ def generate_prompt_from_config(config_file_path: str, input_variables: Dict[str
         'llm_response': response,
         'extracted_output': extracted_results
     }
+    if model is not None:
+        final_result['model'] = model
+    if stream_stats is not None:
+        final_result['stream_stats'] = stream_stats
 
     return final_result
 
 
+def _print_stream_stats(config: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    if stats['ttfb'] is None:
+        return
+    print(f"[{config['name']}] time to first byte: {stats['ttfb']:.2f}s, "
+          f"time to complete: {stats['time_to_complete']:.2f}s"
+          f"{' (stopped early)' if stats['stopped_early'] else ''}")
+
+
+def _new_stream_extractor(config: Dict[str, Any]) -> IncrementalOutputExtractor:
+    start = time.perf_counter()
+    return IncrementalOutputExtractor(
+        config['output'],
+        on_output=lambda name, _: print(
+            f"[{config['name']}] output '{name}' complete after {time.perf_counter() - start:.2f}s"))
+
+
+def _record(config: Dict[str, Any], full_prompt: str, response: Optional[str]) -> None:
+    cassette = get_cassette()
+    if cassette and cassette.mode == 'record' and response is not None:
+        cassette.record(config['name'], full_prompt, response)
+
+
+def get_route_chain(config: Dict[str, Any]) -> List[Tuple[str, int, Optional[float]]]:
+    """
+    Get the models to try for a configuration's stage, primary model first.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        List of (model, max_tokens, timeout) in fallback order
+    """
+    route = get_llm_route(config.get('stage'))
+    chain = [(route['MODEL'], route['MAX_TOKENS'], route['TIMEOUT'])]
+    for fallback in route['FALLBACK'] or []:
+        if isinstance(fallback, str):
+            chain.append((fallback, route['MAX_TOKENS'], route['TIMEOUT']))
+        else:
+            chain.append((fallback['MODEL'],
+                          fallback.get('MAX_TOKENS', route['MAX_TOKENS']),
+                          fallback.get('TIMEOUT', route['TIMEOUT'])))
+    return chain
+
+
+def _hedge_stage(config: Dict[str, Any]) -> str:
+    return config.get('stage') or config['name']
+
+
+def _print_fallback(config: Dict[str, Any], attempt: int, model: str) -> None:
+    if attempt:
+        print(f"[{config['name']}] previous model failed, falling back to {model}")
+
+
+def _repair_budget(config: Dict[str, Any]) -> int:
+    if not get_repair_config("ENABLED"):
+        return 0
+    attempts = get_llm_route(config.get('stage')).get("REPAIR_ATTEMPTS")
+    return get_repair_config("MAX_ATTEMPTS") if attempts is None else attempts
+
+
+def _start_repair(config: Dict[str, Any], result: Dict[str, Any],
+                  invalid: Dict[str, List[str]], attempt: int) -> str:
+    """
+    Build the next repair prompt and account for its tokens.
+    """
+    repair_prompt = build_repair_prompt(config, result['llm_response'], invalid,
+                                        get_repair_config("FRAGMENT_TOKENS"))
+    prompt_tokens = estimate_tokens(repair_prompt)
+    if get_prompt_config("TOKEN_ACCOUNTING"):
+        record_prompt_tokens(f"{config['name']} (repair)", prompt_tokens)
+    stats = result.setdefault('repair', {'attempts': 0, 'prompt_tokens': 0, 'repaired': []})
+    stats['attempts'] = attempt
+    stats['prompt_tokens'] += prompt_tokens
+    print(f"[{config['name']}] invalid output {', '.join(invalid)}, repair attempt {attempt} "
+          f"({prompt_tokens} prompt tokens)")
+    return repair_prompt
+
+
+def _replay_repair(config: Dict[str, Any], repair_prompt: str) -> Tuple[bool, Optional[str]]:
+    """
+    Look up a repair answer in a replay cassette.
+
+    Returns:
+        Tuple of (whether a replay cassette is active, recorded answer or None)
+    """
+    cassette = get_cassette()
+    if not cassette or cassette.mode != 'replay':
+        return False, None
+    try:
+        return True, cassette.lookup(f"{config['name']} (repair)", repair_prompt)
+    except CassetteMissError:
+        print(f"[{config['name']}] repair prompt not in cassette, keeping invalid output")
+        return True, None
+
+
+def _apply_repair(config: Dict[str, Any], result: Dict[str, Any], invalid: Dict[str, List[str]],
+                  repair_prompt: str, response: Optional[str]) -> Dict[str, List[str]]:
+    """
+    Merge the valid outputs of a repair answer into the result.
+
+    Returns:
+        Output variables that are still invalid
+    """
+    if response is None:
+        return invalid
+    cassette = get_cassette()
+    if cassette and cassette.mode == 'record':
+        cassette.record(f"{config['name']} (repair)", repair_prompt, response)
+    repaired = extract_output_variables(response, list(invalid))
+    candidate = dict(result['extracted_output'], **repaired)
+    remaining = {var: problems for var, problems in validate_output(config, candidate).items()
+                 if var in invalid}
+    for var, value in repaired.items():
+        if var not in remaining:
+            result['extracted_output'][var] = value
+            result['repair']['repaired'].append(var)
+    return remaining
+
+
+def _finish_repair(config: Dict[str, Any], result: Dict[str, Any],
+                   invalid: Dict[str, List[str]]) -> Dict[str, Any]:
+    if 'repair' in result:
+        result['repair']['unresolved'] = list(invalid)
+    if invalid:
+        print(f"[{config['name']}] output still invalid: "
+              f"{'; '.join(problem for problems in invalid.values() for problem in problems[:3])}")
+    return result
+
+
+def _repair_result(config: Dict[str, Any], system: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Repair missing or malformed output variables with targeted follow-up prompts.
+    """
+    invalid = validate_output(config, result['extracted_output'])
+    budget = _repair_budget(config)
+    model, max_tokens, timeout = get_route_chain(config)[0]
+    for attempt in range(1, budget + 1):
+        if not invalid:
+            break
+        repair_prompt = _start_repair(config, result, invalid, attempt)
+        replayed, response = _replay_repair(config, repair_prompt)
+        if replayed and response is None:
+            break
+        if not replayed:
+            with stage_scope(config['name']):
+                response = ask_openai(system=system, prompt=repair_prompt, model=model,
+                                      max_tokens=max_tokens, timeout=timeout)
+        invalid = _apply_repair(config, result, invalid, repair_prompt, response)
+    return _finish_repair(config, result, invalid)
+
+
+async def _repair_result_async(config: Dict[str, Any], system: str,
+                               result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Repair missing or malformed output variables without blocking.
+    """
+    invalid = validate_output(config, result['extracted_output'])
+    budget = _repair_budget(config)
+    model, max_tokens, timeout = get_route_chain(config)[0]
+    for attempt in range(1, budget + 1):
+        if not invalid:
+            break
+        repair_prompt = _start_repair(config, result, invalid, attempt)
+        replayed, response = _replay_repair(config, repair_prompt)
+        if replayed and response is None:
+            break
+        if not replayed:
+            with stage_scope(config['name']):
+                response = await ask_openai_async(system=system, prompt=repair_prompt, model=model,
+                                                  max_tokens=max_tokens, timeout=timeout)
+        invalid = _apply_repair(config, result, invalid, repair_prompt, response)
+    return _finish_repair(config, result, invalid)
+
+
+def _execute_prompt(config: Dict[str, Any], input_variables: Dict[str, Any],
+                    system: str, full_prompt: str) -> Dict[str, Any]:
+    """
+    Call LLM with the built prompt (or replay it from the cassette) and assemble the result.
+
+    The stage's routed model is tried first, then its fallback chain until one answers.
+    Missing or malformed outputs are then repaired with targeted follow-up prompts.
+    """
+    structured = get_llm_config("STRUCTURED_OUTPUT")
+    cassette = get_cassette()
+    if cassette and cassette.mode == 'replay':
+        response = cassette.lookup(config['name'], full_prompt)
+        note_cache('cassette')
+        return _repair_result(config, system, build_result(
+            config, input_variables, full_prompt, response, structured=structured))
+
+    response_format = get_response_format(config) if structured else None
+    stream = get_llm_config("STREAM")
+    response = extractor = stats = None
+    for attempt, (model, max_tokens, timeout) in enumerate(get_route_chain(config)):
+        _print_fallback(config, attempt, model)
+
+        def request(cancel):
+            with stage_scope(config['name']):
+                if not stream:
+                    response = ask_openai(system=system, prompt=full_prompt, model=model,
+                                          max_tokens=max_tokens, response_format=response_format,
+                                          timeout=timeout, cancel=cancel)
+                    return None if response is None else (response, None, None)
+                extractor = _new_stream_extractor(config)
+                # A hedged duplicate that lost stops reading its stream
+                cancelled = cancel.is_set if cancel is not None else lambda: False
+                response, stats = ask_openai_stream(
+                    system=system, prompt=full_prompt, model=model, max_tokens=max_tokens,
+                    on_delta=lambda chunk: cancelled() or extractor.feed(chunk),
+                    response_format=response_format, timeout=timeout)
+                if cancelled() or response is None:
+                    return None
+                _print_stream_stats(config, stats)
+                return response, extractor, stats
+
+        result = hedged_call(_hedge_stage(config), request)
+        if result is not None:
+            response, extractor, stats = result
+            break
+
+    _record(config, full_prompt, response)
+    return _repair_result(config, system, build_result(
+        config, input_variables, full_prompt, response,
+        extractor.outputs if extractor else None, stats, structured, model))
+
+
+async def _execute_prompt_async(config: Dict[str, Any], input_variables: Dict[str, Any],
+                                system: str, full_prompt: str,
+                                timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Call LLM with the built prompt (or replay it from the cassette) without blocking
+    and assemble the result.
+
+    The stage's routed model is tried first, then its fallback chain until one
+    answers. A timeout given here overrides the routed per-call timeouts. Missing or
+    malformed outputs are then repaired with targeted follow-up prompts.
+    """
+    structured = get_llm_config("STRUCTURED_OUTPUT")
+    cassette = get_cassette()
+    if cassette and cassette.mode == 'replay':
+        response = cassette.lookup(config['name'], full_prompt)
+        note_cache('cassette')
+        return await _repair_result_async(config, system, build_result(
+            config, input_variables, full_prompt, response, structured=structured))
+
+    response_format = get_response_format(config) if structured else None
+    stream = get_llm_config("STREAM")
+    response = extractor = stats = None
+    for attempt, (model, max_tokens, route_timeout) in enumerate(get_route_chain(config)):
+        _print_fallback(config, attempt, model)
+        call_timeout = timeout if timeout is not None else route_timeout
+
+        async def request():
+            with stage_scope(config['name']):
+                if not stream:
+                    response = await ask_openai_async(
+                        system=system, prompt=full_prompt, model=model, max_tokens=max_tokens,
+                        timeout=call_timeout, response_format=response_format)
+                    return None if response is None else (response, None, None)
+                extractor = _new_stream_extractor(config)
+                response, stats = await ask_openai_stream_async(
+                    system=system, prompt=full_prompt, model=model, max_tokens=max_tokens,
+                    on_delta=extractor.feed, timeout=call_timeout,
+                    response_format=response_format)
+                if response is None:
+                    return None
+                _print_stream_stats(config, stats)
+                return response, extractor, stats
+
+        result = await hedged_call_async(_hedge_stage(config), request)
+        if result is not None:
+            response, extractor, stats = result
+            break
+
+    _record(config, full_prompt, response)
+    return await _repair_result_async(config, system, build_result(
+        config, input_variables, full_prompt, response,
+        extractor.outputs if extractor else None, stats, structured, model))
+
+
+@contextlib.contextmanager
+def single_flight_run():
+    """
+    Reuse the results of identical requests until the end of the with block.
+
+    Also usable as a decorator. A nested run joins the enclosing one, and
+    stage threads started inside the block share it through their copied
+    context.
+    """
+    if _SINGLE_FLIGHT_RUN.get() is not None:
+        yield
+        return
+    token = _SINGLE_FLIGHT_RUN.set({})
+    try:
+        yield
+    finally:
+        _SINGLE_FLIGHT_RUN.reset(token)
+
+
+def clear_single_flight() -> None:
+    """
+    Forget the calls in flight and the results of the current run, so that
+    the next identical calls query the LLM again.
+    """
+    run = _SINGLE_FLIGHT_RUN.get()
+    with _SINGLE_FLIGHT_LOCK:
+        _SINGLE_FLIGHT.clear()
+        if run is not None:
+            run.clear()
+
+
+def _single_flight_key(config: Dict[str, Any], system: str, full_prompt: str) -> str:
+    # Only calls that would send the same request share its result
+    models = [(model, max_tokens) for model, max_tokens, _ in get_route_chain(config)]
+    response_format = get_response_format(config) if get_llm_config("STRUCTURED_OUTPUT") else None
+    payload = json.dumps([system, full_prompt, models, response_format],
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _join_single_flight(key: str) -> Tuple[Future, bool]:
+    """
+    Get the shared future for a prompt (in flight, or completed in the current
+    run), creating it if this caller is the leader.
+
+    Returns:
+        Tuple of (future, whether this caller must compute the result)
+    """
+    run = _SINGLE_FLIGHT_RUN.get()
+    with _SINGLE_FLIGHT_LOCK:
+        future = _SINGLE_FLIGHT.get(key)
+        if future is None and run is not None:
+            future = run.get(key)
+        if future is not None:
+            return future, False
+        future = Future()
+        # Running futures cannot be cancelled by a waiting call that is cancelled itself
+        future.set_running_or_notify_cancel()
+        _SINGLE_FLIGHT[key] = future
+        if run is not None:
+            run[key] = future
+        return future, True
+
+
+def _leave_single_flight(key: str, future: Future, error: Optional[BaseException] = None) -> None:
+    """
+    Remove the leader's in-flight entry and pass a failure on to the waiting
+    calls. A successful result stays available to the current run only.
+    """
+    run = _SINGLE_FLIGHT_RUN.get()
+    with _SINGLE_FLIGHT_LOCK:
+        if _SINGLE_FLIGHT.get(key) is future:
+            del _SINGLE_FLIGHT[key]
+        if error is not None and run is not None and run.get(key) is future:
+            # Later calls of the run retry instead of replaying the error
+            del run[key]
+    if error is None:
+        return
+    if isinstance(error, Exception):
+        future.set_exception(error)
+    else:
+        # Cancelled or interrupted leader
+        future.set_exception(_LeaderCancelled())
+
+
+def _observe_result(config: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Complete the telemetry record of the call with the outcome of its result.
+    """
+    repair = result.get('repair', {})
+    invalid = [var for var in config['output'] if var not in result['extracted_output']]
+    invalid += [var for var in repair.get('unresolved', []) if var not in invalid]
+    stream_stats = result.get('stream_stats') or {}
+    update_call(model=result.get('model'), extraction_success=not invalid,
+                invalid_outputs=invalid, repair_attempts=repair.get('attempts', 0),
+                ttfb=stream_stats.get('ttfb'))
+    return result
+
+
+def generate_prompt_from_config(config_source: Union[str, Dict[str, Any]],
+                                input_variables: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate prompt from configuration file and execute
+
+    Args:
+        config_source: Configuration file path or in-memory configuration dictionary
+        input_variables: Input variable dictionary
+
+    Returns:
+        Dictionary containing output results
+    """
+    config, full_prompt = build_prompt_from_config(
+        config_source, input_variables)
+    system = get_generator_prompt()
+
+    with call_span(config['name'], config.get('stage')):
+        if not get_llm_config("SINGLE_FLIGHT"):
+            return _observe_result(config, _execute_prompt(
+                config, input_variables, system, full_prompt))
+
+        key = _single_flight_key(config, system, full_prompt)
+        while True:
+            future, is_leader = _join_single_flight(key)
+            if is_leader:
+                try:
+                    future.set_result(_execute_prompt(
+                        config, input_variables, system, full_prompt))
+                except BaseException as e:
+                    _leave_single_flight(key, future, e)
+                    raise
+                _leave_single_flight(key, future)
+                break
+            try:
+                future.result()
+            except _LeaderCancelled:
+                continue
+            print(f"Reusing result of identical prompt for: {config['name']}")
+            note_cache('single_flight')
+            break
+
+        # Callers may modify the result, so each gets its own copy
+        return _observe_result(config, copy.deepcopy(future.result()))
+
+
+async def generate_prompt_from_config_async(config_source: Union[str, Dict[str, Any]],
+                                            input_variables: Dict[str, Any],
+                                            timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Generate prompt from configuration file and execute without blocking
+
+    Independent prompts can be awaited together (e.g. with asyncio.gather);
+    the number of requests in flight is bounded by LLM.MAX_CONCURRENCY.
+
+    Args:
+        config_source: Configuration file path or in-memory configuration dictionary
+        input_variables: Input variable dictionary
+        timeout: Per-call timeout in seconds (default: the routed timeout of the stage)
+
+    Returns:
+        Dictionary containing output results
+    """
+    import asyncio
+
+    config, full_prompt = build_prompt_from_config(
+        config_source, input_variables)
+    system = get_generator_prompt()
+
+    with call_span(config['name'], config.get('stage')):
+        if not get_llm_config("SINGLE_FLIGHT"):
+            return _observe_result(config, await _execute_prompt_async(
+                config, input_variables, system, full_prompt, timeout))
+
+        key = _single_flight_key(config, system, full_prompt)
+        while True:
+            future, is_leader = _join_single_flight(key)
+            if is_leader:
+                try:
+                    future.set_result(await _execute_prompt_async(
+                        config, input_variables, system, full_prompt, timeout))
+                except BaseException as e:
+                    _leave_single_flight(key, future, e)
+                    raise
+                _leave_single_flight(key, future)
+                break
+            try:
+                await asyncio.wrap_future(future)
+            except _LeaderCancelled:
+                continue
+            print(f"Reusing result of identical prompt for: {config['name']}")
+            note_cache('single_flight')
+            break
+
+        # Callers may modify the result, so each gets its own copy
+        return _observe_result(config, copy.deepcopy(future.result()))
+
+
 def process_config_directory(config_dir: str, input_variables: Dict[str, Any]) -> Dict[str, Any]:
     """
     Process all JSON files in configuration directory
@@ -322,6 +950,41 @@ def process_config_directory(config_dir: str, input_variables: Dict[str, Any]) -
     return results
 
 
+def test_single_flight_run():
+    """
+    Check that a repeated identical call within a run makes no network
+    request, and that a new run queries the LLM again.
+    """
+    from utils.configure import config_scope
+
+    global ask_openai
+    requests = []
+
+    def fake_ask_openai(system, prompt, **kwargs):
+        requests.append(prompt)
+        return '{"answer": "42"}'
+
+    config = {'name': 'single flight check', 'variables': ['QUESTION'],
+              'prompt': 'Answer $QUESTION', 'output': ['answer'], 'format': {'answer': 'string'}}
+    real_ask_openai = ask_openai
+    ask_openai = fake_ask_openai
+    try:
+        with config_scope({'LLM': {'SINGLE_FLIGHT': True, 'STREAM': False, 'CASSETTE_MODE': 'off'},
+                           'LLM_CACHE': {'ENABLED': False}, 'LLM_HEDGE': {'ENABLED': False},
+                           'TELEMETRY': {'ENABLED': False}}):
+            with single_flight_run():
+                first = generate_prompt_from_config(config, {'QUESTION': 'q'})
+                second = generate_prompt_from_config(config, {'QUESTION': 'q'})
+            assert len(requests) == 1, f"expected 1 request within a run, got {len(requests)}"
+            assert first['extracted_output'] == second['extracted_output']
+            with single_flight_run():
+                generate_prompt_from_config(config, {'QUESTION': 'q'})
+            assert len(requests) == 2, f"expected a new request in a new run, got {len(requests)}"
+    finally:
+        ask_openai = real_ask_openai
+    print("single_flight_run check passed")
+
+
 # Usage example
 if __name__ == "__main__":
     # Example: Process single configuration file
@@ -0,0 +1,338 @@
+"""
+Offline batch jobs for dataset-scale prompt workloads.
+
+Instead of one interactive request per item, all prompts of a run are built
+with the regular prompt configurations and routing, written as a
+chat-completions compatible JSONL job (one {"custom_id", "method", "url",
+"body"} request per line), submitted through a batch backend, polled until
+the job finishes, and the answers are mapped back to their custom_id and
+extracted exactly like interactive results.
+
+Backends (BATCH.BACKEND in configure.yml):
+    openai  OpenAI Batch API (files + batches endpoints, half price, 24h window)
+    local   File-based stand-in that answers the job with utils/prompt.ask_openai,
+            e.g. against python -m utils.mock_server, for testing without the Batch API
+
+A job's manifest (<JOB_DIR>/<job name>.manifest.json) keeps the backend job id,
+so an interrupted run resumes polling the same job instead of resubmitting.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from utils.agent import build_prompt_from_config, build_result, get_route_chain
+from utils.configure import get_batch_config, get_generator_prompt, get_llm_config
+from utils.prompt import ask_openai, load_client
+from utils.schema import get_response_format
+from utils.telemetry import record_call
+from utils.tokens import get_cached_tokens
+
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+# Backend job states after which polling stops
+FINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchBackend(ABC):
+    """
+    Interface of a batch backend
+    """
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """
+        Submit a JSONL job file.
+
+        Args:
+            input_path: Path of the JSONL job file
+
+        Returns:
+            Backend job id
+        """
+
+    @abstractmethod
+    def poll(self, job_id: str) -> str:
+        """
+        Get the state of a job ('validating', 'in_progress', 'completed', 'failed', ...).
+        """
+
+    @abstractmethod
+    def fetch_results(self, job_id: str) -> List[Dict[str, Any]]:
+        """
+        Get the output lines of a completed job.
+
+        Returns:
+            List of {"custom_id", "response": {"status_code", "body"}, "error"} objects
+        """
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """
+    OpenAI Batch API backend
+    """
+
+    def __init__(self, completion_window: str = "24h"):
+        self.completion_window = completion_window
+
+    def _client(self):
+        client = load_client()
+        if client is None:
+            raise ValueError("OpenAI client is not available for batch submission")
+        return client
+
+    def submit(self, input_path: str) -> str:
+        client = self._client()
+        with open(input_path, 'rb') as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        job = client.batches.create(input_file_id=input_file.id,
+                                    endpoint=CHAT_COMPLETIONS_URL,
+                                    completion_window=self.completion_window)
+        return job.id
+
+    def poll(self, job_id: str) -> str:
+        return self._client().batches.retrieve(job_id).status
+
+    def fetch_results(self, job_id: str) -> List[Dict[str, Any]]:
+        client = self._client()
+        job = client.batches.retrieve(job_id)
+        lines = []
+        # Failed requests are reported in a separate error file
+        for file_id in (job.output_file_id, job.error_file_id):
+            if file_id:
+                text = client.files.content(file_id).text
+                lines.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        return lines
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based batch stand-in for tests
+
+    A job is a directory holding the submitted input.jsonl. The job is
+    processed on the first poll by answering each request with ask_openai
+    (so it can run against the mock server) and writing output.jsonl in
+    the Batch API output format.
+    """
+
+    def __init__(self, job_dir: str):
+        self.job_dir = job_dir
+
+    def _path(self, job_id: str, name: str) -> str:
+        return os.path.join(self.job_dir, job_id, name)
+
+    def submit(self, input_path: str) -> str:
+        job_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        os.makedirs(os.path.join(self.job_dir, job_id), exist_ok=True)
+        shutil.copyfile(input_path, self._path(job_id, 'input.jsonl'))
+        return job_id
+
+    def poll(self, job_id: str) -> str:
+        if not os.path.exists(self._path(job_id, 'input.jsonl')):
+            return 'failed'
+        if not os.path.exists(self._path(job_id, 'output.jsonl')):
+            self._process(job_id)
+        return 'completed'
+
+    def _process(self, job_id: str) -> None:
+        with open(self._path(job_id, 'input.jsonl'), 'r', encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        lines = []
+        for request in requests:
+            body = request['body']
+            messages = {message['role']: message['content'] for message in body['messages']}
+            content = ask_openai(system=messages.get('system', ''), prompt=messages.get('user', ''),
+                                 model=body['model'], max_tokens=body.get('max_tokens', 6000),
+                                 response_format=body.get('response_format'))
+            if content is None:
+                lines.append({'id': f"batch_req_{uuid.uuid4().hex}", 'custom_id': request['custom_id'],
+                              'response': None,
+                              'error': {'code': 'request_failed', 'message': 'LLM call failed'}})
+                continue
+            lines.append({
+                'id': f"batch_req_{uuid.uuid4().hex}",
+                'custom_id': request['custom_id'],
+                'response': {'status_code': 200, 'body': {
+                    'object': 'chat.completion',
+                    'model': body['model'],
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': content}}]}},
+                'error': None
+            })
+        temp_path = self._path(job_id, 'output.jsonl.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+        os.replace(temp_path, self._path(job_id, 'output.jsonl'))
+
+    def fetch_results(self, job_id: str) -> List[Dict[str, Any]]:
+        with open(self._path(job_id, 'output.jsonl'), 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def get_batch_backend(name: Optional[str] = None) -> BatchBackend:
+    """
+    Create the configured batch backend.
+
+    Args:
+        name: Backend name, 'openai' or 'local' (default: BATCH.BACKEND)
+
+    Returns:
+        BatchBackend instance
+    """
+    name = name or get_batch_config("BACKEND")
+    if name == 'openai':
+        return OpenAIBatchBackend(get_batch_config("COMPLETION_WINDOW"))
+    if name == 'local':
+        return LocalBatchBackend(os.path.join(_job_dir(), 'local'))
+    raise ValueError(f"Unknown batch backend: {name}")
+
+
+def _job_dir() -> str:
+    job_dir = get_batch_config("JOB_DIR")
+    if not os.path.isabs(job_dir):
+        # Relative paths are resolved against the project root
+        job_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), job_dir)
+    return job_dir
+
+
+def build_batch_request(custom_id: str, config_source: Union[str, Dict[str, Any]],
+                        input_variables: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+    """
+    Build one batch job line from a prompt configuration.
+
+    Args:
+        custom_id: Identifier used to map the answer back to its source
+        config_source: Configuration file path or in-memory configuration dictionary
+        input_variables: Input variable dictionary
+
+    Returns:
+        Tuple of (JSONL request object, configuration dictionary, complete prompt)
+    """
+    config, full_prompt = build_prompt_from_config(config_source, input_variables)
+    # Batch jobs have no fallback, the stage's primary model is used
+    model, max_tokens, _ = get_route_chain(config)[0]
+    body = {
+        'model': model,
+        'messages': [
+            {'role': 'system', 'content': get_generator_prompt()},
+            {'role': 'user', 'content': full_prompt},
+        ],
+        'max_tokens': max_tokens
+    }
+    if get_llm_config("STRUCTURED_OUTPUT"):
+        body['response_format'] = get_response_format(config)
+    request = {'custom_id': custom_id, 'method': 'POST',
+               'url': CHAT_COMPLETIONS_URL, 'body': body}
+    return request, config, full_prompt
+
+
+def _response_content(line: Dict[str, Any]) -> Optional[str]:
+    response = line.get('response') or {}
+    if line.get('error') or response.get('status_code') != 200:
+        return None
+    try:
+        return response['body']['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _record_telemetry(job_id: str, config: Dict[str, Any], line: Dict[str, Any],
+                      result: Dict[str, Any]) -> None:
+    body = (line.get('response') or {}).get('body') or {}
+    usage = body.get('usage') or {}
+    extracted = result.get('extracted_output', {})
+    invalid = [var for var in config['output'] if var not in extracted]
+    record_call(config['name'], config.get('stage'), run_id=job_id, model=body.get('model'),
+                status='error' if 'error' in result else 'ok', error=result.get('error'),
+                requests=1, cache='batch', prompt_tokens=usage.get('prompt_tokens') or 0,
+                completion_tokens=usage.get('completion_tokens') or 0,
+                cached_tokens=get_cached_tokens(usage),
+                extraction_success=not invalid and 'error' not in result, invalid_outputs=invalid)
+
+
+def run_batch(items: List[Tuple[str, Union[str, Dict[str, Any]], Dict[str, Any]]],
+              job_name: str, backend: Optional[BatchBackend] = None,
+              poll_interval: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Run prompts as one batch job and extract their outputs.
+
+    Args:
+        items: List of (custom_id, configuration file path or dictionary, input variables)
+        job_name: Name of the job's JSONL and manifest files under BATCH.JOB_DIR
+        backend: Batch backend (default: BATCH.BACKEND)
+        poll_interval: Seconds between status polls (default: BATCH.POLL_INTERVAL)
+
+    Returns:
+        Mapping of custom_id to a result like generate_prompt_from_config returns,
+        or to {'error': message} for requests that failed
+    """
+    backend = backend or get_batch_backend()
+    if poll_interval is None:
+        poll_interval = get_batch_config("POLL_INTERVAL")
+    job_dir = _job_dir()
+    os.makedirs(job_dir, exist_ok=True)
+
+    prepared = {}
+    lines = []
+    for custom_id, config_source, input_variables in items:
+        if custom_id in prepared:
+            raise ValueError(f"Duplicate batch custom_id: {custom_id}")
+        request, config, full_prompt = build_batch_request(custom_id, config_source, input_variables)
+        prepared[custom_id] = (config, input_variables, full_prompt)
+        lines.append(json.dumps(request, ensure_ascii=False))
+    payload = '\n'.join(lines) + '\n'
+    input_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    input_path = os.path.join(job_dir, f"{job_name}.jsonl")
+    manifest_path = os.path.join(job_dir, f"{job_name}.manifest.json")
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('input_hash') != input_hash:
+            manifest = None
+    if manifest is None:
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        job_id = backend.submit(input_path)
+        manifest = {'job_id': job_id, 'input_hash': input_hash,
+                    'requests': len(lines), 'submitted_at': time.time()}
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        print(f"Submitted batch job {job_id} with {len(lines)} requests: {input_path}")
+    else:
+        print(f"Resuming batch job {manifest['job_id']}")
+
+    job_id = manifest['job_id']
+    while True:
+        status = backend.poll(job_id)
+        if status in FINAL_STATES:
+            break
+        print(f"Batch job {job_id} is {status}, checking again in {poll_interval}s")
+        time.sleep(poll_interval)
+    if status != 'completed':
+        raise ValueError(f"Batch job {job_id} ended with status: {status}")
+
+    structured = get_llm_config("STRUCTURED_OUTPUT")
+    results = {custom_id: {'error': 'No result returned by the batch job'} for custom_id in prepared}
+    for line in backend.fetch_results(job_id):
+        custom_id = line.get('custom_id')
+        if custom_id not in prepared:
+            continue
+        config, input_variables, full_prompt = prepared[custom_id]
+        try:
+            results[custom_id] = build_result(config, input_variables, full_prompt,
+                                              _response_content(line), structured=structured)
+        except ValueError as e:
+            results[custom_id] = {'error': str(e)}
+        _record_telemetry(job_id, config, line, results[custom_id])
+    failed = sum(1 for result in results.values() if 'error' in result)
+    print(f"Batch job {job_id} completed: {len(results) - failed} succeeded, {failed} failed")
+    return results
@@ -0,0 +1,227 @@
+"""
+Micro-benchmark for LLM output extraction.
+
+Compares utils.agent.extract_output_variables against the previous
+per-variable implementation (which re-parsed the response and rebuilt its
+regex patterns for every output variable) over a corpus of recorded
+responses, and checks that both return identical results.
+
+Usage:
+    python -m utils.bench_extract workplace/ workplace/llm_cassette.jsonl.gz
+    python -m utils.bench_extract --synthetic 8 --repeat 200
+
+Corpus sources:
+    - *_output.json results written by the pipeline (directories are searched recursively)
+    - record/replay cassettes (*.jsonl.gz, see utils/cassette.py)
+    - synthetic multi-kilobyte responses (--synthetic SIZE_KB)
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Tuple
+
+from utils.agent import clean_json_string, extract_output_variables
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_extract_output_variables(response: str, output_vars: List[str]) -> Dict[str, Any]:
+    """
+    Previous extract_output_variables implementation, kept as the baseline
+    """
+    extracted_result = {}
+
+    for var_name in output_vars:
+        escaped_var_name = re.escape(var_name)
+
+        try:
+            json_start = response.find('{')
+            json_end = response.rfind('}')
+            if json_start != -1 and json_end != -1 and json_end > json_start:
+                full_json = json.loads(clean_json_string(response[json_start:json_end + 1]))
+                if var_name in full_json:
+                    extracted_result[var_name] = full_json[var_name]
+                    continue
+        except (json.JSONDecodeError, TypeError, ValueError):
+            pass
+
+        patterns = [
+            rf'"{escaped_var_name}":\s*(\[.*?\])',
+            rf'"{escaped_var_name}":\s*(\{{.*?\}})',
+            rf'"{escaped_var_name}":\s*"([^"]*)"',
+            rf'"{escaped_var_name}":\s*([^,\n\r]+)',
+            rf'{escaped_var_name}:\s*(\[.*?\])',
+            rf'{escaped_var_name}:\s*(\{{.*?\}})',
+            rf'{escaped_var_name}:\s*"([^"]*)"',
+            rf'{escaped_var_name}:\s*([^,\n\r]+)',
+            rf'\*\*{escaped_var_name}:\*\*\s*\n((?:- \[.*?\]\n?)+)',
+            rf'\*\*{escaped_var_name}:\*\*\s*\n(.*?)(?=\n\*\*|\n\n|\Z)',
+            rf'\*\*{escaped_var_name}:\*\*\s*\n((?:- .*?\n?)+)',
+        ]
+
+        for pattern in patterns:
+            match = re.search(pattern, response, re.DOTALL | re.IGNORECASE)
+            if not match:
+                continue
+            if '**' in pattern:
+                if r'((?:- \[.*?\]\n?)+)' in pattern:
+                    list_matches = re.findall(r'- \[(.*?)\]', match.group(1))
+                    if list_matches:
+                        extracted_result[var_name] = [item.strip() for item in list_matches]
+                        break
+                elif r'((?:- .*?\n?)+)' in pattern:
+                    list_matches = re.findall(r'- (.*?)(?:\n|$)', match.group(1))
+                    if list_matches:
+                        extracted_result[var_name] = [item.strip() for item in list_matches]
+                        break
+                else:
+                    content = match.group(1).strip()
+                    if content:
+                        extracted_result[var_name] = content
+                        break
+            else:
+                matched_content = match.group(1).strip()
+                try:
+                    extracted_result[var_name] = json.loads(clean_json_string(matched_content))
+                except json.JSONDecodeError:
+                    extracted_result[var_name] = matched_content
+                break
+
+    return extracted_result
+
+
+def load_config_outputs() -> Dict[str, List[str]]:
+    """
+    Map each prompt configuration name in the repository to its output variables.
+    """
+    outputs = {}
+    for path in glob.glob(os.path.join(PROJECT_ROOT, '*', 'config', '*.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            outputs[config['name']] = list(config['output'])
+        except (json.JSONDecodeError, KeyError, OSError):
+            continue
+    return outputs
+
+
+def load_corpus(paths: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Load (response, output variables) pairs from result files and cassettes.
+
+    Args:
+        paths: Files or directories to read
+
+    Returns:
+        List of (response text, output variable names)
+    """
+    config_outputs = load_config_outputs()
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '**', '*_output.json'), recursive=True))
+            files.extend(glob.glob(os.path.join(path, '**', '*.jsonl.gz'), recursive=True))
+        else:
+            files.append(path)
+
+    corpus = []
+    for file_path in sorted(files):
+        if file_path.endswith('.jsonl.gz'):
+            with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            for entry in entries:
+                output_vars = config_outputs.get(entry.get('config_name'))
+                if output_vars:
+                    corpus.append((entry['response'], output_vars))
+            continue
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            continue
+        if not isinstance(result, dict) or not result.get('llm_response'):
+            continue
+        output_vars = config_outputs.get(result.get('config_name')) \
+            or list(result.get('extracted_output', {}))
+        if output_vars:
+            corpus.append((result['llm_response'], output_vars))
+    return corpus
+
+
+def synthetic_corpus(size_kb: int, count: int = 20, seed: int = 0) -> List[Tuple[str, List[str]]]:
+    """
+    Build symbol-extraction style responses of roughly size_kb kilobytes.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(count):
+        actors = [{'actor_name': f'Actor {i}', 'symbol': chr(65 + i % 26)} for i in range(4)]
+        tasks = []
+        while len(json.dumps(tasks)) < size_kb * 1024:
+            number = len(tasks) + 1
+            tasks.append({
+                'actor_symbol': rng.choice(actors)['symbol'],
+                'task_description': ' '.join(rng.choice(
+                    ['review', 'submit', 'approve', 'notify', 'archive', 'order', 'invoice'])
+                    for _ in range(8)),
+                'task_symbol': f'T{number}'
+            })
+        body = json.dumps({'actor': actors, 'tasks': tasks}, indent=2)
+        if index % 2:
+            # Commented JSON wrapped in prose, as models often answer
+            body = body.replace('"actor": [', '"actor": [ // identified actors', 1)
+            response = f"Here is the analysis of the requirement.\n\n```json\n{body}\n```\n\nLet me know if you need changes."
+        else:
+            response = body
+        corpus.append((response, ['actor', 'tasks']))
+    return corpus
+
+
+def time_extractor(extractor, corpus: List[Tuple[str, List[str]]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for response, output_vars in corpus:
+            extractor(response, output_vars)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark LLM output extraction')
+    parser.add_argument('paths', nargs='*', help='Result files, cassettes or directories to read')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='SIZE_KB',
+                        help='Add synthetic responses of about SIZE_KB kilobytes')
+    parser.add_argument('--repeat', type=int, default=50, help='Passes over the corpus')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.paths)
+    if args.synthetic:
+        corpus.extend(synthetic_corpus(args.synthetic))
+    if not corpus:
+        print('No recorded responses found; pass result files/cassettes or use --synthetic')
+        return
+
+    mismatches = sum(1 for response, output_vars in corpus
+                     if extract_output_variables(response, output_vars)
+                     != legacy_extract_output_variables(response, output_vars))
+
+    total_kb = sum(len(response) for response, _ in corpus) / 1024
+    legacy_time = time_extractor(legacy_extract_output_variables, corpus, args.repeat)
+    current_time = time_extractor(extract_output_variables, corpus, args.repeat)
+    calls = len(corpus) * args.repeat
+
+    print(f'Corpus: {len(corpus)} responses, {total_kb:.1f} KB, {args.repeat} passes')
+    print(f'Legacy extractor:  {legacy_time * 1e6 / calls:10.1f} us/response')
+    print(f'Current extractor: {current_time * 1e6 / calls:10.1f} us/response')
+    print(f'Speedup: {legacy_time / current_time:.2f}x')
+    print(f'Result mismatches: {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
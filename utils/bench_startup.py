@@ -0,0 +1,116 @@
+"""
+Cold import budget for the command line entry points.
+
+Every entry point is imported in a fresh interpreter with `-X importtime`;
+the cumulative import time of the best of --repeat runs is compared with the
+budget, and the slowest modules it pulled in are listed. Heavy dependencies
+(the OpenAI client, httpx, tiktoken, YAML parsing of configure.yml) must not
+be imported before their first use, so loading one of them at import time
+fails the check as well.
+
+Usage:
+    python -m utils.bench_startup
+    python -m utils.bench_startup --budget 100 --top 10 generation.bpmn
+
+Exits with status 1 if any entry point is over budget or imports a heavy
+dependency eagerly, so it can run as a CI step.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    'generation.bpmn',
+    'generation.pipeline',
+    'generation.batch',
+    'generation.refine_seq',
+    'verification.bpmn_to_pt',
+    'verification.ctl',
+    'benchmark.unification',
+    'benchmark.metrics.jaccard',
+    'benchmark.metrics.ssdt',
+    'benchmark.dataset.requirement',
+    'utils.batch',
+    'utils.telemetry',
+]
+
+# Imported on first use only
+LAZY_MODULES = ('openai', 'httpx', 'tiktoken', 'opentelemetry', 'yaml')
+
+# Default cold import budget per entry point in milliseconds
+DEFAULT_BUDGET_MS = 150
+
+
+def measure_import(module: str) -> Tuple[float, Dict[str, float], List[str]]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module: Dotted module name
+
+    Returns:
+        Tuple of (cumulative import time in ms, cumulative ms per imported
+        module, lazy modules that were imported)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # header line
+        cumulative[fields[2].strip()] = int(fields[1]) / 1000
+    eager = sorted({name.split('.')[0] for name in cumulative} & set(LAZY_MODULES))
+    return cumulative.get(module, 0.0), cumulative, eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check cold import time of the entry points')
+    parser.add_argument('modules', nargs='*', help='Entry points to check (default: all)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Cold import budget per entry point in ms')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per entry point, the best counts')
+    parser.add_argument('--top', type=int, default=5, help='Slowest imported modules to list')
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules or ENTRY_POINTS:
+        try:
+            runs = [measure_import(module) for _ in range(max(1, args.repeat))]
+        except RuntimeError as e:
+            print(f'Error:{e}')
+            failures.append(module)
+            continue
+        total, cumulative, eager = min(runs, key=lambda run: run[0])
+        over_budget = total > args.budget
+        status = 'FAIL' if over_budget or eager else 'ok'
+        print(f'{module:32s} {total:8.1f} ms  (budget {args.budget:.0f} ms)  {status}')
+        slowest = sorted(((ms, name) for name, ms in cumulative.items() if name != module),
+                         reverse=True)[:args.top]
+        for ms, name in slowest:
+            print(f'    {ms:8.1f} ms  {name}')
+        if eager:
+            print(f"    imported at startup: {', '.join(eager)}")
+        if over_budget or eager:
+            failures.append(module)
+
+    if failures:
+        print(f"\n{len(failures)} entry point(s) failed: {', '.join(failures)}")
+        sys.exit(1)
+    print('\nAll entry points are within the startup budget')
+
+
+if __name__ == '__main__':
+    main()
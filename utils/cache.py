@@ -0,0 +1,240 @@
+"""
+Persistent cache for LLM responses.
+
+This module provides a content-addressed SQLite cache placed in front of the
+LLM calls in utils/prompt.py. Entries are keyed by a hash of the model,
+system prompt, user prompt and max_tokens, expire after a configurable TTL
+and are evicted least-recently-used once the cache exceeds its size bound.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.configure import get_cache_config
+
+
+# Cache instances keyed by their settings, created on first use
+_CACHES = {}
+# Cache installed by set_response_cache(), used instead of the configured ones
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def make_cache_key(model: str, system: str, prompt: str, max_tokens: int,
+                   response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build the content-addressed key for an LLM request.
+
+    Args:
+        model: Model name
+        system: System message content
+        prompt: User message content
+        max_tokens: Maximum tokens in response
+        response_format: Structured output format requested, if any
+
+    Returns:
+        Hex digest identifying the request
+    """
+    fields = [model, system, prompt, max_tokens]
+    if response_format is not None:
+        fields.append(response_format)
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True,
+                         separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed LLM response cache with TTL and LRU eviction
+    """
+
+    def __init__(self, path: str, ttl: float = 0, max_entries: int = 0, read_only: bool = False):
+        """
+        Open (and create if needed) the cache database.
+
+        Args:
+            path: SQLite database file path
+            ttl: Seconds an entry stays valid, 0 for no expiry
+            max_entries: Maximum number of entries kept, 0 for unbounded
+            read_only: Serve hits only, never write, touch or evict entries
+        """
+        import sqlite3
+
+        # as_uri() below needs an absolute path
+        self.path = Path(path).resolve()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+        if read_only:
+            try:
+                self._conn = sqlite3.connect(
+                    f"{self.path.as_uri()}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+            except sqlite3.OperationalError as e:
+                print(f"Error:cannot open read-only cache {self.path}: {e}")
+                self._conn = None
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(self.path), timeout=30, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "created_at REAL, accessed_at REAL)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.commit()
+
+    def get(self, model: str, system: str, prompt: str, max_tokens: int,
+            response_format: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            model: Model name
+            system: System message content
+            prompt: User message content
+            max_tokens: Maximum tokens in response
+            response_format: Structured output format requested, if any
+
+        Returns:
+            Cached response text or None on miss
+        """
+        import sqlite3
+
+        key = make_cache_key(model, system, prompt, max_tokens, response_format)
+        now = time.time()
+        with self._lock:
+            row = None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                except sqlite3.OperationalError:
+                    # Read-only cache whose database has no table yet
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                if not self.read_only:
+                    self._conn.execute(
+                        "DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            if not self.read_only:
+                self._conn.execute(
+                    "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, model: str, system: str, prompt: str, max_tokens: int, response: str,
+            response_format: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Store a response and evict least-recently-used entries above the size bound.
+
+        Args:
+            model: Model name
+            system: System message content
+            prompt: User message content
+            max_tokens: Maximum tokens in response
+            response: Response text to store
+            response_format: Structured output format requested, if any
+        """
+        if self.read_only:
+            return
+        key = make_cache_key(model, system, prompt, max_tokens, response_format)
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)", (key, model, response, now, now))
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """
+        Remove all cached entries.
+        """
+        if self.read_only:
+            return
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """
+        Close the underlying database connection.
+
+        Lookups on a closed cache miss and stores are ignored;
+        get_response_cache() opens a new instance for the same settings.
+        """
+        with self._lock:
+            self.closed = True
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the response cache for the LLM_CACHE settings in effect.
+
+    The settings are read on every call, so a utils.configure.config_scope()
+    can disable the cache or switch it to read-only; one instance is kept per
+    distinct setting.
+
+    Returns:
+        ResponseCache instance or None if caching is disabled
+    """
+    if _CACHE is not None:
+        return _CACHE
+    if not get_cache_config("ENABLED"):
+        return None
+    path = Path(get_cache_config("PATH"))
+    if not path.is_absolute():
+        # Relative paths are resolved against the project root
+        path = Path(__file__).parent.parent / path
+    settings = (str(path), get_cache_config("TTL"), get_cache_config("MAX_ENTRIES"),
+                bool(get_cache_config("READ_ONLY")))
+    cache = _CACHES.get(settings)
+    if cache is None or cache.closed:
+        with _CACHE_LOCK:
+            cache = _CACHES.get(settings)
+            if cache is None or cache.closed:
+                path, ttl, max_entries, read_only = settings
+                cache = ResponseCache(path, ttl=ttl, max_entries=max_entries,
+                                      read_only=read_only)
+                _CACHES[settings] = cache
+    return cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """
+    Replace the process-wide response cache (e.g. a read-only cache for benchmarks).
+
+    Args:
+        cache: ResponseCache instance, or None to use the LLM_CACHE settings again
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = cache
@@ -0,0 +1,179 @@
+"""
+Record/replay cassettes for LLM calls.
+
+In record mode every (config name, full prompt, response) handled by
+utils/agent.generate_prompt_from_config is appended to a gzip-compressed
+JSONL cassette. In replay mode calls are served purely from the cassette
+and a prompt that was never recorded fails immediately, so the whole
+generation -> Petri net -> CTL -> metrics pipeline can be rerun
+deterministically and without network access.
+
+The cassette follows LLM.CASSETTE_MODE and LLM.CASSETTE_PATH in effect for
+each call, so a utils.workspace scope (e.g. a batch job or a test) can
+record or replay its own file; relative paths are resolved against the
+workplace.
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.configure import get_llm_config, get_workplace
+
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+
+# Cassettes keyed by (path, mode), opened on first use
+_CASSETTES = {}
+# Cassette activated with set_cassette(), used instead of the configured ones
+_CASSETTE = None
+_CASSETTE_LOCK = threading.Lock()
+
+
+class CassetteMissError(LookupError):
+    """
+    Raised in replay mode when a prompt is not in the cassette
+    """
+
+
+def _entry_key(config_name: str, full_prompt: str) -> str:
+    payload = json.dumps([config_name, full_prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """
+    Gzip-compressed JSONL file of recorded LLM calls
+    """
+
+    def __init__(self, path: str, mode: str):
+        """
+        Open a cassette.
+
+        Args:
+            path: Cassette file path (conventionally *.jsonl.gz)
+            mode: 'record' to append calls, 'replay' to serve calls from the file
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.mtime = None
+        if mode == 'replay':
+            self.mtime = _file_mtime(self.path)
+            self._load()
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _load(self) -> None:
+        import gzip
+
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry['response']
+        except FileNotFoundError as exc:
+            raise FileNotFoundError(
+                f"Cassette file not found: {self.path}") from exc
+        print(f"Loaded {len(self.entries)} recorded calls from cassette: {self.path}")
+
+    def lookup(self, config_name: str, full_prompt: str) -> str:
+        """
+        Get the recorded response for a call.
+
+        Args:
+            config_name: Name of the prompt configuration
+            full_prompt: Complete prompt sent to LLM
+
+        Returns:
+            Recorded response text
+        """
+        key = _entry_key(config_name, full_prompt)
+        if key not in self.entries:
+            raise CassetteMissError(
+                f"No recorded response in cassette {self.path} for: {config_name}")
+        return self.entries[key]
+
+    def record(self, config_name: str, full_prompt: str, response: str) -> None:
+        """
+        Append a call to the cassette.
+
+        Args:
+            config_name: Name of the prompt configuration
+            full_prompt: Complete prompt sent to LLM
+            response: LLM response text
+        """
+        key = _entry_key(config_name, full_prompt)
+        entry = {
+            'key': key,
+            'config_name': config_name,
+            'full_prompt': full_prompt,
+            'response': response
+        }
+        import gzip
+
+        with self._lock:
+            self.entries[key] = response
+            # Each append is a separate gzip member, which gzip readers concatenate
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _file_mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Get the cassette for the CASSETTE_MODE and CASSETTE_PATH in effect.
+
+    One cassette is kept per (path, mode); a replay cassette is reloaded when
+    its file has changed, e.g. after it was recorded in the same process.
+
+    Returns:
+        Cassette instance or None if cassette mode is off
+    """
+    if _CASSETTE is not None:
+        return _CASSETTE
+    mode = get_llm_config("CASSETTE_MODE")
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Invalid LLM.CASSETTE_MODE: {mode}")
+    if mode == 'off':
+        return None
+    path = Path(get_llm_config("CASSETTE_PATH"))
+    if not path.is_absolute():
+        path = Path(get_workplace()) / path
+    settings = (str(path), mode)
+
+    def is_current(cassette):
+        return cassette is not None and (mode != 'replay' or cassette.mtime == _file_mtime(path))
+
+    cassette = _CASSETTES.get(settings)
+    if not is_current(cassette):
+        with _CASSETTE_LOCK:
+            cassette = _CASSETTES.get(settings)
+            if not is_current(cassette):
+                cassette = Cassette(*settings)
+                _CASSETTES[settings] = cassette
+    return cassette
+
+
+def set_cassette(cassette: Optional[Cassette]) -> None:
+    """
+    Activate a cassette for all following LLM calls.
+
+    Args:
+        cassette: Cassette instance, or None to use the CASSETTE settings again
+    """
+    global _CASSETTE
+    with _CASSETTE_LOCK:
+        _CASSETTE = cassette
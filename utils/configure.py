@@ -3,10 +3,299 @@ Configuration management utilities.
 
 This module provides functions to load and access configuration settings
 from YAML files, including workplace directory paths and generator prompts.
+
+configure.yml is parsed once into an immutable ConfigSnapshot that every
+lookup shares, so getters are cheap enough for hot paths. Set CONFIG.HOT_RELOAD
+(or call set_config_hot_reload) to re-read the file when its modification time
+changes, and use override_config()/config_overrides() to change settings
+from code, e.g. in benchmarks, without editing the file.
+
+Overrides made with override_config() apply to the whole process. Use
+config_scope() to override settings (e.g. WORKPLACE) for the current context
+only: the calling thread or asyncio task, and the stage threads it starts
+through contextvars.copy_context(). This lets concurrent pipelines in one
+process use different workplaces.
 """
 
+import contextlib
+import contextvars
+import copy
+import os
+import threading
 from pathlib import Path
-import yaml
+from typing import Any, Dict, Optional
+
+
+# Get the project root directory (one level up from utils/)
+CONFIG_PATH = Path(__file__).parent.parent / "configure.yml"
+
+
+class FrozenDict(dict):
+    """
+    Read-only dictionary holding a configuration section
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Configuration snapshots are read-only, use override_config() instead")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def _merge(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class ConfigSnapshot:
+    """
+    Immutable view of configure.yml plus overrides at one point in time
+    """
+
+    __slots__ = ('data', 'mtime_ns')
+
+    def __init__(self, data: Dict[str, Any], mtime_ns: Optional[int]):
+        """
+        Args:
+            data: Parsed configuration merged with the active overrides
+            mtime_ns: Modification time of configure.yml when it was read, None if missing
+        """
+        self.data = _freeze(data)
+        self.mtime_ns = mtime_ns
+
+    def get(self, key: str) -> Any:
+        """
+        Get a top-level value, None if missing.
+        """
+        return self.data.get(key)
+
+    def get_nested(self, section: str, key: str) -> Any:
+        """
+        Get a value of a section, None if the section or key is missing.
+        """
+        section_data = self.data.get(section)
+        if not isinstance(section_data, dict):
+            return None
+        return section_data.get(key)
+
+
+_CONFIG_LOCK = threading.Lock()
+# Parsed configure.yml and its modification time
+_FILE_DATA: Dict[str, Any] = {}
+_FILE_MTIME: Optional[int] = None
+_OVERRIDES: Dict[str, Any] = {}
+_SNAPSHOT: Optional[ConfigSnapshot] = None
+# None follows CONFIG.HOT_RELOAD, True/False is set with set_config_hot_reload()
+_HOT_RELOAD: Optional[bool] = None
+
+
+class _ScopedConfig:
+    """
+    Overrides of one config_scope() and the snapshot they produce
+    """
+
+    def __init__(self, overrides: Dict[str, Any]):
+        self.overrides = overrides
+        # (shared snapshot, shared snapshot merged with the overrides)
+        self._state = (None, None)
+
+    def resolve(self, shared: ConfigSnapshot) -> ConfigSnapshot:
+        base, snapshot = self._state
+        if base is not shared:
+            # Rebuilt only when the shared snapshot changes (reload or new global overrides)
+            snapshot = ConfigSnapshot(_merge(_thaw(shared.data), self.overrides), shared.mtime_ns)
+            self._state = (shared, snapshot)
+        return snapshot
+
+
+_SCOPED_CONFIG: contextvars.ContextVar = contextvars.ContextVar('scoped_config', default=None)
+
+
+def _config_mtime() -> Optional[int]:
+    try:
+        return os.stat(CONFIG_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _read_configure() -> None:
+    """
+    Parse configure.yml into the module state (the caller holds _CONFIG_LOCK).
+    """
+    # Imported on first read, commands that never touch the configuration skip it
+    import yaml
+
+    global _FILE_DATA, _FILE_MTIME
+    mtime = _config_mtime()
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    try:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as file:
+            config: dict = yaml.load(file, Loader=loader) or {}
+    except FileNotFoundError:
+        print(f"Error:{CONFIG_PATH} not found.")
+        config = {}
+    except yaml.YAMLError as e:
+        # Keep serving the last good configuration while an edit is in progress
+        print(f'Error:{e}')
+        if _FILE_MTIME is not None:
+            _FILE_MTIME = mtime
+            return
+        config = {}
+    _FILE_DATA, _FILE_MTIME = config, mtime
+
+
+def _hot_reload_enabled(snapshot: ConfigSnapshot) -> bool:
+    if _HOT_RELOAD is not None:
+        return _HOT_RELOAD
+    return bool(snapshot.get_nested("CONFIG", "HOT_RELOAD"))
+
+
+def get_config() -> ConfigSnapshot:
+    """
+    Get the current configuration snapshot, loading configure.yml on first use.
+
+    Returns:
+        ConfigSnapshot shared by all lookups until the file changes (with hot
+        reload) or the overrides change, including the overrides of the
+        enclosing config_scope()
+    """
+    scoped = _SCOPED_CONFIG.get()
+    if scoped is None:
+        return _get_shared_config()
+    return scoped.resolve(_get_shared_config())
+
+
+def _get_shared_config() -> ConfigSnapshot:
+    global _SNAPSHOT
+    snapshot = _SNAPSHOT
+    if snapshot is not None and not (_hot_reload_enabled(snapshot)
+                                     and _config_mtime() != snapshot.mtime_ns):
+        return snapshot
+    with _CONFIG_LOCK:
+        if _SNAPSHOT is snapshot:
+            _read_configure()
+            _SNAPSHOT = ConfigSnapshot(_merge(_FILE_DATA, _OVERRIDES), _FILE_MTIME)
+        return _SNAPSHOT
+
+
+def reload_config() -> ConfigSnapshot:
+    """
+    Re-read configure.yml now.
+
+    Returns:
+        The new configuration snapshot
+    """
+    global _SNAPSHOT
+    with _CONFIG_LOCK:
+        _read_configure()
+        _SNAPSHOT = ConfigSnapshot(_merge(_FILE_DATA, _OVERRIDES), _FILE_MTIME)
+        return _SNAPSHOT
+
+
+def set_config_hot_reload(enabled: Optional[bool]) -> None:
+    """
+    Turn checking configure.yml for changes on every lookup on or off.
+
+    Args:
+        enabled: True or False, or None to follow CONFIG.HOT_RELOAD
+    """
+    global _HOT_RELOAD
+    _HOT_RELOAD = enabled
+
+
+def _apply_overrides(overrides: Dict[str, Any]) -> None:
+    global _OVERRIDES, _SNAPSHOT
+    _get_shared_config()
+    with _CONFIG_LOCK:
+        _OVERRIDES = overrides
+        _SNAPSHOT = ConfigSnapshot(_merge(_FILE_DATA, _OVERRIDES), _FILE_MTIME)
+
+
+def override_config(overrides: Dict[str, Any]) -> None:
+    """
+    Override configuration values for all following lookups.
+
+    Sections are merged key by key, e.g. override_config({"LLM": {"STREAM": True}})
+    only changes LLM.STREAM. Overrides survive hot reloads.
+
+    Args:
+        overrides: Nested mapping of values to override
+    """
+    _apply_overrides(_merge(_OVERRIDES, copy.deepcopy(overrides)))
+
+
+def clear_config_overrides() -> None:
+    """
+    Remove all configuration overrides.
+    """
+    _apply_overrides({})
+
+
+@contextlib.contextmanager
+def config_overrides(overrides: Dict[str, Any]):
+    """
+    Override configuration values inside a with block.
+
+    Args:
+        overrides: Nested mapping of values to override (see override_config)
+    """
+    previous = _OVERRIDES
+    override_config(overrides)
+    try:
+        yield get_config()
+    finally:
+        _apply_overrides(previous)
+
+
+@contextlib.contextmanager
+def config_scope(overrides: Dict[str, Any]):
+    """
+    Override configuration values for the current context inside a with block.
+
+    Unlike config_overrides(), other threads and asyncio tasks keep their own
+    configuration, so concurrent runs can use e.g. different workplaces.
+    Scopes nest, inner values win.
+
+    Args:
+        overrides: Nested mapping of values to override (see override_config)
+    """
+    parent = _SCOPED_CONFIG.get()
+    merged = _merge(parent.overrides if parent else {}, copy.deepcopy(overrides))
+    token = _SCOPED_CONFIG.set(_ScopedConfig(merged))
+    try:
+        yield get_config()
+    finally:
+        _SCOPED_CONFIG.reset(token)
 
 
 def load_configure():
@@ -14,18 +303,10 @@ def load_configure():
     Load configuration from configure.yml file.
 
     Returns:
-        Dictionary containing configuration or empty dict if file not found
+        Dictionary containing configuration (a mutable copy of the current
+        snapshot) or empty dict if file not found
     """
-    # Get the project root directory (one level up from utils/)
-    project_root = Path(__file__).parent.parent
-    config_path = project_root / "configure.yml"
-    try:
-        with open(config_path, 'r', encoding='utf-8') as file:
-            config: dict = yaml.safe_load(file)
-            return config
-    except FileNotFoundError:
-        print(f"Error:{config_path} not found.")
-        return {}
+    return _thaw(get_config().data)
 
 
 def get_key(key):
@@ -39,13 +320,12 @@ def get_key(key):
         Value of the key or None if not found
     """
     try:
-        config = load_configure()
-        key_name = config.get(key)
+        key_name = get_config().get(key)
         if key_name:
             return key_name
         else:
             raise KeyError(f'{key} does not exist')
-    except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
+    except KeyError as e:
         print(f'Error:{e}')
 
 
@@ -61,14 +341,13 @@ def get_nested_key(section, key):
         Value of the key or None if not found
     """
     try:
-        config = load_configure()
-        section_data = config.get(section, {})
-        key_name = section_data.get(key)
-        if key_name:
+        key_name = get_config().get_nested(section, key)
+        # Explicit false/0 values are valid settings, only missing keys fall back
+        if key_name is not None:
             return key_name
         else:
             raise KeyError(f'{section}.{key} does not exist')
-    except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
+    except KeyError as e:
         print(f'Error:{e}')
 
 
@@ -145,7 +424,8 @@ def get_verification_config_path(config_name):
         default_paths = {
             "CTL_CONFIG_PATH": "verification/config/ctl.json",
             "DEFAULT_PETRI_NET_FILE": "bpmn_output_petri_net.pnml",
-            "UNIFICATION_CONFIG_PATH": "benchmark/config/unification.json"
+            "UNIFICATION_CONFIG_PATH": "benchmark/config/unification.json",
+            "REQUIREMENT_CONFIG_PATH": "benchmark/config/requirement.json"
         }
         return default_paths.get(config_name, "verification/config/default.json")
     return path
@@ -176,7 +456,8 @@ def get_output_file_name(file_name):
             "STANDARD_CTL_CONSTRAINTS_FILE": "standard_ctl_constraints.json",
             "UNIFICATION_OUTPUT_FILE": "unification_output.json",
             "BENCHMARK_SYMBOL_OUTPUT_FILE": "benchmark_symbol_output.json",
-            "TARGET_SYMBOL_OUTPUT_FILE": "target_symbol_output.json"
+            "TARGET_SYMBOL_OUTPUT_FILE": "target_symbol_output.json",
+            "REQUIREMENT_OUTPUT_FILE": "requirement_description.json"
         }
         return default_files.get(file_name, "default_output.json")
     return name
@@ -234,3 +515,266 @@ def get_naming_convention(convention_name):
         }
         return default_conventions.get(convention_name, "default_")
     return value
+
+
+def get_llm_config(config_name):
+    """
+    Get LLM client configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'POOL_SIZE', 'TIMEOUT', 'MAX_CONCURRENCY')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("LLM", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "POOL_SIZE": 10,
+            "KEEPALIVE_EXPIRY": 60,
+            "TIMEOUT": 600,
+            "MAX_CONCURRENCY": 8,
+            "SINGLE_FLIGHT": True,
+            "STREAM": False,
+            "BASE_URL": "",
+            "STRUCTURED_OUTPUT": False,
+            "CASSETTE_MODE": "off",
+            "CASSETTE_PATH": "llm_cassette.jsonl.gz"
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_cache_config(config_name):
+    """
+    Get LLM response cache configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'ENABLED', 'PATH', 'TTL', 'MAX_ENTRIES', 'READ_ONLY')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("LLM_CACHE", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "ENABLED": False,
+            "PATH": ".cache/llm_responses.sqlite3",
+            "TTL": 0,
+            "MAX_ENTRIES": 10000,
+            "READ_ONLY": False
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_rate_limit_config(config_name):
+    """
+    Get LLM rate limiting configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'ENABLED', 'STATE_FILE', 'MAX_RETRIES', 'DEFAULT', 'MODELS')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("RATE_LIMIT", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "ENABLED": True,
+            "STATE_FILE": ".cache/rate_limit.json",
+            "MAX_RETRIES": 5,
+            "BACKOFF_BASE": 1,
+            "BACKOFF_MAX": 60,
+            "DEFAULT": {"RPM": 500, "TPM": 200000},
+            "MODELS": {}
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_prompt_config(config_name):
+    """
+    Get prompt building configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'TOKEN_ACCOUNTING', 'TOKENIZER', 'COMPACT_JSON',
+            'DEDUPLICATE_INJECTION', 'TRUNCATION', 'VARIABLE_TOKEN_LIMITS', 'LAYOUT')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("PROMPT", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "TOKEN_ACCOUNTING": False,
+            "TOKENIZER": "estimate",
+            "COMPACT_JSON": False,
+            "DEDUPLICATE_INJECTION": False,
+            "TRUNCATION": "middle",
+            "VARIABLE_TOKEN_LIMITS": {},
+            "LAYOUT": "input_first"
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_llm_route(stage):
+    """
+    Get the model routing of a pipeline stage.
+
+    Settings of LLM_ROUTES.<stage> override LLM_ROUTES.DEFAULT, which overrides
+    the built-in defaults. FALLBACK entries are model names or mappings with
+    their own MODEL, MAX_TOKENS and TIMEOUT.
+
+    Args:
+        stage: Stage name, the prompt config file name without .json (e.g., 'symbol', 'seq', 'ctl')
+
+    Returns:
+        Dictionary with MODEL, MAX_TOKENS, TIMEOUT, FALLBACK, HEDGE_PERCENTILE
+        and REPAIR_ATTEMPTS
+    """
+    route = {
+        "MODEL": "gpt-4o-mini",
+        "MAX_TOKENS": 6000,
+        "TIMEOUT": get_llm_config("TIMEOUT"),
+        "FALLBACK": [],
+        "HEDGE_PERCENTILE": None,
+        "REPAIR_ATTEMPTS": None
+    }
+    routes = get_key("LLM_ROUTES") or {}
+    route.update(routes.get("DEFAULT") or {})
+    if stage in routes:
+        route.update(routes[stage] or {})
+    return route
+
+
+def get_hedge_config(config_name):
+    """
+    Get hedged request configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'ENABLED', 'PERCENTILE', 'MIN_SAMPLES',
+            'INITIAL_DELAY', 'HISTORY')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("LLM_HEDGE", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "ENABLED": False,
+            "PERCENTILE": 95,
+            "MIN_SAMPLES": 10,
+            "INITIAL_DELAY": 60,
+            "HISTORY": 200
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_batch_config(config_name):
+    """
+    Get offline batch job configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'BACKEND', 'JOB_DIR', 'POLL_INTERVAL',
+            'COMPLETION_WINDOW')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("BATCH", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "BACKEND": "local",
+            "JOB_DIR": "workplace/batch",
+            "POLL_INTERVAL": 30,
+            "COMPLETION_WINDOW": "24h"
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_repair_config(config_name):
+    """
+    Get output repair configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'ENABLED', 'MAX_ATTEMPTS', 'FRAGMENT_TOKENS')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("REPAIR", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "ENABLED": False,
+            "MAX_ATTEMPTS": 1,
+            "FRAGMENT_TOKENS": 1000
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_telemetry_config(config_name):
+    """
+    Get LLM call telemetry configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'ENABLED', 'PATH', 'OTEL_SPANS')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("TELEMETRY", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "ENABLED": False,
+            "PATH": "telemetry.jsonl",
+            "OTEL_SPANS": False
+        }
+        return default_values.get(config_name)
+    return value
+
+
+def get_pipeline_config(config_name):
+    """
+    Get generation pipeline scheduling configuration value.
+
+    Args:
+        config_name: Configuration name (e.g., 'MAX_WORKERS', 'INCREMENTAL', 'PERSIST',
+            'BATCH_JOBS', 'RUNS_DIR')
+
+    Returns:
+        Configuration value or default value if not found
+    """
+    value = get_nested_key("PIPELINE", config_name)
+    if value is None:
+        print(f"{config_name} not found in configure.yml, using default value")
+        # Default values mapping
+        default_values = {
+            "MAX_WORKERS": 4,
+            "INCREMENTAL": True,
+            "PERSIST": True,
+            "BATCH_JOBS": 8,
+            "RUNS_DIR": "workplace/runs"
+        }
+        return default_values.get(config_name)
+    return value
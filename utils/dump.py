@@ -3,8 +3,14 @@ Data dump utilities for BPMN generation.
 
 This module provides common functions for reading/writing data files
 and managing the dump functionality across different generation modules.
+
+ENABLE_DUMP is the process default, shared by all generation and verification
+modules (see is_dump_enabled). dump_scope() overrides it for the current
+context only, e.g. for one of several pipelines running in the same process.
 """
 
+import contextlib
+import contextvars
 import json
 import os
 from typing import Dict, Any, Callable, Optional
@@ -14,6 +20,9 @@ from utils.configure import get_workplace
 # Global dump setting - can be moved to external config file later
 ENABLE_DUMP = True
 
+# Dump setting of the current context, None follows ENABLE_DUMP
+_DUMP_ENABLED: contextvars.ContextVar = contextvars.ContextVar('dump_enabled', default=None)
+
 
 def get_data_from_file_or_generate(output_file: str, generate_func: Callable, description: str) -> Dict[str, Any]:
     """
@@ -30,7 +39,7 @@ def get_data_from_file_or_generate(output_file: str, generate_func: Callable, de
     Returns:
         Dictionary containing the data
     """
-    if ENABLE_DUMP:
+    if is_dump_enabled():
         # Read from existing output file
         workplace = get_workplace()
         file_path = os.path.join(workplace, output_file)
@@ -50,7 +59,8 @@ def get_data_from_file_or_generate(output_file: str, generate_func: Callable, de
 
 
 def save_result_with_extra(result: Dict[str, Any], output_file: str, description: str,
-                           extra_key: Optional[str] = None, extra_value: Any = None) -> None:
+                           extra_key: Optional[str] = None, extra_value: Any = None,
+                           dump: Optional[bool] = None) -> None:
     """
     Save result to file with extra data if dump is enabled.
 
@@ -60,8 +70,11 @@ def save_result_with_extra(result: Dict[str, Any], output_file: str, description
         description: Description for the save operation
         extra_key: Key for extra data
         extra_value: Value for extra data
+        dump: Override the dump setting for this call (default: is_dump_enabled())
     """
-    if ENABLE_DUMP:
+    if dump is None:
+        dump = is_dump_enabled()
+    if dump:
         workplace = get_workplace()
         output_path = os.path.join(workplace, output_file)
 
@@ -90,7 +103,8 @@ def save_result_with_extra(result: Dict[str, Any], output_file: str, description
         print(f"{description} completed. Results saved to: {output_path}")
 
 
-def save_result(result: Dict[str, Any], output_file: str, description: str) -> None:
+def save_result(result: Dict[str, Any], output_file: str, description: str,
+                dump: Optional[bool] = None) -> None:
     """
     Save result to file if dump is enabled.
 
@@ -98,8 +112,9 @@ def save_result(result: Dict[str, Any], output_file: str, description: str) -> N
         result: Result dictionary to save
         output_file: Output file name
         description: Description for the save operation
+        dump: Override the dump setting for this call (default: is_dump_enabled())
     """
-    save_result_with_extra(result, output_file, description)
+    save_result_with_extra(result, output_file, description, dump=dump)
 
 
 def set_dump_enabled(enabled: bool) -> None:
@@ -118,6 +133,26 @@ def is_dump_enabled() -> bool:
     Get the current dump enabled state.
 
     Returns:
-        Whether dump functionality is currently enabled
+        Whether dump functionality is currently enabled, in the enclosing
+        dump_scope() or else globally
+    """
+    enabled = _DUMP_ENABLED.get()
+    return ENABLE_DUMP if enabled is None else enabled
+
+
+@contextlib.contextmanager
+def dump_scope(enabled: Optional[bool]):
+    """
+    Enable or disable dump for the current context inside a with block.
+
+    Args:
+        enabled: Whether dump functionality should be enabled, None keeps the current state
     """
-    return ENABLE_DUMP
+    if enabled is None:
+        yield
+        return
+    token = _DUMP_ENABLED.set(enabled)
+    try:
+        yield
+    finally:
+        _DUMP_ENABLED.reset(token)
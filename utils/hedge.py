@@ -0,0 +1,270 @@
+"""
+Hedged LLM requests.
+
+When hedging is enabled (LLM_HEDGE.ENABLED) a call that has not answered
+after the stage's latency percentile (e.g. p95 of its recent calls) gets a
+duplicate request. The first valid result wins and the other request is
+cancelled: async requests are cancelled outright and blocking requests, which
+are read as streams while hedging is enabled, stop at their next chunk and
+release their rate limit slot.
+
+Only answers that came from the network feed the latency history; requests
+answered from the response cache call note_local_result(). Each blocking
+request runs on its own thread and is timed from the moment it starts.
+
+Per stage the module reports how often requests were hedged, how often the
+hedge won and an estimate of the time saved. A cancelled primary never
+reports its latency, so the saving is estimated as the mean of the stage's
+recorded latencies above the moment the hedge won, minus that moment.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.configure import get_hedge_config, get_llm_route
+
+
+_LATENCIES = {}
+_STATS = {}
+_LOCK = threading.Lock()
+
+# Event of the running hedged request, set when it is answered without a network call
+_LOCAL_RESULT = contextvars.ContextVar('hedge_local_result', default=None)
+
+
+def note_local_result() -> None:
+    """
+    Mark the running hedged request as answered locally (e.g. from the response cache).
+
+    Its latency is then kept out of the stage's history.
+    """
+    local = _LOCAL_RESULT.get()
+    if local is not None:
+        local.set()
+
+
+def _stage_stats(stage: str) -> Dict[str, Any]:
+    return _STATS.setdefault(stage, {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'saved_time': 0.0})
+
+
+def record_latency(stage: str, latency: float) -> None:
+    """
+    Add the latency of a completed request to the stage's history.
+
+    Args:
+        stage: Stage name
+        latency: Seconds from sending the request to its result
+    """
+    with _LOCK:
+        history = _LATENCIES.get(stage)
+        if history is None:
+            history = _LATENCIES[stage] = deque(maxlen=get_hedge_config("HISTORY"))
+        history.append(latency)
+
+
+def get_hedge_delay(stage: str) -> Optional[float]:
+    """
+    Get how long to wait before hedging a request of a stage.
+
+    Args:
+        stage: Stage name
+
+    Returns:
+        Delay in seconds, or None if hedging is disabled
+    """
+    if not get_hedge_config("ENABLED"):
+        return None
+    percentile = get_llm_route(stage).get("HEDGE_PERCENTILE") or get_hedge_config("PERCENTILE")
+    with _LOCK:
+        samples = sorted(_LATENCIES.get(stage, ()))
+    if len(samples) < get_hedge_config("MIN_SAMPLES"):
+        return get_hedge_config("INITIAL_DELAY")
+    index = min(len(samples) - 1, max(0, math.ceil(percentile / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def _estimate_saved_time(stage: str, elapsed: float) -> float:
+    with _LOCK:
+        slower = [latency for latency in _LATENCIES.get(stage, ()) if latency > elapsed]
+    if not slower:
+        return 0.0
+    return sum(slower) / len(slower) - elapsed
+
+
+def _finish(stage: str, hedged: bool, hedge_won: bool, elapsed: float,
+            latency: Optional[float]) -> None:
+    saved = _estimate_saved_time(stage, elapsed) if hedge_won else 0.0
+    if latency is not None:
+        record_latency(stage, latency)
+    with _LOCK:
+        stats = _stage_stats(stage)
+        stats['calls'] += 1
+        stats['hedged'] += hedged
+        stats['hedge_wins'] += hedge_won
+        stats['saved_time'] += saved
+    if hedge_won:
+        print(f"[{stage}] hedged request won after {elapsed:.2f}s (estimated {saved:.2f}s saved)")
+
+
+def hedged_call(stage: str, request: Callable[[threading.Event], Any]) -> Any:
+    """
+    Run a blocking LLM request, hedging it with a duplicate when it is slow.
+
+    Args:
+        stage: Stage name used for latency history and statistics
+        request: Function performing one request; it receives a threading.Event
+            set when its result is no longer needed (None when hedging is
+            disabled, so the request cannot be cancelled) and returns None on failure
+
+    Returns:
+        First non-None result, or None if every request failed
+    """
+    delay = get_hedge_delay(stage)
+    if delay is None:
+        return request(None)
+
+    cancels, starts, locals_, futures = [], [], [], []
+
+    def run(future, cancel, local, started):
+        _LOCAL_RESULT.set(local)
+        starts[futures.index(future)] = time.perf_counter()
+        started.set()
+        try:
+            future.set_result(request(cancel))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def launch():
+        future, cancel, local, started = Future(), threading.Event(), threading.Event(), threading.Event()
+        futures.append(future)
+        cancels.append(cancel)
+        locals_.append(local)
+        starts.append(None)
+        # Each request runs on its own thread in a copy of the caller's context variables
+        threading.Thread(target=contextvars.copy_context().run,
+                         args=(run, future, cancel, local, started),
+                         name='llm-hedge', daemon=True).start()
+        started.wait()
+
+    launch()
+    start = starts[0]
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        launch()
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if result is None:
+                continue
+            index = futures.index(future)
+            for other, cancel in zip(futures, cancels):
+                if other is not future:
+                    cancel.set()
+            now = time.perf_counter()
+            latency = None if locals_[index].is_set() else now - starts[index]
+            _finish(stage, len(futures) > 1, index > 0, now - start, latency)
+            return result
+    if error is not None:
+        raise error
+    return None
+
+
+async def hedged_call_async(stage: str, request: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Await an LLM request, hedging it with a duplicate when it is slow.
+
+    Args:
+        stage: Stage name used for latency history and statistics
+        request: Coroutine function performing one request, returning None on failure
+
+    Returns:
+        First non-None result, or None if every request failed
+    """
+    import asyncio
+
+    delay = get_hedge_delay(stage)
+    if delay is None:
+        return await request()
+
+    starts, locals_, tasks = [], [], []
+
+    async def run(local):
+        # Tasks run in a copy of the context, the marker stays local to this request
+        _LOCAL_RESULT.set(local)
+        return await request()
+
+    def launch():
+        local = threading.Event()
+        locals_.append(local)
+        starts.append(time.perf_counter())
+        tasks.append(asyncio.ensure_future(run(local)))
+
+    launch()
+    start = starts[0]
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    if not done:
+        launch()
+
+    pending = set(tasks)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                result = task.result()
+                if result is None:
+                    continue
+                index = tasks.index(task)
+                now = time.perf_counter()
+                latency = None if locals_[index].is_set() else now - starts[index]
+                _finish(stage, len(tasks) > 1, index > 0, now - start, latency)
+                return result
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    if error is not None:
+        raise error
+    return None
+
+
+def get_hedge_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Get hedging statistics per stage.
+
+    Returns:
+        Mapping of stage to {'calls', 'hedged', 'hedge_wins', 'saved_time', 'hedge_rate'}
+    """
+    with _LOCK:
+        return {stage: dict(stats, hedge_rate=stats['hedged'] / stats['calls'] if stats['calls'] else 0.0)
+                for stage, stats in _STATS.items()}
+
+
+def print_hedge_stats() -> None:
+    """
+    Print hedge rate, hedge wins and estimated saved time per stage.
+    """
+    stats = get_hedge_stats()
+    if not any(stage_stats['hedged'] for stage_stats in stats.values()):
+        return
+    print("Hedged requests:")
+    for stage, stage_stats in sorted(stats.items()):
+        print(f"  {stage}: {stage_stats['hedged']}/{stage_stats['calls']} hedged "
+              f"({100 * stage_stats['hedge_rate']:.0f}%), {stage_stats['hedge_wins']} won by the hedge, "
+              f"~{stage_stats['saved_time']:.1f}s saved")
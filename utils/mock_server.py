@@ -0,0 +1,365 @@
+"""
+OpenAI-compatible mock LLM server for offline load testing.
+
+This module serves the chat-completions API locally by replaying recorded
+responses, so the pipeline can be benchmarked without network access or
+API cost. Responses are matched by a hash of the user prompt and come from
+`*_output.json` artifacts (their `full_prompt`/`llm_response` fields,
+including `extra` sections) or from fixture files. Latency distributions
+and error injection (429, 500, timeouts) make it possible to exercise the
+concurrency, caching and retry behavior of utils/prompt.ask_openai.
+Provider-side prompt caching is simulated as well: prompt prefixes already
+seen are reported as `usage.prompt_tokens_details.cached_tokens`.
+
+Usage:
+    python -m utils.mock_server --replay workplace --latency lognormal:0,0.5 --rate-429 0.05
+
+Then point the client at it by setting LLM.BASE_URL in configure.yml to
+http://127.0.0.1:8765/v1 (any API_KEY value is accepted).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Simulated prompt caching works on 128-token blocks once 1024 tokens match (~4 chars/token)
+PREFIX_BLOCK_CHARS = 512
+MIN_CACHED_PREFIX_CHARS = 4096
+
+
+def prompt_hash(prompt: str) -> str:
+    """
+    Hash a user prompt for fixture matching.
+
+    Args:
+        prompt: User message content
+
+    Returns:
+        Hex digest of the prompt
+    """
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def _iter_recorded_pairs(data: Any) -> Iterator[Tuple[str, str]]:
+    # Output artifacts keep prompt/response at the top level and under extra.<name>
+    if not isinstance(data, dict):
+        return
+    if isinstance(data.get('full_prompt'), str) and isinstance(data.get('llm_response'), str):
+        yield data['full_prompt'], data['llm_response']
+    for extra_data in (data.get('extra') or {}).values():
+        yield from _iter_recorded_pairs(extra_data)
+
+
+def load_recordings(paths: List[str]) -> Dict[str, str]:
+    """
+    Load recorded responses from output artifacts and fixture files.
+
+    Directories are searched recursively for `*_output.json` files and
+    `*.jsonl` fixtures. A fixture line (or JSON file) is an object with a
+    `response` and either a `prompt` or a `prompt_hash`.
+
+    Args:
+        paths: Files or directories to load
+
+    Returns:
+        Dictionary mapping prompt hash to response text
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.endswith('_output.json') or name.endswith('.jsonl'))
+        else:
+            files.append(path)
+
+    recordings = {}
+    for file_path in files:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                if file_path.endswith('.jsonl'):
+                    records = [json.loads(line) for line in f if line.strip()]
+                else:
+                    records = [json.load(f)]
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Skipping {file_path}: {e}")
+            continue
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            if 'response' in record and ('prompt' in record or 'prompt_hash' in record):
+                key = record.get('prompt_hash') or prompt_hash(record['prompt'])
+                recordings[key] = record['response']
+            for prompt, response in _iter_recorded_pairs(record):
+                recordings[prompt_hash(prompt)] = response
+    print(f"Loaded {len(recordings)} recorded responses from {len(files)} files")
+    return recordings
+
+
+def parse_latency(spec: str):
+    """
+    Parse a latency distribution specification.
+
+    Supported forms (seconds): fixed:S, uniform:LO,HI, normal:MU,SIGMA,
+    lognormal:MU,SIGMA, exponential:MEAN.
+
+    Args:
+        spec: Distribution specification
+
+    Returns:
+        Zero-argument function sampling a non-negative delay
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    samplers = {
+        'fixed': lambda: values[0],
+        'uniform': lambda: random.uniform(values[0], values[1]),
+        'normal': lambda: random.gauss(values[0], values[1]),
+        'lognormal': lambda: random.lognormvariate(values[0], values[1]),
+        'exponential': lambda: random.expovariate(1 / values[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding recordings, latency and fault settings
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, recordings: Dict[str, str], latency=None,
+                 rate_429: float = 0.0, rate_500: float = 0.0, rate_timeout: float = 0.0,
+                 timeout_delay: float = 600.0, retry_after: float = 1.0,
+                 on_miss: str = 'cycle'):
+        super().__init__(address, MockLLMHandler)
+        self.recordings = recordings
+        self.recorded_keys = sorted(recordings)
+        self.latency = latency or (lambda: 0.0)
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_timeout = rate_timeout
+        self.timeout_delay = timeout_delay
+        self.retry_after = retry_after
+        self.on_miss = on_miss
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0,
+                      '429': 0, '500': 0, 'timeouts': 0}
+        self.stats_lock = threading.Lock()
+        self.prefixes = set()
+
+    def cached_prefix_tokens(self, text: str) -> int:
+        """
+        Simulate provider prompt caching for a request.
+
+        Args:
+            text: Concatenated message contents of the request
+
+        Returns:
+            Number of leading prompt tokens matching an earlier request
+        """
+        digest = hashlib.sha256()
+        block_hashes = []
+        for start in range(0, len(text) - PREFIX_BLOCK_CHARS + 1, PREFIX_BLOCK_CHARS):
+            digest.update(text[start:start + PREFIX_BLOCK_CHARS].encode('utf-8'))
+            block_hashes.append(digest.hexdigest())
+        cached_blocks = 0
+        with self.stats_lock:
+            for block_hash in block_hashes:
+                if block_hash not in self.prefixes:
+                    break
+                cached_blocks += 1
+            self.prefixes.update(block_hashes)
+        cached_chars = cached_blocks * PREFIX_BLOCK_CHARS
+        return cached_chars // 4 if cached_chars >= MIN_CACHED_PREFIX_CHARS else 0
+
+    def count(self, name: str) -> None:
+        """
+        Increment a request statistic.
+        """
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """
+        Find the response for a prompt.
+
+        Args:
+            prompt: User message content
+
+        Returns:
+            Recorded response, a deterministic stand-in on miss ('cycle'), or None
+        """
+        key = prompt_hash(prompt)
+        if key in self.recordings:
+            self.count('hits')
+            return self.recordings[key]
+        self.count('misses')
+        if self.on_miss == 'cycle' and self.recorded_keys:
+            return self.recordings[self.recorded_keys[int(key, 16) % len(self.recorded_keys)]]
+        return None
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """
+    Request handler implementing POST /v1/chat/completions
+    """
+
+    server: MockLLMServer
+
+    def log_message(self, format, *args):
+        # Keep load-test output readable
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_error(self, status: int, message: str, error_type: str,
+                    headers: Optional[Dict[str, str]] = None):
+        self._send_json(status, {'error': {'message': message, 'type': error_type,
+                                           'code': None, 'param': None}}, headers)
+
+    def do_POST(self):
+        server = self.server
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_error(404, f"Unknown path {self.path}", 'invalid_request_error')
+            return
+        server.count('requests')
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_error(400, 'Invalid JSON body', 'invalid_request_error')
+            return
+
+        # Error injection
+        roll = random.random()
+        if roll < server.rate_timeout:
+            server.count('timeouts')
+            time.sleep(server.timeout_delay)
+            self.close_connection = True
+            return
+        roll -= server.rate_timeout
+        if roll < server.rate_429:
+            server.count('429')
+            self._send_error(429, 'Rate limit reached (mock)', 'rate_limit_exceeded',
+                             {'Retry-After': str(server.retry_after)})
+            return
+        roll -= server.rate_429
+        if roll < server.rate_500:
+            server.count('500')
+            self._send_error(500, 'Internal server error (mock)', 'server_error')
+            return
+
+        messages = request.get('messages', [])
+        prompt = next((m.get('content', '') for m in reversed(messages)
+                       if m.get('role') == 'user'), '')
+        content = server.lookup(prompt)
+        if content is None:
+            self._send_error(404, 'No recorded response for prompt', 'not_found')
+            return
+
+        time.sleep(server.latency())
+        model = request.get('model', 'mock')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        prompt_text = '\n'.join(m.get('content', '') for m in messages)
+        usage = {
+            'prompt_tokens': len(prompt_text) // 4,
+            'completion_tokens': len(content) // 4,
+            'prompt_tokens_details': {'cached_tokens': server.cached_prefix_tokens(prompt_text)},
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        if request.get('stream'):
+            include_usage = (request.get('stream_options') or {}).get('include_usage')
+            self._send_stream(completion_id, model, content, usage if include_usage else None)
+            return
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': usage,
+        })
+
+    def _send_stream(self, completion_id: str, model: str, content: str,
+                     usage: Optional[Dict[str, Any]] = None, chunk_size: int = 16):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        created = int(time.time())
+        try:
+            for i in range(0, len(content), chunk_size):
+                chunk = {'id': completion_id, 'object': 'chat.completion.chunk',
+                         'created': created, 'model': model,
+                         'choices': [{'index': 0, 'finish_reason': None,
+                                      'delta': {'content': content[i:i + chunk_size]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            final = {'id': completion_id, 'object': 'chat.completion.chunk',
+                     'created': created, 'model': model,
+                     'choices': [{'index': 0, 'finish_reason': 'stop', 'delta': {}}]}
+            self.wfile.write(f"data: {json.dumps(final)}\n\n".encode('utf-8'))
+            if usage is not None:
+                usage_chunk = {'id': completion_id, 'object': 'chat.completion.chunk',
+                               'created': created, 'model': model, 'choices': [], 'usage': usage}
+                self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client stopped reading early
+            pass
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="OpenAI-compatible mock LLM server replaying recorded responses")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--replay', nargs='+', default=['workplace'],
+                        help="*_output.json artifacts, fixture .jsonl files or directories")
+    parser.add_argument('--latency', default='fixed:0',
+                        help="fixed:S | uniform:LO,HI | normal:MU,SIGMA | lognormal:MU,SIGMA | exponential:MEAN")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--rate-500', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--rate-timeout', type=float, default=0.0, help="fraction of requests left hanging")
+    parser.add_argument('--timeout-delay', type=float, default=600.0,
+                        help="seconds a hanging request is held open")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument('--on-miss', choices=['cycle', 'error'], default='cycle',
+                        help="unmatched prompts get a deterministic recorded response or a 404")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        (args.host, args.port), load_recordings(args.replay), parse_latency(args.latency),
+        rate_429=args.rate_429, rate_500=args.rate_500, rate_timeout=args.rate_timeout,
+        timeout_delay=args.timeout_delay, retry_after=args.retry_after, on_miss=args.on_miss)
+    print(f"Mock LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Request statistics: {json.dumps(server.stats)}")
+
+
+if __name__ == '__main__':
+    main()
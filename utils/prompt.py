@@ -3,11 +3,41 @@ OpenAI API integration utilities for prompt handling and LLM communication.
 
 This module provides functions to load secrets, initialize OpenAI client,
 and send requests to OpenAI API for text generation.
+
+Clients are kept in a process-wide registry so that every LLM call made
+during a pipeline run reuses the same keep-alive HTTP connection pool
+instead of paying TLS handshake and connection setup again.
+
+The async variants share the same configuration but keep one client and one
+concurrency semaphore per event loop, since asyncio connections cannot be
+shared across loops; await close_clients_async() before a loop is closed to
+release its connections.
+
+httpx, openai and yaml are imported on first use, so importing this module
+(e.g. through utils.agent) stays cheap for commands that never call the LLM.
 """
 
+import threading
+import time
+import weakref
 from pathlib import Path
-import yaml
-from openai import OpenAI
+
+from utils.cache import get_response_cache
+from utils.configure import get_llm_config
+from utils.hedge import note_local_result
+from utils.ratelimit import call_with_rate_limit, call_with_rate_limit_async, estimate_request_tokens
+from utils.telemetry import note_cache, note_latency, note_queue_wait, note_usage
+from utils.tokens import get_cached_tokens, record_api_usage
+
+
+# Process-wide client registry keyed by (api_key, base_url, pool_size)
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# Async clients and semaphores, one set per running event loop
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+_SEMAPHORES = weakref.WeakKeyDictionary()
+# Secrets are read from disk once, on first use
+_SECRETS = None
 
 
 def load_secrets(filepath):
@@ -20,6 +50,8 @@ def load_secrets(filepath):
     Returns:
         Dictionary containing secrets or empty dict if file not found
     """
+    import yaml
+
     try:
         with open(filepath, 'r', encoding='utf-8') as file:
             secrets = yaml.safe_load(file)
@@ -29,59 +61,573 @@ def load_secrets(filepath):
         return {}
 
 
-def load_client():
+def get_secrets():
     """
-    Load OpenAI client from secrets
+    Get secrets, loading .secret.yml only on the first call.
+
+    Returns:
+        Dictionary containing secrets or empty dict if file not found
+    """
+    global _SECRETS
+    if _SECRETS is None:
+        with _CLIENTS_LOCK:
+            if _SECRETS is None:
+                path = Path(__file__).parent
+                # Go up one level from utils/ to project root
+                _SECRETS = load_secrets(path.parent / ".secret.yml") or {}
+    return _SECRETS
+
+
+def build_http_client(pool_size=None):
+    """
+    Build an HTTP client with keep-alive connection pooling.
+
+    Args:
+        pool_size: Maximum number of pooled connections (default: LLM.POOL_SIZE)
+
+    Returns:
+        httpx.Client instance
+    """
+    import httpx
+
+    if pool_size is None:
+        pool_size = get_llm_config("POOL_SIZE")
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=get_llm_config("KEEPALIVE_EXPIRY"))
+    return httpx.Client(limits=limits, timeout=get_llm_config("TIMEOUT"))
+
+
+def load_client(pool_size=None):
+    """
+    Load the pooled OpenAI client, creating it on first use
+
+    Args:
+        pool_size: Maximum number of pooled connections (default: LLM.POOL_SIZE)
 
     Returns:
         OpenAI client instance or None if error occurs
     """
+    import yaml
+    from openai import OpenAI
+
+    try:
+        api_key = get_secrets().get("API_KEY")
+        if not api_key:
+            raise KeyError('API_KEY does not exist')
+        if pool_size is None:
+            pool_size = get_llm_config("POOL_SIZE")
+        base_url = get_llm_config("BASE_URL") or None
+        registry_key = (api_key, base_url, pool_size)
+        client = _CLIENTS.get(registry_key)
+        if client is None:
+            with _CLIENTS_LOCK:
+                client = _CLIENTS.get(registry_key)
+                if client is None:
+                    # Retries are handled by utils.ratelimit
+                    client = OpenAI(
+                        api_key=api_key,
+                        base_url=base_url,
+                        http_client=build_http_client(pool_size),
+                        max_retries=0,
+                    )
+                    _CLIENTS[registry_key] = client
+        return client
+    except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
+        print(f'Error:{e}')
+        return None
+
+
+def load_async_client(pool_size=None):
+    """
+    Load the pooled AsyncOpenAI client for the running event loop
+
+    Args:
+        pool_size: Maximum number of pooled connections (default: LLM.POOL_SIZE)
+
+    Returns:
+        AsyncOpenAI client instance or None if error occurs
+    """
+    import asyncio
+    import httpx
+    import yaml
+    from openai import AsyncOpenAI
+
     try:
-        path = Path(__file__).parent
-        # Go up one level from utils/ to project root
-        secrets = load_secrets(path.parent / ".secret.yml")
-        api_key = secrets.get("API_KEY")
-        if api_key:
-            return OpenAI(
+        api_key = get_secrets().get("API_KEY")
+        if not api_key:
+            raise KeyError('API_KEY does not exist')
+        if pool_size is None:
+            pool_size = get_llm_config("POOL_SIZE")
+        base_url = get_llm_config("BASE_URL") or None
+        loop_clients = _ASYNC_CLIENTS.setdefault(
+            asyncio.get_running_loop(), {})
+        registry_key = (api_key, base_url, pool_size)
+        client = loop_clients.get(registry_key)
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=get_llm_config("KEEPALIVE_EXPIRY"))
+            # Retries are handled by utils.ratelimit
+            client = AsyncOpenAI(
                 api_key=api_key,
+                base_url=base_url,
+                http_client=httpx.AsyncClient(
+                    limits=limits, timeout=get_llm_config("TIMEOUT")),
+                max_retries=0,
             )
-        else:
-            raise KeyError('API_KEY does not exist')
+            loop_clients[registry_key] = client
+        return client
     except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
         print(f'Error:{e}')
         return None
 
 
-def ask_openai(system, prompt, model='gpt-4o-mini', max_tokens=6000):
+def get_semaphore():
+    """
+    Get the semaphore bounding concurrent LLM calls on the running event loop.
+
+    Returns:
+        asyncio.Semaphore sized by LLM.MAX_CONCURRENCY
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    semaphore = _SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(get_llm_config("MAX_CONCURRENCY"))
+        _SEMAPHORES[loop] = semaphore
+    return semaphore
+
+
+def _close_async_client(loop, client):
+    import asyncio
+
+    # Async clients can only be closed on their own event loop
+    if loop.is_closed():
+        return
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.close(), loop)
+    else:
+        loop.run_until_complete(client.close())
+
+
+def close_clients():
+    """
+    Close all pooled clients and forget cached secrets.
+
+    Call this when secrets change or before the process exits. Async clients
+    are closed on their own event loop: right away if it is idle, scheduled
+    if it is running. Clients of an already closed loop can no longer be
+    closed, so call close_clients_async() before closing an event loop.
+    """
+    global _SECRETS
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+        async_clients = [(loop, client) for loop, clients in _ASYNC_CLIENTS.items()
+                         for client in clients.values()]
+        _ASYNC_CLIENTS.clear()
+        _SEMAPHORES.clear()
+        _SECRETS = None
+    for loop, client in async_clients:
+        _close_async_client(loop, client)
+
+
+async def close_clients_async():
+    """
+    Close the pooled async clients of the running event loop.
+
+    Await this before the event loop is closed, e.g. at the end of the
+    coroutine passed to asyncio.run(), so its connections are released.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    with _CLIENTS_LOCK:
+        clients = list(_ASYNC_CLIENTS.pop(loop, {}).values())
+        _SEMAPHORES.pop(loop, None)
+    for client in clients:
+        await client.close()
+
+
+def _request_errors():
+    """
+    Exception types turned into a None response, openai's only once it is imported.
+    """
+    try:
+        from openai import APIError
+    except ImportError:
+        return (ImportError, KeyError, FileNotFoundError)
+    return (ImportError, KeyError, FileNotFoundError, APIError)
+
+
+def _stream_errors():
+    """
+    Exception types turned into a None response while streaming: errors raised
+    while reading a stream (e.g. httpx.ReadTimeout, RemoteProtocolError) come
+    from httpx directly, not wrapped in an openai error.
+    """
+    try:
+        from httpx import HTTPError
+    except ImportError:
+        return _request_errors()
+    return _request_errors() + (HTTPError,)
+
+
+def _record_usage(usage):
+    record_api_usage(usage)
+    note_usage(usage)
+
+
+def _request_kwargs(response_format, timeout=None):
+    # Only send optional parameters when set so plain backends keep working
+    kwargs = {}
+    if response_format is not None:
+        kwargs['response_format'] = response_format
+    if timeout is not None:
+        kwargs['timeout'] = timeout
+    return kwargs
+
+
+def ask_openai(system, prompt, model='gpt-4o-mini', max_tokens=6000, response_format=None,
+               timeout=None, cancel=None):
     """
     Send request to OpenAI API
 
+    A blocking request cannot be interrupted, so when a cancel event is given
+    (hedged requests) the answer is read as a stream instead; once the event is
+    set the stream is closed at its next chunk, releasing the rate limit slot.
+
     Args:
         system: System message content
         prompt: User message content
         model: Model to use (default: gpt-4o-mini)
         max_tokens: Maximum tokens in response (default: 1000)
+        response_format: Optional structured output format (e.g. a json_schema)
+        timeout: Per-call timeout in seconds (default: LLM.TIMEOUT)
+        cancel: Optional threading.Event set when the result is no longer needed
 
     Returns:
-        Response content from OpenAI or None if error occurs
+        Response content from OpenAI or None if error occurs or the request was cancelled
     """
+    if cancel is not None:
+        content, _ = ask_openai_stream(system, prompt, model=model, max_tokens=max_tokens,
+                                       on_delta=lambda chunk: cancel.is_set(),
+                                       response_format=response_format, timeout=timeout)
+        return None if cancel.is_set() else content
+    cache = get_response_cache()
+    if cache:
+        cached = cache.get(model, system, prompt, max_tokens, response_format)
+        note_cache('miss' if cached is None else 'hit')
+        if cached is not None:
+            note_local_result()
+            return cached
     try:
         client = load_client()
         if client:
-            response = client.chat.completions.create(
+            response = call_with_rate_limit(
+                model,
+                estimate_request_tokens(system, prompt, max_tokens),
+                lambda: client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": prompt},
+                    ],
+                    max_tokens=max_tokens,
+                    **_request_kwargs(response_format, timeout)
+                ))
+        else:
+            raise ImportError('openai is not imported')
+        _record_usage(getattr(response, 'usage', None))
+        content = response.choices[0].message.content
+        if cache and content is not None:
+            cache.put(model, system, prompt, max_tokens, content, response_format)
+        return content
+    except _request_errors() as e:
+        print(f'Error:{e}')
+        return None
+
+
+async def ask_openai_async(system, prompt, model='gpt-4o-mini', max_tokens=6000, timeout=None,
+                           response_format=None):
+    """
+    Send request to OpenAI API without blocking the event loop
+
+    At most LLM.MAX_CONCURRENCY requests run at once per event loop; further
+    calls wait for a free slot before their timeout starts counting.
+
+    Args:
+        system: System message content
+        prompt: User message content
+        model: Model to use (default: gpt-4o-mini)
+        max_tokens: Maximum tokens in response (default: 6000)
+        timeout: Per-call timeout in seconds (default: LLM.TIMEOUT)
+        response_format: Optional structured output format (e.g. a json_schema)
+
+    Returns:
+        Response content from OpenAI or None if error occurs
+    """
+    import asyncio
+
+    if timeout is None:
+        timeout = get_llm_config("TIMEOUT")
+    cache = get_response_cache()
+    if cache:
+        cached = cache.get(model, system, prompt, max_tokens, response_format)
+        note_cache('miss' if cached is None else 'hit')
+        if cached is not None:
+            note_local_result()
+            return cached
+    try:
+        client = load_async_client()
+        if not client:
+            raise ImportError('openai is not imported')
+        queued = time.perf_counter()
+        async with get_semaphore():
+            note_queue_wait(time.perf_counter() - queued)
+            response = await call_with_rate_limit_async(
+                model,
+                estimate_request_tokens(system, prompt, max_tokens),
+                lambda: asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=model,
+                        messages=[
+                            {"role": "system", "content": system},
+                            {"role": "user", "content": prompt},
+                        ],
+                        max_tokens=max_tokens,
+                        **_request_kwargs(response_format)
+                    ),
+                    timeout=timeout))
+        _record_usage(getattr(response, 'usage', None))
+        content = response.choices[0].message.content
+        if cache and content is not None:
+            cache.put(model, system, prompt, max_tokens, content, response_format)
+        return content
+    except asyncio.TimeoutError:
+        print(f'Error:LLM call timed out after {timeout}s')
+        return None
+    except _request_errors() as e:
+        print(f'Error:{e}')
+        return None
+
+
+def _new_stream_stats():
+    return {
+        'ttfb': None,
+        'time_to_complete': None,
+        'total_time': None,
+        'stopped_early': False,
+        'cache_hit': False,
+        'cached_tokens': 0,
+        'total_tokens': None
+    }
+
+
+def _record_chunk_usage(chunk, stats):
+    # With stream_options.include_usage the final chunk carries the request usage
+    usage = getattr(chunk, 'usage', None)
+    if usage is not None:
+        _record_usage(usage)
+        stats['cached_tokens'] = get_cached_tokens(usage)
+        stats['total_tokens'] = getattr(usage, 'total_tokens', None)
+
+
+def _chunk_text(chunk):
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+
+def ask_openai_stream(system, prompt, model='gpt-4o-mini', max_tokens=6000, on_delta=None,
+                      response_format=None, timeout=None):
+    """
+    Send streaming request to OpenAI API
+
+    Response chunks are passed to on_delta as they arrive. When on_delta
+    returns True the caller has everything it needs, so the stream is closed
+    and generation stops early.
+
+    Args:
+        system: System message content
+        prompt: User message content
+        model: Model to use (default: gpt-4o-mini)
+        max_tokens: Maximum tokens in response (default: 6000)
+        on_delta: Optional callback receiving each text chunk, returns True to stop
+        response_format: Optional structured output format (e.g. a json_schema)
+        timeout: Per-request timeout in seconds (default: LLM.TIMEOUT)
+
+    Returns:
+        Tuple of (response content or None if error occurs, timing statistics
+        with 'ttfb', 'time_to_complete' and 'total_time' in seconds)
+    """
+    stats = _new_stream_stats()
+    cache = get_response_cache()
+    if cache:
+        cached = cache.get(model, system, prompt, max_tokens, response_format)
+        note_cache('miss' if cached is None else 'hit')
+        if cached is not None:
+            note_local_result()
+            stats.update(cache_hit=True, ttfb=0.0,
+                         time_to_complete=0.0, total_time=0.0)
+            if on_delta:
+                on_delta(cached)
+            return cached, stats
+    start = time.perf_counter()
+    parts = []
+
+    def consume(stream):
+        # Runs while the rate limiter's concurrency slot is held
+        read_start = time.perf_counter()
+        try:
+            for chunk in stream:
+                _record_chunk_usage(chunk, stats)
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if stats['ttfb'] is None:
+                    stats['ttfb'] = time.perf_counter() - start
+                parts.append(text)
+                if on_delta and on_delta(text):
+                    stats['time_to_complete'] = time.perf_counter() - start
+                    stats['stopped_early'] = True
+                    break
+        finally:
+            stream.close()
+            note_latency(time.perf_counter() - read_start)
+        return None, stats['total_tokens']
+
+    try:
+        client = load_client()
+        if not client:
+            raise ImportError('openai is not imported')
+        call_with_rate_limit(
+            model,
+            estimate_request_tokens(system, prompt, max_tokens),
+            lambda: client.chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": system},
                     {"role": "user", "content": prompt},
                 ],
-                max_tokens=max_tokens
-            )
-        else:
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                **_request_kwargs(response_format, timeout)
+            ),
+            consume)
+        stats['total_time'] = time.perf_counter() - start
+        if stats['time_to_complete'] is None:
+            stats['time_to_complete'] = stats['total_time']
+        content = ''.join(parts)
+        # Truncated responses are not cached
+        if cache and not stats['stopped_early']:
+            cache.put(model, system, prompt, max_tokens, content, response_format)
+        return content, stats
+    except _stream_errors() as e:
+        print(f'Error:{e}')
+        stats['total_time'] = time.perf_counter() - start
+        return None, stats
+
+
+async def ask_openai_stream_async(system, prompt, model='gpt-4o-mini', max_tokens=6000,
+                                  on_delta=None, timeout=None, response_format=None):
+    """
+    Send streaming request to OpenAI API without blocking the event loop
+
+    Args:
+        system: System message content
+        prompt: User message content
+        model: Model to use (default: gpt-4o-mini)
+        max_tokens: Maximum tokens in response (default: 6000)
+        on_delta: Optional callback receiving each text chunk, returns True to stop
+        timeout: Timeout in seconds for the whole stream (default: LLM.TIMEOUT)
+        response_format: Optional structured output format (e.g. a json_schema)
+
+    Returns:
+        Tuple of (response content or None if error occurs, timing statistics)
+    """
+    import asyncio
+
+    if timeout is None:
+        timeout = get_llm_config("TIMEOUT")
+    stats = _new_stream_stats()
+    cache = get_response_cache()
+    if cache:
+        cached = cache.get(model, system, prompt, max_tokens, response_format)
+        note_cache('miss' if cached is None else 'hit')
+        if cached is not None:
+            note_local_result()
+            stats.update(cache_hit=True, ttfb=0.0,
+                         time_to_complete=0.0, total_time=0.0)
+            if on_delta:
+                on_delta(cached)
+            return cached, stats
+    start = time.perf_counter()
+    parts = []
+
+    async def consume(stream):
+        # Runs while the rate limiter's concurrency slot is held
+        read_start = time.perf_counter()
+        try:
+            async for chunk in stream:
+                _record_chunk_usage(chunk, stats)
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if stats['ttfb'] is None:
+                    stats['ttfb'] = time.perf_counter() - start
+                parts.append(text)
+                if on_delta and on_delta(text):
+                    stats['time_to_complete'] = time.perf_counter() - start
+                    stats['stopped_early'] = True
+                    break
+        finally:
+            await stream.close()
+            note_latency(time.perf_counter() - read_start)
+        return None, stats['total_tokens']
+
+    try:
+        client = load_async_client()
+        if not client:
             raise ImportError('openai is not imported')
-        return response.choices[0].message.content
-    except (ImportError, KeyError, FileNotFoundError) as e:
+        queued = time.perf_counter()
+        async with get_semaphore():
+            note_queue_wait(time.perf_counter() - queued)
+            await call_with_rate_limit_async(
+                model,
+                estimate_request_tokens(system, prompt, max_tokens),
+                lambda: client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": prompt},
+                    ],
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **_request_kwargs(response_format)
+                ),
+                lambda stream: asyncio.wait_for(consume(stream), timeout=timeout))
+        stats['total_time'] = time.perf_counter() - start
+        if stats['time_to_complete'] is None:
+            stats['time_to_complete'] = stats['total_time']
+        content = ''.join(parts)
+        # Truncated responses are not cached
+        if cache and not stats['stopped_early']:
+            cache.put(model, system, prompt, max_tokens, content, response_format)
+        return content, stats
+    except asyncio.TimeoutError:
+        print(f'Error:LLM stream timed out after {timeout}s')
+    except _stream_errors() as e:
         print(f'Error:{e}')
-        return None
+    stats['total_time'] = time.perf_counter() - start
+    return None, stats
 
 
 if __name__ == "__main__":
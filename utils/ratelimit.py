@@ -0,0 +1,407 @@
+"""
+Rate limiting and retry utilities for LLM calls.
+
+This module budgets requests and tokens per model with token buckets whose
+state is kept in a lock-protected file, so every worker process on the same
+host draws from one shared budget. Throttled calls (HTTP 429) are retried
+after the provider's Retry-After delay or a jittered exponential backoff,
+and an AIMD limiter halves the allowed concurrency on each 429 and slowly
+grows it back on success. Streamed responses keep their concurrency slot
+until the stream is read, and the tokens reserved for a request are refunded
+from its reported usage.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.configure import get_llm_config, get_rate_limit_config
+from utils.telemetry import note_queue_wait, note_request, note_retry
+
+try:
+    import fcntl
+except ImportError:  # Windows: budget is shared between threads only
+    fcntl = None
+
+
+_THREAD_LOCK = threading.Lock()
+_LIMITER = None
+
+
+def estimate_request_tokens(system: str, prompt: str, max_tokens: int) -> int:
+    """
+    Estimate the tokens a request counts against a tokens-per-minute budget.
+
+    Providers reserve the prompt plus max_tokens when the request is accepted,
+    so both are included. Prompt tokens are approximated as 4 characters each.
+
+    Args:
+        system: System message content
+        prompt: User message content
+        max_tokens: Maximum tokens in response
+
+    Returns:
+        Estimated token count
+    """
+    return (len(system) + len(prompt)) // 4 + max_tokens
+
+
+def get_model_limits(model: str) -> Dict[str, float]:
+    """
+    Get requests-per-minute and tokens-per-minute limits for a model.
+
+    Args:
+        model: Model name
+
+    Returns:
+        Dictionary with 'RPM' and 'TPM' values
+    """
+    limits = dict(get_rate_limit_config("DEFAULT"))
+    limits.update((get_rate_limit_config("MODELS") or {}).get(model, {}))
+    return limits
+
+
+@contextmanager
+def _locked_state():
+    """
+    Lock and yield the shared bucket state, writing it back on exit.
+    """
+    state_path = Path(get_rate_limit_config("STATE_FILE"))
+    if not state_path.is_absolute():
+        # Relative paths are resolved against the project root
+        state_path = Path(__file__).parent.parent / state_path
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    with _THREAD_LOCK:
+        with open(f"{state_path}.lock", 'a', encoding='utf-8') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(state_path, 'r', encoding='utf-8') as f:
+                        state = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = {}
+                yield state
+                tmp_path = f"{state_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, state_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def try_acquire_budget(model: str, tokens: int) -> float:
+    """
+    Try to take one request and the given tokens from the model's buckets.
+
+    Args:
+        model: Model name
+        tokens: Estimated tokens of the request
+
+    Returns:
+        0 if the budget was taken, otherwise seconds to wait before retrying
+    """
+    limits = get_model_limits(model)
+    rpm = float(limits['RPM'])
+    tpm = float(limits['TPM'])
+    # A single request larger than the whole bucket could never be admitted
+    tokens = min(tokens, tpm)
+    now = time.time()
+    with _locked_state() as state:
+        bucket = state.get(model, {'requests': rpm, 'tokens': tpm, 'updated': now})
+        elapsed = max(0.0, now - bucket['updated'])
+        requests_left = min(rpm, bucket['requests'] + elapsed * rpm / 60)
+        tokens_left = min(tpm, bucket['tokens'] + elapsed * tpm / 60)
+        if requests_left >= 1 and tokens_left >= tokens:
+            requests_left -= 1
+            tokens_left -= tokens
+            wait = 0.0
+        else:
+            wait = max((1 - requests_left) * 60 / rpm,
+                       (tokens - tokens_left) * 60 / tpm)
+        state[model] = {'requests': requests_left,
+                        'tokens': tokens_left, 'updated': now}
+    return wait
+
+
+def refund_tokens(model: str, tokens: int) -> None:
+    """
+    Return over-reserved tokens to the model's bucket after a call completes.
+
+    Args:
+        model: Model name
+        tokens: Number of tokens to give back
+    """
+    if tokens <= 0:
+        return
+    tpm = float(get_model_limits(model)['TPM'])
+    with _locked_state() as state:
+        if model in state:
+            state[model]['tokens'] = min(tpm, state[model]['tokens'] + tokens)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter
+
+    The concurrency limit is halved on every throttled call and grows by
+    roughly one slot per limit's worth of successful calls.
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Block until a concurrency slot is free.
+        """
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        """
+        Wait without blocking the event loop until a concurrency slot is free.
+        """
+        import asyncio
+
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+            await asyncio.sleep(0.05)
+
+    def release(self, throttled: bool = False) -> None:
+        """
+        Free a slot and adapt the limit to the outcome of the call.
+
+        Args:
+            throttled: Whether the call was rejected with HTTP 429
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit),
+                                 self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def get_limiter() -> AdaptiveLimiter:
+    """
+    Get the process-wide adaptive concurrency limiter.
+
+    Returns:
+        AdaptiveLimiter sized by LLM.MAX_CONCURRENCY
+    """
+    global _LIMITER
+    if _LIMITER is None:
+        with _THREAD_LOCK:
+            if _LIMITER is None:
+                _LIMITER = AdaptiveLimiter(get_llm_config("MAX_CONCURRENCY"))
+    return _LIMITER
+
+
+def _retryable_errors():
+    """
+    Import the openai errors handled by the retry loop, on the first LLM call.
+
+    Timeouts are not retried: the call goes straight to the next model of the
+    stage's fallback chain, as the async path does with asyncio.TimeoutError.
+
+    Returns:
+        Tuple of (rate limit error, timeout error, errors worth retrying
+        besides rate limiting)
+    """
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    return RateLimitError, APITimeoutError, (APIConnectionError, InternalServerError)
+
+
+def get_retry_after(error) -> Optional[float]:
+    """
+    Read the Retry-After delay from a rate limit error.
+
+    Args:
+        error: RateLimitError raised by the OpenAI client
+
+    Returns:
+        Delay in seconds or None if the header is missing
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def get_backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Compute the delay before the next attempt.
+
+    Args:
+        attempt: Zero-based attempt number that just failed
+        retry_after: Delay requested by the provider, if any
+
+    Returns:
+        Delay in seconds, with jitter so workers do not retry in lockstep
+    """
+    base = float(get_rate_limit_config("BACKOFF_BASE"))
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    cap = float(get_rate_limit_config("BACKOFF_MAX"))
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _used_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+
+def call_with_rate_limit(model: str, estimated_tokens: int, request: Callable[[], Any],
+                         consume: Optional[Callable[[Any], Tuple[Any, Optional[int]]]] = None) -> Any:
+    """
+    Run a request within the model's budget, retrying throttled and transient failures.
+
+    Args:
+        model: Model name
+        estimated_tokens: Tokens reserved from the budget for this request
+        request: Zero-argument function performing the API call
+        consume: Function reading the response (e.g. a stream) while the
+            concurrency slot is still held, returning (result, tokens used or
+            None). Errors raised while consuming are not retried.
+
+    Returns:
+        Result of request(), or of consume() if given
+    """
+    rate_limit_error, timeout_error, transient_errors = _retryable_errors()
+    enabled = get_rate_limit_config("ENABLED")
+    max_retries = get_rate_limit_config("MAX_RETRIES")
+    limiter = get_limiter()
+    for attempt in range(max_retries + 1):
+        if attempt:
+            note_retry()
+        queued = time.perf_counter()
+        if enabled:
+            wait = try_acquire_budget(model, estimated_tokens)
+            while wait > 0:
+                time.sleep(wait)
+                wait = try_acquire_budget(model, estimated_tokens)
+        limiter.acquire()
+        sent = time.perf_counter()
+        note_queue_wait(sent - queued)
+        throttled = False
+        try:
+            try:
+                response = request()
+            finally:
+                note_request(time.perf_counter() - sent)
+        except rate_limit_error as e:
+            throttled = True
+            if attempt == max_retries:
+                raise
+            delay = get_backoff(attempt, get_retry_after(e))
+            print(f"Rate limited on {model}, retrying in {delay:.1f}s...")
+        except timeout_error:
+            # APITimeoutError is an APIConnectionError, catch it first
+            raise
+        except transient_errors as e:
+            if attempt == max_retries:
+                raise
+            delay = get_backoff(attempt)
+            print(f"Transient error on {model}: {e}, retrying in {delay:.1f}s...")
+        else:
+            used = _used_tokens(response)
+            if consume is not None:
+                response, used = consume(response)
+            if enabled and used is not None:
+                refund_tokens(model, estimated_tokens - used)
+            return response
+        finally:
+            limiter.release(throttled)
+        time.sleep(delay)
+
+
+async def call_with_rate_limit_async(
+        model: str, estimated_tokens: int, request: Callable[[], Awaitable[Any]],
+        consume: Optional[Callable[[Any], Awaitable[Tuple[Any, Optional[int]]]]] = None) -> Any:
+    """
+    Async variant of call_with_rate_limit().
+
+    The shared budget file is locked on a worker thread so the event loop
+    never blocks on it.
+
+    Args:
+        model: Model name
+        estimated_tokens: Tokens reserved from the budget for this request
+        request: Zero-argument function returning the API call awaitable
+        consume: Coroutine function reading the response while the concurrency
+            slot is still held, returning (result, tokens used or None)
+
+    Returns:
+        Result of the awaited request, or of consume() if given
+    """
+    import asyncio
+
+    rate_limit_error, timeout_error, transient_errors = _retryable_errors()
+    enabled = get_rate_limit_config("ENABLED")
+    max_retries = get_rate_limit_config("MAX_RETRIES")
+    limiter = get_limiter()
+    for attempt in range(max_retries + 1):
+        if attempt:
+            note_retry()
+        queued = time.perf_counter()
+        if enabled:
+            wait = await asyncio.to_thread(try_acquire_budget, model, estimated_tokens)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = await asyncio.to_thread(try_acquire_budget, model, estimated_tokens)
+        await limiter.acquire_async()
+        sent = time.perf_counter()
+        note_queue_wait(sent - queued)
+        throttled = False
+        try:
+            try:
+                response = await request()
+            finally:
+                note_request(time.perf_counter() - sent)
+        except rate_limit_error as e:
+            throttled = True
+            if attempt == max_retries:
+                raise
+            delay = get_backoff(attempt, get_retry_after(e))
+            print(f"Rate limited on {model}, retrying in {delay:.1f}s...")
+        except timeout_error:
+            # APITimeoutError is an APIConnectionError, catch it first
+            raise
+        except transient_errors as e:
+            if attempt == max_retries:
+                raise
+            delay = get_backoff(attempt)
+            print(f"Transient error on {model}: {e}, retrying in {delay:.1f}s...")
+        else:
+            used = _used_tokens(response)
+            if consume is not None:
+                response, used = await consume(response)
+            if enabled and used is not None:
+                await asyncio.to_thread(refund_tokens, model, estimated_tokens - used)
+            return response
+        finally:
+            limiter.release(throttled)
+        await asyncio.sleep(delay)
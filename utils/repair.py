@@ -0,0 +1,151 @@
+"""
+Validation and targeted repair of extracted LLM output.
+
+The output extracted from a response is checked against the configuration's
+`output` list and the schema derived from its `format` section
+(utils/schema.py). Instead of rerunning the whole stage, outputs that are
+missing or malformed are repaired with a short follow-up prompt holding only
+the malformed fragment of the answer and the expected schema of the failing
+variables; utils/agent runs that prompt within the stage's retry budget
+(REPAIR.MAX_ATTEMPTS, or LLM_ROUTES.<stage>.REPAIR_ATTEMPTS).
+"""
+
+import json
+import re
+from typing import Any, Dict, List
+
+from utils.schema import build_output_schema, output_schema_key
+from utils.tokens import truncate_text
+
+
+_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'boolean': bool,
+}
+
+# Output schemas keyed by utils.schema.output_schema_key()
+_SCHEMAS = {}
+
+
+def _output_schema(config: Dict[str, Any]) -> Dict[str, Any]:
+    key = output_schema_key(config)
+    if key not in _SCHEMAS:
+        _SCHEMAS[key] = build_output_schema(config)[0]
+    return _SCHEMAS[key]
+
+
+def _type_matches(value: Any, expected: str) -> bool:
+    if expected in ('number', 'integer'):
+        # bool is an int subclass but never a valid number here
+        if isinstance(value, bool):
+            return False
+        return isinstance(value, int) if expected == 'integer' else isinstance(value, (int, float))
+    python_type = _TYPES.get(expected)
+    return python_type is None or isinstance(value, python_type)
+
+
+def validate_value(value: Any, schema: Dict[str, Any], path: str) -> List[str]:
+    """
+    Check a value against the subset of JSON schema derived for outputs
+    (type, enum, required properties and array items).
+
+    Args:
+        value: Extracted value
+        schema: JSON schema, {} accepts any value
+        path: Location of the value used in problem descriptions
+
+    Returns:
+        List of problems, empty if the value is valid
+    """
+    expected = schema.get('type')
+    if expected and not _type_matches(value, expected):
+        return [f"{path}: expected {expected}, got {type(value).__name__}"]
+    if 'enum' in schema and value not in schema['enum']:
+        return [f"{path}: {value!r} is not one of {', '.join(map(str, schema['enum']))}"]
+
+    problems = []
+    if isinstance(value, dict):
+        for name in schema.get('required', []):
+            if name not in value:
+                problems.append(f"{path}: missing field '{name}'")
+        for name, sub_schema in schema.get('properties', {}).items():
+            if name in value:
+                problems.extend(validate_value(value[name], sub_schema, f"{path}.{name}"))
+    elif isinstance(value, list) and isinstance(schema.get('items'), dict):
+        for index, item in enumerate(value):
+            problems.extend(validate_value(item, schema['items'], f"{path}[{index}]"))
+    return problems
+
+
+def validate_output(config: Dict[str, Any], extracted: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Check extracted output variables against a configuration's output and format.
+
+    Args:
+        config: Configuration dictionary
+        extracted: Extracted output variables
+
+    Returns:
+        Mapping of each invalid output variable to its problems
+    """
+    properties = _output_schema(config)['properties']
+    invalid = {}
+    for var in config['output']:
+        if var not in extracted:
+            invalid[var] = [f"{var}: missing"]
+            continue
+        problems = validate_value(extracted[var], properties.get(var, {}), var)
+        if problems:
+            invalid[var] = problems
+    return invalid
+
+
+def _fragment(response: str, var_names: List[str], max_tokens: int) -> str:
+    """
+    Cut the part of a response that should hold the given variables.
+    """
+    starts = []
+    for var in var_names:
+        match = re.search(rf'"?{re.escape(var)}"?\s*:', response)
+        if match:
+            starts.append(match.start())
+    if len(starts) == len(var_names):
+        # Every variable is present but malformed: send the answer from the first one
+        return truncate_text(response[min(starts):], max_tokens, 'head')
+    # A variable is missing or mislabeled: send the whole answer within the budget
+    return truncate_text(response, max_tokens, 'middle')
+
+
+def build_repair_prompt(config: Dict[str, Any], response: str,
+                        invalid: Dict[str, List[str]], fragment_tokens: int) -> str:
+    """
+    Build the follow-up prompt repairing invalid output variables.
+
+    Args:
+        config: Configuration dictionary
+        response: Previous LLM response
+        invalid: Mapping of invalid output variable to its problems (see validate_output)
+        fragment_tokens: Maximum tokens of the response fragment included
+
+    Returns:
+        Repair prompt text
+    """
+    var_names = list(invalid)
+    properties = _output_schema(config)['properties']
+    format_section = config.get('format', {})
+    lines = [f"Task: Repair the output of {config['name']}\n\n",
+             "The previous answer does not match the required output format:\n"]
+    for problems in invalid.values():
+        lines.extend(f"- {problem}\n" for problem in problems[:5])
+    lines.append(f"\nFragment of the previous answer:\n{_fragment(response, var_names, fragment_tokens)}\n")
+    lines.append(f"\nReturn only a JSON object with the keys {', '.join(var_names)}.\n")
+    for var in var_names:
+        if properties.get(var):
+            schema = json.dumps(properties[var], ensure_ascii=False, separators=(',', ':'))
+            lines.append(f"- {var} schema: {schema}\n")
+        elif var in format_section:
+            # No schema could be derived, fall back to the prose description
+            lines.append(f"- {var}: {format_section[var]}\n")
+    return ''.join(lines)
@@ -0,0 +1,299 @@
+"""
+Dependency-ordered stage scheduler.
+
+A pipeline is declared as a list of stages. Each stage names the stages
+whose outputs it consumes; its own output is published under its name.
+run_stages() runs every stage needed for the requested targets exactly once,
+as soon as its inputs are available, so independent stages (e.g. CTL
+generation and BPMN/Petri net export) run concurrently on a thread pool
+bounded by PIPELINE.MAX_WORKERS. Each stage runs in a copy of the caller's
+context, so context variables (token accounting, telemetry) carry over.
+
+Given a StageCache, runs are incremental: the output of a cached stage is
+stored with a hash of its inputs (the output hashes of its input stages
+plus the stage's own fingerprint, e.g. prompt config and model settings).
+A rerun reuses every stored output whose input hash still matches, so only
+stale stages and the stages depending on them are recomputed. Dependents
+hash the content of their inputs, so a recomputed stage that produces the
+same output does not invalidate them.
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.configure import get_pipeline_config
+
+
+class StageError(RuntimeError):
+    """
+    Raised when a stage fails or produces no output
+    """
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"Stage '{stage}' failed: {message}")
+        self.stage = stage
+
+
+class Stage:
+    """
+    One pipeline step with explicit inputs and a single output
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], inputs: Iterable[str] = (),
+                 cache: bool = False, fingerprint: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            name: Stage name, also the name of its output
+            func: Called with one keyword argument per input stage, holding its output
+            inputs: Names of the stages whose outputs this stage consumes
+            cache: Store the output for incremental runs (for expensive stages
+                with JSON-serializable output)
+            fingerprint: Returns JSON-serializable settings the output depends on
+                besides its inputs (e.g. prompt config contents and model)
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.cache = cache
+        self.fingerprint = fingerprint
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={list(self.inputs)})"
+
+
+def hash_value(value: Any) -> str:
+    """
+    Hash a JSON-serializable value independently of dictionary key order.
+
+    Args:
+        value: Value to hash
+
+    Returns:
+        SHA-256 hex digest
+    """
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False,
+                         separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class StageCache:
+    """
+    Stage outputs stamped with the hash of their inputs, one JSON file per stage
+    """
+
+    def __init__(self, directory: str, refresh: bool = False):
+        """
+        Args:
+            directory: Directory holding <stage>.json files
+            refresh: Treat every stored output as stale, but store new ones
+        """
+        self.directory = Path(directory)
+        self.refresh = refresh
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.json"
+
+    def load(self, name: str, input_hash: str) -> Tuple[bool, Any]:
+        """
+        Look up the stored output of a stage.
+
+        Args:
+            name: Stage name
+            input_hash: Hash of the stage's current inputs
+
+        Returns:
+            Tuple of (whether a fresh output is stored, the output)
+        """
+        if self.refresh:
+            return False, None
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False, None
+        if entry.get('input_hash') != input_hash:
+            return False, None
+        return True, entry.get('output')
+
+    def save(self, name: str, input_hash: str, output: Any) -> None:
+        """
+        Store the output of a stage with the hash of its inputs.
+
+        Args:
+            name: Stage name
+            input_hash: Hash of the inputs the output was computed from
+            output: JSON-serializable stage output
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(name)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'stage': name,
+                'input_hash': input_hash,
+                'output_hash': hash_value(output),
+                'created_at': time.time(),
+                'output': output
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _index_stages(stages: List[Stage]) -> Dict[str, Stage]:
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Duplicate stage name: {stage.name}")
+        by_name[stage.name] = stage
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{name}'")
+    return by_name
+
+
+def select_stages(stages: List[Stage], targets: Optional[Iterable[str]] = None) -> List[Stage]:
+    """
+    Order the stages needed for the targets so that inputs come first.
+
+    Args:
+        stages: Declared stages
+        targets: Stage names to produce (default: every stage)
+
+    Returns:
+        Needed stages in dependency order
+
+    Raises:
+        ValueError: For unknown or duplicate stage names and dependency cycles
+    """
+    by_name = _index_stages(stages)
+    if targets is None:
+        targets = [stage.name for stage in stages]
+
+    ordered = []
+    state = {}
+
+    def visit(name, path):
+        if name not in by_name:
+            raise ValueError(f"Unknown stage: {name}")
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for input_name in by_name[name].inputs:
+            visit(input_name, path + [name])
+        state[name] = 'done'
+        ordered.append(by_name[name])
+
+    for target in targets:
+        visit(target, [])
+    return ordered
+
+
+def _input_hash(stage: Stage, output_hashes: Dict[str, str]) -> str:
+    try:
+        fingerprint = stage.fingerprint() if stage.fingerprint else None
+    except Exception as e:
+        raise StageError(stage.name, f"fingerprint failed: {type(e).__name__}: {e}") from e
+    return hash_value({
+        'stage': stage.name,
+        'fingerprint': fingerprint,
+        'inputs': {name: output_hashes[name] for name in stage.inputs}
+    })
+
+
+def _run_stage(stage: Stage, kwargs: Dict[str, Any], cache: Optional[StageCache],
+               input_hash: str) -> Any:
+    start = time.perf_counter()
+    result = stage.func(**kwargs)
+    if result is None:
+        raise StageError(stage.name, "no output")
+    if cache is not None and stage.cache:
+        cache.save(stage.name, input_hash, result)
+    print(f"[pipeline] {stage.name} finished in {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def run_stages(stages: List[Stage], targets: Optional[Iterable[str]] = None,
+               max_workers: Optional[int] = None,
+               cache: Optional[StageCache] = None) -> Dict[str, Any]:
+    """
+    Run the stages needed for the targets, each exactly once.
+
+    A stage starts as soon as all of its inputs are available. When a stage
+    fails, stages already running finish, no dependent stage is started and
+    the first error is raised.
+
+    Args:
+        stages: Declared stages
+        targets: Stage names to produce (default: every stage)
+        max_workers: Maximum stages running at once (default: PIPELINE.MAX_WORKERS)
+        cache: Reuse and store outputs of stages declared with cache=True
+
+    Returns:
+        Dictionary mapping each needed stage to its output
+
+    Raises:
+        StageError: If a stage fails or returns None
+    """
+    ordered = select_stages(stages, targets)
+    if max_workers is None:
+        max_workers = get_pipeline_config("MAX_WORKERS")
+
+    results = {}
+    output_hashes = {}
+    pending = list(ordered)
+    running = {}
+    reused = []
+    error = None
+    with ThreadPoolExecutor(max_workers=max(1, max_workers),
+                            thread_name_prefix='pipeline') as executor:
+        while pending or running:
+            ready = [] if error is not None else \
+                [s for s in pending if all(name in results for name in s.inputs)]
+            for stage in ready:
+                pending.remove(stage)
+                try:
+                    input_hash = _input_hash(stage, output_hashes)
+                except StageError as e:
+                    error = error or e
+                    break
+                if cache is not None and stage.cache:
+                    fresh, output = cache.load(stage.name, input_hash)
+                    if fresh:
+                        results[stage.name] = output
+                        output_hashes[stage.name] = hash_value(output)
+                        reused.append(stage.name)
+                        print(f"[pipeline] {stage.name} is up to date")
+                        continue
+                kwargs = {name: results[name] for name in stage.inputs}
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, _run_stage, stage, kwargs, cache, input_hash)
+                running[future] = stage
+            if ready and error is None:
+                # Reused outputs may have made further stages ready
+                continue
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                    output_hashes[stage.name] = hash_value(results[stage.name])
+                except StageError as e:
+                    error = error or e
+                except Exception as e:
+                    error = error or StageError(stage.name, f"{type(e).__name__}: {e}")
+                    error.__cause__ = e
+    if error is not None:
+        raise error
+    if cache is not None:
+        print(f"[pipeline] {len(ordered) - len(reused)} stage(s) run, {len(reused)} reused")
+    return results
@@ -0,0 +1,197 @@
+"""
+Derive JSON schemas for structured LLM output from prompt configurations.
+
+Each prompt configuration lists its output variables in `output` and
+describes them in `format`, either as a JSON schema (verification/config/ctl.json)
+or as prose such as "JSON array format with objects containing actor_name
+(string) and symbol (string) fields". This module turns those descriptions
+into a response_format so the LLM returns a single JSON object with one key
+per output variable, which can be parsed with one json.loads.
+"""
+
+import copy
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Keywords that strict structured output does not accept
+_UNSUPPORTED_KEYWORDS = ('examples', 'default', 'minLength', 'maxLength', 'pattern', 'format')
+
+_OBJECT_FIELDS = re.compile(r'objects?\s+(?:containing|with)\s+(.*?)\s+fields?\b', re.IGNORECASE)
+_FIELD_SPLIT = re.compile(r',\s*(?:and\s+)?|\s+and\s+')
+_FIELD = re.compile(r'^(\w+)(?:\s*\(([^)]*)\))?$')
+_EXAMPLE_OBJECT = re.compile(r'\{([^{}]*)\}')
+_EXAMPLE_FIELD = re.compile(r'"(\w+)"\s*:\s*([^,}]*)')
+
+# Response formats keyed by output_schema_key()
+_SCHEMAS = {}
+
+
+def output_schema_key(config: Dict[str, Any]) -> str:
+    """
+    Key of the parts of a configuration its output schema is derived from.
+
+    Schemas are cached by content rather than by configuration name, so an
+    edited configuration file reloaded by utils.template gets a new schema.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Cache key
+    """
+    return json.dumps([config['name'], config.get('output'), config.get('format')],
+                      ensure_ascii=False, sort_keys=True)
+
+
+def _type_schema(type_text: Optional[str]) -> Dict[str, Any]:
+    """
+    Map a short type description such as 'number 0-1' to a schema.
+    """
+    text = (type_text or '').strip().lower()
+    if text.startswith('array of string'):
+        return {'type': 'array', 'items': {'type': 'string'}}
+    if text.startswith('number'):
+        return {'type': 'number'}
+    if text.startswith('integer'):
+        return {'type': 'integer'}
+    if text.startswith('bool'):
+        return {'type': 'boolean'}
+    return {'type': 'string'}
+
+
+def _object_schema(properties: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties),
+        'additionalProperties': False
+    }
+
+
+def _parse_fields(description: str) -> Dict[str, Any]:
+    """
+    Read object fields from a prose format description.
+
+    Returns:
+        Mapping of field name to schema, empty if no fields are described
+    """
+    example = _EXAMPLE_OBJECT.search(description)
+    if example:
+        return {name: _type_schema(value)
+                for name, value in _EXAMPLE_FIELD.findall(example.group(1))}
+
+    listed = _OBJECT_FIELDS.search(description)
+    if not listed:
+        return {}
+    properties = {}
+    for item in _FIELD_SPLIT.split(listed.group(1)):
+        field = _FIELD.match(item.strip())
+        if not field:
+            return {}
+        properties[field.group(1)] = _type_schema(field.group(2))
+    return properties
+
+
+def _prose_schema(description: str, enums: Dict[str, List[str]]) -> Dict[str, Any]:
+    """
+    Build a schema from a prose format description, or {} if it cannot be derived.
+    """
+    text = description.strip().lower()
+    if text.startswith('json array') or text.startswith('array'):
+        if text.startswith('array of string'):
+            return {'type': 'array', 'items': {'type': 'string'}}
+        properties = _parse_fields(description)
+        if not properties:
+            return {}
+        for name, values in enums.items():
+            if name in properties:
+                properties[name] = {'type': 'string', 'enum': values}
+        return {'type': 'array', 'items': _object_schema(properties)}
+    if text.startswith('json object'):
+        properties = _parse_fields(description)
+        return _object_schema(properties) if properties else {}
+    if text.startswith('string'):
+        return {'type': 'string'}
+    return {}
+
+
+def _strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy a JSON schema into the subset accepted by strict structured output.
+    """
+    schema = {key: value for key, value in schema.items()
+              if key not in _UNSUPPORTED_KEYWORDS}
+    if schema.get('type') == 'object' and 'properties' in schema:
+        schema['properties'] = {name: _strict_schema(value)
+                                for name, value in schema['properties'].items()}
+        schema['required'] = list(schema['properties'])
+        schema['additionalProperties'] = False
+    if isinstance(schema.get('items'), dict):
+        schema['items'] = _strict_schema(schema['items'])
+    return schema
+
+
+def build_output_schema(config: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Build the JSON schema of a prompt configuration's output.
+
+    Args:
+        config: Configuration dictionary with `output` and `format` sections
+
+    Returns:
+        Tuple of (schema of an object with one property per output variable,
+        whether every variable has a fully derived schema and can be enforced strictly)
+    """
+    format_section = config.get('format', {})
+    # e.g. task.json describes the allowed task_type values in task_type_enums
+    enums = {key[:-len('_enums')]: value for key, value in format_section.items()
+             if key.endswith('_enums') and isinstance(value, list)}
+
+    properties = {}
+    strict = True
+    for var in config['output']:
+        description = format_section.get(var)
+        if isinstance(description, dict) and 'type' in description:
+            schema = _strict_schema(description)
+        elif isinstance(description, str):
+            schema = _prose_schema(description, enums)
+        else:
+            schema = {}
+        if not schema:
+            strict = False
+        properties[var] = schema
+
+    schema = _object_schema(properties)
+    return schema, strict
+
+
+def get_response_format(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the json_schema response_format for a prompt configuration.
+
+    Schemas are derived once per configuration content and reused.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        response_format value for the chat completions API
+    """
+    name = config['name']
+    key = output_schema_key(config)
+    if key not in _SCHEMAS:
+        schema, strict = build_output_schema(config)
+        if not strict:
+            print(f"Warning: output format of '{name}' is only partially described, "
+                  f"structured output is not enforced strictly")
+        _SCHEMAS[key] = {
+            'type': 'json_schema',
+            'json_schema': {
+                'name': re.sub(r'[^a-zA-Z0-9_-]+', '_', name).strip('_')[:64] or 'output',
+                'schema': schema,
+                'strict': strict
+            }
+        }
+    return copy.deepcopy(_SCHEMAS[key])
@@ -0,0 +1,488 @@
+"""
+Structured telemetry for LLM calls.
+
+Every call made through utils.agent.generate_prompt_from_config (and its async
+variant) produces one record with the configuration name, stage, model, API
+token usage, time spent queueing for concurrency and rate limit slots,
+network latency, retries, response cache outcome and whether all outputs
+were extracted. The lower layers (utils/prompt.py, utils/ratelimit.py) add
+to the record of the call in progress through context variables, so hedged
+duplicates, fallbacks and repair prompts count towards the same record.
+
+Telemetry is opt-in (TELEMETRY.ENABLED). Records are appended to a JSONL
+sink (TELEMETRY.PATH, relative paths are resolved against the workplace in
+effect, so each utils.workspace scope such as a batch job gets its own file)
+that grows with every call until it is deleted or rotated. Records carry a run id, the process's own
+unless a run_id_scope() (e.g. the batch job id) applies. With TELEMETRY.OTEL_SPANS
+each record is also emitted as an OpenTelemetry span, using the gen_ai.*
+semantic convention attributes, when the opentelemetry package is installed.
+
+Summarize a run, or a batch job in workplace/runs/<job id>/, with:
+    python -m utils.telemetry workplace/telemetry.jsonl --run last
+"""
+
+import argparse
+import contextlib
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.configure import get_telemetry_config, get_workplace
+from utils.tokens import get_cached_tokens
+
+
+def _otel_trace():
+    """
+    Import the OpenTelemetry trace API on first use, None if it is not installed.
+    """
+    try:
+        from opentelemetry import trace as otel_trace
+    except ImportError:  # spans are optional, JSONL records are always available
+        return None
+    return otel_trace
+
+
+def _random_id(length: int) -> str:
+    return os.urandom(length // 2).hex()
+
+
+# Identifies the records of one process run, unless run_id_scope() applies
+_PROCESS_RUN_ID = _random_id(12)
+_RUN_ID = contextvars.ContextVar('telemetry_run_id', default=None)
+
+# Record of the LLM call in progress
+_CURRENT_CALL = contextvars.ContextVar('llm_call', default=None)
+_RECORD_LOCK = threading.Lock()
+
+# Sinks keyed by (path, otel_spans), created on first use
+_SINKS = {}
+# Sink installed by set_telemetry_sink(), used instead of the configured ones
+_SINK = None
+_SINK_LOCK = threading.Lock()
+
+
+class TelemetrySink:
+    """
+    Append-only JSONL file of call records
+    """
+
+    def __init__(self, path: str, otel_spans: bool = False):
+        """
+        Args:
+            path: JSONL file path
+            otel_spans: Also emit each record as an OpenTelemetry span
+        """
+        self.path = path
+        self.otel_spans = otel_spans
+        self._lock = threading.Lock()
+        if otel_spans and _otel_trace() is None:
+            print("Warning: opentelemetry is not installed, TELEMETRY.OTEL_SPANS is ignored")
+            self.otel_spans = False
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        """
+        Write one call record.
+
+        Args:
+            record: Call record (see call_span)
+        """
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        if self.otel_spans:
+            _emit_span(record)
+
+
+def get_telemetry_path() -> Path:
+    """
+    Get the JSONL file configured in TELEMETRY.PATH.
+
+    Returns:
+        The path, relative paths resolved against the workplace in effect
+    """
+    path = Path(get_telemetry_config("PATH"))
+    if not path.is_absolute():
+        path = Path(get_workplace()) / path
+    return path
+
+
+def get_telemetry_sink() -> Optional[TelemetrySink]:
+    """
+    Get the telemetry sink for the TELEMETRY settings and workplace in effect.
+
+    Returns:
+        TelemetrySink instance or None if telemetry is disabled
+    """
+    if _SINK is not None:
+        return _SINK
+    if not get_telemetry_config("ENABLED"):
+        return None
+    settings = (str(get_telemetry_path()), bool(get_telemetry_config("OTEL_SPANS")))
+    sink = _SINKS.get(settings)
+    if sink is None:
+        with _SINK_LOCK:
+            sink = _SINKS.get(settings)
+            if sink is None:
+                sink = TelemetrySink(*settings)
+                _SINKS[settings] = sink
+    return sink
+
+
+def set_telemetry_sink(sink: Optional[TelemetrySink]) -> None:
+    """
+    Replace the process-wide telemetry sink.
+
+    Args:
+        sink: TelemetrySink instance, or None to use the TELEMETRY settings again
+    """
+    global _SINK
+    with _SINK_LOCK:
+        _SINK = sink
+
+
+def get_run_id() -> str:
+    """
+    Get the run id stamped on the records of the current context.
+    """
+    return _RUN_ID.get() or _PROCESS_RUN_ID
+
+
+def set_run_id(run_id: str) -> None:
+    """
+    Group the following records of the current context under another run id.
+
+    Args:
+        run_id: Run identifier
+    """
+    _RUN_ID.set(run_id)
+
+
+@contextlib.contextmanager
+def run_id_scope(run_id: Optional[str]):
+    """
+    Group the records of the current context under a run id inside a with block.
+
+    Args:
+        run_id: Run identifier, None keeps the current one
+    """
+    if run_id is None:
+        yield
+        return
+    token = _RUN_ID.set(run_id)
+    try:
+        yield
+    finally:
+        _RUN_ID.reset(token)
+
+
+def _new_record(config_name: str, stage: Optional[str]) -> Dict[str, Any]:
+    return {
+        'run_id': get_run_id(),
+        'trace_id': _random_id(32),
+        'span_id': _random_id(16),
+        'timestamp': time.time(),
+        'config_name': config_name,
+        'stage': stage or config_name,
+        'model': None,
+        'status': 'ok',
+        'error': None,
+        'duration': None,
+        'queue_wait': 0.0,
+        'latency': 0.0,
+        'requests': 0,
+        'retries': 0,
+        'cache': 'off',
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'cached_tokens': 0,
+        'ttfb': None,
+        'extraction_success': None,
+        'invalid_outputs': [],
+        'repair_attempts': 0
+    }
+
+
+@contextlib.contextmanager
+def call_span(config_name: str, stage: Optional[str] = None):
+    """
+    Collect the telemetry record of one LLM call made inside the block.
+
+    The record is emitted to the sink when the block ends; an exception
+    marks it as failed and is re-raised.
+
+    Args:
+        config_name: Prompt configuration name
+        stage: Pipeline stage (default: the configuration name)
+
+    Yields:
+        The record, which the caller may complete with update_call()
+    """
+    record = _new_record(config_name, stage)
+    token = _CURRENT_CALL.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+        raise
+    finally:
+        _CURRENT_CALL.reset(token)
+        record['duration'] = time.perf_counter() - start
+        sink = get_telemetry_sink()
+        if sink:
+            sink.emit(record)
+
+
+def record_call(config_name: str, stage: Optional[str] = None, **fields: Any) -> None:
+    """
+    Emit the record of a call that was not timed by call_span, e.g. a batch job request.
+
+    Args:
+        config_name: Prompt configuration name
+        stage: Pipeline stage (default: the configuration name)
+        **fields: Record fields to set
+    """
+    sink = get_telemetry_sink()
+    if sink:
+        record = _new_record(config_name, stage)
+        record.update(fields)
+        sink.emit(record)
+
+
+def update_call(**fields: Any) -> None:
+    """
+    Set fields of the record of the call in progress (no-op outside a call).
+    """
+    record = _CURRENT_CALL.get()
+    if record is not None:
+        with _RECORD_LOCK:
+            record.update(fields)
+
+
+def _add(field: str, amount: float) -> None:
+    record = _CURRENT_CALL.get()
+    if record is not None:
+        with _RECORD_LOCK:
+            record[field] += amount
+
+
+def note_queue_wait(seconds: float) -> None:
+    """
+    Add time spent waiting for a concurrency or rate limit slot.
+    """
+    _add('queue_wait', seconds)
+
+
+def note_request(latency: float) -> None:
+    """
+    Count one API request attempt and its network latency.
+    """
+    _add('requests', 1)
+    _add('latency', latency)
+
+
+def note_latency(seconds: float) -> None:
+    """
+    Add network time outside the request attempt, e.g. reading a stream.
+    """
+    _add('latency', seconds)
+
+
+def note_retry() -> None:
+    """
+    Count a retried request attempt.
+    """
+    _add('retries', 1)
+
+
+def note_cache(outcome: str) -> None:
+    """
+    Record the cache outcome of the call ('hit', 'miss', 'single_flight', 'cassette').
+
+    The first outcome wins, so follow-up requests such as repairs do not
+    overwrite the outcome of the main request.
+    """
+    record = _CURRENT_CALL.get()
+    if record is not None:
+        with _RECORD_LOCK:
+            if record['cache'] == 'off':
+                record['cache'] = outcome
+
+
+def note_usage(usage: Any) -> None:
+    """
+    Add the token usage reported by the API for one request.
+
+    Args:
+        usage: `usage` of a chat completion (object or dict), may be None
+    """
+    if usage is None or _CURRENT_CALL.get() is None:
+        return
+
+    def field(name):
+        value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        return value or 0
+
+    _add('prompt_tokens', field('prompt_tokens'))
+    _add('completion_tokens', field('completion_tokens'))
+    _add('cached_tokens', get_cached_tokens(usage))
+
+
+def _emit_span(record: Dict[str, Any]) -> None:
+    """
+    Emit a record as an OpenTelemetry span through the globally configured tracer provider.
+    """
+    otel_trace = _otel_trace()
+    tracer = otel_trace.get_tracer('bpmn.llm')
+    start_ns = int(record['timestamp'] * 1e9)
+    span = tracer.start_span(f"llm {record['stage']}", start_time=start_ns)
+    attributes = {
+        'gen_ai.operation.name': 'chat',
+        'gen_ai.request.model': record['model'] or '',
+        'gen_ai.usage.input_tokens': record['prompt_tokens'],
+        'gen_ai.usage.output_tokens': record['completion_tokens'],
+    }
+    for key in ('run_id', 'config_name', 'stage', 'queue_wait', 'latency', 'requests',
+                'retries', 'cache', 'cached_tokens', 'extraction_success', 'repair_attempts'):
+        if record[key] is not None:
+            attributes[f'llm.{key}'] = record[key]
+    span.set_attributes(attributes)
+    if record['status'] == 'error':
+        span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, record['error']))
+    span.end(end_time=start_ns + int((record['duration'] or 0) * 1e9))
+
+
+def load_records(path: str, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Read call records from a JSONL sink.
+
+    Args:
+        path: JSONL file path
+        run_id: Only keep records of this run; 'last' selects the most recent run
+
+    Returns:
+        List of records
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if run_id == 'last' and records:
+        run_id = records[-1]['run_id']
+    if run_id:
+        records = [record for record in records if record['run_id'] == run_id]
+    return records
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile, None for no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate call records per stage.
+
+    Args:
+        records: Call records
+
+    Returns:
+        Mapping of stage to call count, duration and latency percentiles,
+        token totals, cache hits, retries and extraction success rate
+    """
+    stages = defaultdict(list)
+    for record in records:
+        stages[record['stage']].append(record)
+    summary = {}
+    for stage, stage_records in stages.items():
+        durations = [r['duration'] for r in stage_records if r.get('duration') is not None]
+        latencies = [r['latency'] for r in stage_records if r.get('requests')]
+        extracted = [r['extraction_success'] for r in stage_records
+                     if r.get('extraction_success') is not None]
+        summary[stage] = {
+            'calls': len(stage_records),
+            'errors': sum(1 for r in stage_records if r['status'] != 'ok'),
+            'duration_p50': percentile(durations, 50),
+            'duration_p95': percentile(durations, 95),
+            'duration_p99': percentile(durations, 99),
+            'latency_p50': percentile(latencies, 50),
+            'latency_p95': percentile(latencies, 95),
+            'latency_p99': percentile(latencies, 99),
+            'queue_wait': sum(r.get('queue_wait') or 0 for r in stage_records),
+            'prompt_tokens': sum(r.get('prompt_tokens') or 0 for r in stage_records),
+            'completion_tokens': sum(r.get('completion_tokens') or 0 for r in stage_records),
+            'cached_tokens': sum(r.get('cached_tokens') or 0 for r in stage_records),
+            'cache_hits': sum(1 for r in stage_records if r.get('cache') in ('hit', 'single_flight', 'cassette')),
+            'retries': sum(r.get('retries') or 0 for r in stage_records),
+            'extraction_rate': sum(extracted) / len(extracted) if extracted else None
+        }
+    return summary
+
+
+def _seconds(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value:.2f}s"
+
+
+def print_summary(summary: Dict[str, Dict[str, Any]], metric: str = 'duration') -> None:
+    """
+    Print a per-stage summary as produced by summarize().
+
+    Args:
+        summary: Per-stage summary
+        metric: Percentiles to show, 'duration' (whole call including queueing,
+            retries and repairs) or 'latency' (network time only)
+    """
+    if not summary:
+        print("No telemetry records")
+        return
+    print(f"{metric.capitalize()} percentiles per stage:")
+    header = (f"{'stage':<14}{'calls':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}"
+              f"{'queue':>9}{'prompt':>10}{'complet.':>10}{'cached':>9}{'hits':>6}"
+              f"{'retry':>6}{'extract':>9}")
+    print(header)
+    print('-' * len(header))
+    totals = defaultdict(float)
+    for stage, stats in sorted(summary.items()):
+        rate = '-' if stats['extraction_rate'] is None else f"{100 * stats['extraction_rate']:.0f}%"
+        print(f"{stage[:13]:<14}{stats['calls']:>6}{stats['errors']:>5}"
+              f"{_seconds(stats[f'{metric}_p50']):>9}{_seconds(stats[f'{metric}_p95']):>9}"
+              f"{_seconds(stats[f'{metric}_p99']):>9}{_seconds(stats['queue_wait']):>9}"
+              f"{stats['prompt_tokens']:>10}{stats['completion_tokens']:>10}{stats['cached_tokens']:>9}"
+              f"{stats['cache_hits']:>6}{stats['retries']:>6}{rate:>9}")
+        for key in ('calls', 'prompt_tokens', 'completion_tokens', 'cached_tokens'):
+            totals[key] += stats[key]
+    print(f"Total: {int(totals['calls'])} calls, {int(totals['prompt_tokens'])} prompt tokens "
+          f"({int(totals['cached_tokens'])} cached), {int(totals['completion_tokens'])} completion tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize LLM call telemetry per stage')
+    parser.add_argument('path', nargs='?', help='Telemetry JSONL file (default: TELEMETRY.PATH)')
+    parser.add_argument('--run', help="Run id or batch job id to summarize, 'last' for the latest run")
+    parser.add_argument('--latency', action='store_true',
+                        help='Show network latency instead of call duration percentiles')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    path = args.path or get_telemetry_path()
+    summary = summarize(load_records(str(path), args.run))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print_summary(summary, 'latency' if args.latency else 'duration')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+"""
+Compiled prompt templates for utils/agent.
+
+A prompt configuration (name, variables, prompt, output and optional format)
+is validated and compiled once into a PromptTemplate: the task header and the
+"Output format requirements" block are rendered ahead of time and the prompt
+is split into literal segments and $VARIABLE placeholders. Rendering then
+serializes each input variable once and joins the pieces in a single pass.
+
+A configuration's pipeline stage (used for model routing) is its optional
+`stage` field, or the file name without .json for configuration files.
+
+Templates loaded from files are cached by path and modification time, so an
+edited configuration is picked up on the next call. In-memory configurations
+(e.g. the extra.message sub-config of task.json) are cached by content.
+"""
+
+import copy
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from utils.tokens import estimate_tokens, truncate_list, truncate_text
+
+
+REQUIRED_FIELDS = ['name', 'variables', 'prompt', 'output']
+
+PROMPT_LAYOUTS = ('input_first', 'static_first')
+
+_FILE_TEMPLATES = {}
+_CONFIG_TEMPLATES = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def serialize_variable(value: Any, compact: bool = False) -> str:
+    """
+    Convert an input variable to the text injected into a prompt.
+
+    Args:
+        value: Input variable value
+        compact: Serialize JSON without indentation and spaces
+
+    Returns:
+        Strings as-is, other values as (indented or compact) JSON
+    """
+    if isinstance(value, str):
+        return value
+    if compact:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(value, ensure_ascii=False, indent=2)
+
+
+def _serialize_within(value: Any, compact: bool, max_tokens: int, truncation: str) -> str:
+    """
+    Serialize a variable, truncating it to max_tokens tokens when a limit is set.
+    """
+    text = serialize_variable(value, compact)
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return text
+    if isinstance(value, list):
+        # Drop whole items so the injected JSON stays valid
+        kept = truncate_list(value, max_tokens, truncation,
+                             lambda items: serialize_variable(items, compact))
+        print(f"Truncated input list from {len(value)} to {len(kept)} items "
+              f"to fit {max_tokens} tokens")
+        return serialize_variable(kept, compact)
+    return truncate_text(text, max_tokens, truncation)
+
+
+def build_format_block(format_info: Dict[str, Any]) -> str:
+    """
+    Render the "Output format requirements" block of a configuration.
+
+    Args:
+        format_info: The configuration's format section
+
+    Returns:
+        Format requirements text appended to the prompt
+    """
+    lines = ["\n\nOutput format requirements:\n"]
+    for key, value in format_info.items():
+        if isinstance(value, str):
+            lines.append(f"- {key}: {value}\n")
+        elif isinstance(value, list):
+            lines.append(f"- {key}: {', '.join(value)}\n")
+        elif isinstance(value, dict):
+            lines.append(f"- {key}:\n")
+            for sub_key, sub_value in value.items():
+                lines.append(f"  - {sub_key}: {sub_value}\n")
+    return ''.join(lines)
+
+
+class PromptTemplate:
+    """
+    Validated, pre-segmented prompt configuration
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Compile a prompt configuration.
+
+        Args:
+            config: Configuration dictionary
+        """
+        for field in REQUIRED_FIELDS:
+            if field not in config:
+                raise ValueError(
+                    f"Configuration file missing required field: {field}")
+        self.config = config
+        # Pipeline stage used for model routing, e.g. 'symbol' for symbol.json
+        self.stage = config.get('stage')
+        self.variables = list(config['variables'])
+        self.header = f"Task: {config['name']}\n\n"
+        self.body = config['prompt']
+        if 'format' in config:
+            self.body += build_format_block(config['format'])
+        self._segments = {}
+
+    def _split(self, names: Tuple[str, ...]) -> List[Union[str, Tuple[str]]]:
+        """
+        Split the prompt body into literals and placeholders for the given variable names.
+        """
+        if names not in self._segments:
+            if not names:
+                segments = [self.body]
+            else:
+                # Longest names first so $TASKS is not matched inside $TASKS_DONE
+                alternatives = '|'.join(re.escape(name) for name in
+                                        sorted(names, key=len, reverse=True))
+                segments = []
+                for index, part in enumerate(re.split(rf'\$({alternatives})', self.body)):
+                    # re.split puts captured placeholder names at odd positions
+                    segments.append((part,) if index % 2 else part)
+            self._segments[names] = segments
+        return self._segments[names]
+
+    def render(self, input_variables: Dict[str, Any], compact: bool = False,
+               deduplicate: bool = False, token_limits: Optional[Dict[str, int]] = None,
+               truncation: str = 'middle', layout: str = 'input_first') -> str:
+        """
+        Render the complete prompt.
+
+        Args:
+            input_variables: Input variable dictionary
+            compact: Serialize non-string variables as compact JSON
+            deduplicate: Inject each variable listed in the "Input variables"
+                block only there and refer to it from $VARIABLE placeholders
+            token_limits: Maximum tokens per variable name ('*' applies to all)
+            truncation: Truncation policy for oversized variables ('head', 'tail', 'middle')
+            layout: 'input_first' puts the "Input variables" block before the
+                instructions; 'static_first' puts the static instructions and
+                format rules first so requests share a cacheable prefix
+
+        Returns:
+            Complete prompt text
+        """
+        return self.render_with_usage(
+            input_variables, compact, deduplicate, token_limits, truncation, layout)[0]
+
+    def render_with_usage(self, input_variables: Dict[str, Any], compact: bool = False,
+                          deduplicate: bool = False, token_limits: Optional[Dict[str, int]] = None,
+                          truncation: str = 'middle',
+                          layout: str = 'input_first') -> Tuple[str, Dict[str, int]]:
+        """
+        Render the complete prompt and count the tokens each variable contributes.
+
+        Args are the same as for render().
+
+        Returns:
+            Tuple of (complete prompt text, mapping of variable name to injected tokens)
+        """
+        if layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Invalid prompt layout: {layout}")
+        missing_vars = [
+            var for var in self.variables if var not in input_variables]
+        if missing_vars:
+            raise ValueError(f"Missing required input variables: {missing_vars}")
+        # Placeholders inside the static prefix only refer to the variable block
+        deduplicate = deduplicate or layout == 'static_first'
+
+        segments = self._split(tuple(sorted(input_variables)))
+        # Only variables that actually appear in the prompt are serialized
+        used = set(self.variables)
+        used.update(segment[0] for segment in segments if isinstance(segment, tuple))
+
+        token_limits = token_limits or {}
+        values = {}
+        for name in used:
+            limit = token_limits.get(name, token_limits.get('*', 0))
+            values[name] = _serialize_within(input_variables[name], compact, limit, truncation)
+
+        injections = dict.fromkeys(values, 0)
+        input_block = ["Input variables:\n"]
+        for var_name in self.variables:
+            input_block.append(f"{var_name}: {values[var_name]}\n")
+            injections[var_name] += 1
+        body = []
+        for segment in segments:
+            if not isinstance(segment, tuple):
+                body.append(segment)
+            elif deduplicate and segment[0] in self.variables:
+                body.append(f"{segment[0]} (see Input variables)")
+            else:
+                body.append(values[segment[0]])
+                injections[segment[0]] += 1
+
+        if layout == 'static_first':
+            parts = [self.header, *body, "\n\n", *input_block]
+        else:
+            parts = [self.header, *input_block, "\n", *body]
+
+        variable_tokens = {name: estimate_tokens(values[name]) * count
+                           for name, count in injections.items() if count}
+        return ''.join(parts), variable_tokens
+
+
+def load_config(file_path: str) -> Dict[str, Any]:
+    """
+    Load configuration from JSON file
+
+    Args:
+        file_path: Configuration file path
+
+    Returns:
+        Configuration dictionary
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            f"Configuration file not found: {file_path}") from exc
+    except json.JSONDecodeError as exc:
+        raise ValueError(
+            f"Configuration file format error: {file_path}") from exc
+
+
+def get_prompt_template(config_source: Union[str, Dict[str, Any]]) -> PromptTemplate:
+    """
+    Get the compiled template of a configuration file or in-memory configuration.
+
+    Args:
+        config_source: Configuration file path or configuration dictionary
+
+    Returns:
+        Compiled PromptTemplate
+    """
+    if isinstance(config_source, dict):
+        key = json.dumps(config_source, ensure_ascii=False, sort_keys=True)
+        with _TEMPLATES_LOCK:
+            template = _CONFIG_TEMPLATES.get(key)
+        if template is None:
+            # Copy so later changes to the caller's dictionary do not leak into the cache
+            template = PromptTemplate(copy.deepcopy(config_source))
+            with _TEMPLATES_LOCK:
+                _CONFIG_TEMPLATES[key] = template
+        return template
+
+    path = os.path.abspath(config_source)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            f"Configuration file not found: {config_source}") from exc
+    with _TEMPLATES_LOCK:
+        cached = _FILE_TEMPLATES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    config = load_config(config_source)
+    config.setdefault('stage', os.path.splitext(os.path.basename(path))[0])
+    template = PromptTemplate(config)
+    with _TEMPLATES_LOCK:
+        _FILE_TEMPLATES[path] = (mtime, template)
+    return template
+
+
+def clear_prompt_templates() -> None:
+    """
+    Drop all compiled templates.
+    """
+    with _TEMPLATES_LOCK:
+        _FILE_TEMPLATES.clear()
+        _CONFIG_TEMPLATES.clear()
@@ -0,0 +1,290 @@
+"""
+Offline prompt token estimation, truncation and per-stage accounting.
+
+Token counts use a character based estimate by default, so accounting never
+needs network access or extra dependencies. Setting PROMPT.TOKENIZER to a
+tiktoken encoding (e.g. "o200k_base") counts exact tokens instead; tiktoken
+must be installed and downloads the encoding on first use unless it is in its
+local cache. Every prompt built by utils/agent is recorded under its
+configuration name; get_token_usage()/print_token_usage() summarize the
+prompt tokens spent per pipeline stage and per injected variable.
+"""
+
+import contextlib
+import contextvars
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.configure import get_prompt_config
+
+# tiktoken encodings by name, None for encodings that could not be loaded
+_ENCODINGS = {}
+_ENCODINGS_LOCK = threading.Lock()
+
+# Average characters per token for English text and JSON without tiktoken
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_POLICIES = ('head', 'tail', 'middle')
+
+_USAGE = {}
+_USAGE_LOCK = threading.Lock()
+
+# Pipeline stage whose LLM call is in progress, for attributing API usage
+_CURRENT_STAGE = contextvars.ContextVar('llm_stage', default='unattributed')
+
+
+def _load_encoding(name: str):
+    """
+    Load a tiktoken encoding, None if tiktoken is missing or the encoding cannot be loaded.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        print(f"Error:PROMPT.TOKENIZER {name} requires tiktoken, estimating tokens instead")
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except (ValueError, OSError) as e:
+        # Unknown encoding, corrupt cache file or failed download
+        print(f"Error:cannot load tiktoken encoding {name}, estimating tokens instead: {e}")
+        return None
+
+
+def _get_encoding():
+    """
+    Get the tiktoken encoding selected by PROMPT.TOKENIZER, None for the estimate.
+    """
+    name = get_prompt_config("TOKENIZER")
+    if not name or name == 'estimate':
+        return None
+    if name not in _ENCODINGS:
+        with _ENCODINGS_LOCK:
+            if name not in _ENCODINGS:
+                _ENCODINGS[name] = _load_encoding(name)
+    return _ENCODINGS[name]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Token count (exact with tiktoken, estimated otherwise)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_text(text: str, max_tokens: int, policy: str = 'middle') -> str:
+    """
+    Shorten a text to about max_tokens tokens.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token budget
+        policy: 'head' keeps the beginning, 'tail' the end, 'middle' both ends
+
+    Returns:
+        Text within the budget, with a marker where content was removed
+    """
+    if policy not in TRUNCATION_POLICIES:
+        raise ValueError(f"Invalid truncation policy: {policy}")
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    # Work in characters so the result does not depend on the tokenizer
+    keep = max(int(len(text) * max_tokens / tokens), 0)
+    marker = f"\n...[truncated {tokens - max_tokens} tokens]...\n"
+    if policy == 'head':
+        return text[:keep] + marker
+    if policy == 'tail':
+        return marker + text[len(text) - keep:]
+    return text[:keep // 2] + marker + text[len(text) - (keep - keep // 2):]
+
+
+def truncate_list(items: List[Any], max_tokens: int, policy: str, serialize) -> List[Any]:
+    """
+    Drop whole list items until the serialized list fits the budget.
+
+    Keeping items intact preserves valid JSON for list inputs such as task
+    lists and control flows.
+
+    Args:
+        items: List value of an input variable
+        max_tokens: Token budget
+        policy: 'head' keeps the first items, 'tail' the last, 'middle' both ends
+        serialize: Function turning the list into prompt text
+
+    Returns:
+        Shortened list
+    """
+    if policy not in TRUNCATION_POLICIES:
+        raise ValueError(f"Invalid truncation policy: {policy}")
+    low, high = 0, len(items)
+    # Binary search for the largest number of items that fits
+    while low < high:
+        count = (low + high + 1) // 2
+        if estimate_tokens(serialize(_keep_items(items, count, policy))) <= max_tokens:
+            low = count
+        else:
+            high = count - 1
+    return _keep_items(items, low, policy)
+
+
+def _keep_items(items: List[Any], count: int, policy: str) -> List[Any]:
+    if count >= len(items):
+        return list(items)
+    if policy == 'head':
+        return items[:count]
+    if policy == 'tail':
+        return items[len(items) - count:]
+    return items[:count - count // 2] + items[len(items) - count // 2:]
+
+
+def _new_usage() -> Dict[str, Any]:
+    return {
+        'calls': 0,
+        'prompt_tokens': 0,
+        'variables': {},
+        # Usage reported by the API
+        'requests': 0,
+        'api_prompt_tokens': 0,
+        'cached_tokens': 0,
+        'completion_tokens': 0
+    }
+
+
+@contextlib.contextmanager
+def stage_scope(stage: str):
+    """
+    Attribute API usage recorded inside the block to a pipeline stage.
+
+    Args:
+        stage: Pipeline stage (configuration name)
+    """
+    token = _CURRENT_STAGE.set(stage)
+    try:
+        yield
+    finally:
+        _CURRENT_STAGE.reset(token)
+
+
+def record_prompt_tokens(stage: str, prompt_tokens: int,
+                         variable_tokens: Optional[Dict[str, int]] = None) -> None:
+    """
+    Add a built prompt to the per-stage token accounting.
+
+    Args:
+        stage: Pipeline stage (configuration name)
+        prompt_tokens: Tokens of the complete prompt
+        variable_tokens: Tokens contributed by each injected variable
+    """
+    with _USAGE_LOCK:
+        usage = _USAGE.setdefault(stage, _new_usage())
+        usage['calls'] += 1
+        usage['prompt_tokens'] += prompt_tokens
+        for name, tokens in (variable_tokens or {}).items():
+            usage['variables'][name] = usage['variables'].get(name, 0) + tokens
+
+
+def get_cached_tokens(usage: Any) -> int:
+    """
+    Read the provider-side cached prompt tokens from an API usage object.
+
+    Args:
+        usage: `usage` of a chat completion (object or dict), may be None
+
+    Returns:
+        Number of prompt tokens served from the provider's prompt cache
+    """
+    if usage is None:
+        return 0
+    details = usage.get('prompt_tokens_details') if isinstance(usage, dict) \
+        else getattr(usage, 'prompt_tokens_details', None)
+    if details is None:
+        return 0
+    cached = details.get('cached_tokens') if isinstance(details, dict) \
+        else getattr(details, 'cached_tokens', None)
+    return cached or 0
+
+
+def record_api_usage(usage: Any) -> None:
+    """
+    Add the usage reported by the API for one request to the current stage.
+
+    Args:
+        usage: `usage` of a chat completion (object or dict), may be None
+    """
+    if usage is None:
+        return
+
+    def field(name):
+        value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+        return value or 0
+
+    with _USAGE_LOCK:
+        stats = _USAGE.setdefault(_CURRENT_STAGE.get(), _new_usage())
+        stats['requests'] += 1
+        stats['api_prompt_tokens'] += field('prompt_tokens')
+        stats['completion_tokens'] += field('completion_tokens')
+        stats['cached_tokens'] += get_cached_tokens(usage)
+
+
+def get_token_usage() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the token usage recorded so far.
+
+    Returns:
+        Mapping of stage to {'calls', 'prompt_tokens', 'variables', 'requests',
+        'api_prompt_tokens', 'cached_tokens', 'completion_tokens'}
+    """
+    with _USAGE_LOCK:
+        return {stage: dict(usage, variables=dict(usage['variables']))
+                for stage, usage in _USAGE.items()}
+
+
+def reset_token_usage() -> None:
+    """
+    Clear the recorded token usage.
+    """
+    with _USAGE_LOCK:
+        _USAGE.clear()
+
+
+def print_token_usage() -> None:
+    """
+    Print prompt tokens per stage and per variable, largest stages first,
+    followed by the prompt tokens the provider served from its prompt cache.
+    """
+    usage = get_token_usage()
+    if not usage:
+        return
+    estimator = 'tiktoken' if _get_encoding() is not None else f'~{CHARS_PER_TOKEN} chars/token estimate'
+    print(f"Prompt token usage ({estimator}):")
+    total = 0
+    for stage, stats in sorted(usage.items(), key=lambda item: -item[1]['prompt_tokens']):
+        total += stats['prompt_tokens']
+        variables = ', '.join(f"{name} {tokens}" for name, tokens in
+                              sorted(stats['variables'].items(), key=lambda item: -item[1]))
+        print(f"  {stage}: {stats['prompt_tokens']} tokens in {stats['calls']} call(s)"
+              f"{f' ({variables})' if variables else ''}")
+    print(f"  Total: {total} tokens")
+
+    api_prompt = sum(stats['api_prompt_tokens'] for stats in usage.values())
+    if not api_prompt:
+        return
+    print("Provider prompt cache:")
+    for stage, stats in sorted(usage.items()):
+        if stats['api_prompt_tokens']:
+            print(f"  {stage}: {stats['cached_tokens']}/{stats['api_prompt_tokens']} prompt tokens cached "
+                  f"({100 * stats['cached_tokens'] / stats['api_prompt_tokens']:.0f}%) in "
+                  f"{stats['requests']} request(s)")
+    cached = sum(stats['cached_tokens'] for stats in usage.values())
+    print(f"  Total: {cached}/{api_prompt} prompt tokens cached ({100 * cached / api_prompt:.0f}%)")
@@ -0,0 +1,46 @@
+"""
+Context-scoped workspaces for running several pipelines in one process.
+
+The workplace directory and the run options (dump, configuration overrides,
+telemetry run id) are normally process-wide. workspace() scopes them to the current context
+instead: the calling thread or asyncio task, and every stage thread started
+from it (utils.scheduler runs stages in a copy of the caller's context). Each
+concurrent job can therefore write to its own workplace:
+
+    with workspace('workplace/runs/0001', dump=False):
+        run_pipeline(requirement=text)
+
+Code reading get_workplace(), get_config(), is_dump_enabled() or
+utils.telemetry.get_run_id() picks up the values of the enclosing workspace
+without further changes; telemetry is written to the workspace's own file.
+"""
+
+import contextlib
+import os
+from typing import Any, Dict, Optional
+
+from utils.configure import config_scope, get_workplace
+from utils.dump import dump_scope
+from utils.telemetry import run_id_scope
+
+
+@contextlib.contextmanager
+def workspace(workplace: Optional[str] = None, dump: Optional[bool] = None,
+              overrides: Optional[Dict[str, Any]] = None, run_id: Optional[str] = None):
+    """
+    Use a workplace and run options for the current context inside a with block.
+
+    Args:
+        workplace: Workplace directory (default: unchanged)
+        dump: Enable or disable dump (default: unchanged)
+        overrides: Further configuration overrides (see utils.configure.override_config)
+        run_id: Telemetry run id of the calls made inside (default: unchanged)
+
+    Yields:
+        Path to the workplace directory in effect
+    """
+    overrides = dict(overrides or {})
+    if workplace is not None:
+        overrides["WORKPLACE"] = os.path.abspath(workplace)
+    with config_scope(overrides), dump_scope(dump), run_id_scope(run_id):
+        yield get_workplace()
@@ -100,9 +100,18 @@ class MultiLaneBpmnToPetriNetConverter:
         Returns:
             Dictionary containing lane and message flow information
         """
-        tree = ET.parse(bpmn_file_path)
-        root = tree.getroot()
+        return self.parse_bpmn_root(ET.parse(bpmn_file_path).getroot())
 
+    def parse_bpmn_root(self, root: ET.Element) -> Dict[str, Any]:
+        """
+        Parse an already parsed BPMN document, extract lane and message flow information
+
+        Args:
+            root: Root element of the BPMN document
+
+        Returns:
+            Dictionary containing lane and message flow information
+        """
         # Define BPMN namespace
         bpmn_ns = {'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL'}
 
@@ -373,11 +382,23 @@ class MultiLaneBpmnToPetriNetConverter:
         Args:
             bpmn_file_path: BPMN file path
 
+        Returns:
+            Merged Petri net
+        """
+        return self.convert_bpmn_root_to_petri_net(ET.parse(bpmn_file_path).getroot())
+
+    def convert_bpmn_root_to_petri_net(self, root: ET.Element) -> Dict[str, Any]:
+        """
+        Convert an already parsed collaboration BPMN document to Petri net
+
+        Args:
+            root: Root element of the BPMN document
+
         Returns:
             Merged Petri net
         """
         # Parse BPMN collaboration
-        collaboration_info = self.parse_bpmn_collaboration(bpmn_file_path)
+        collaboration_info = self.parse_bpmn_root(root)
 
         # Create Petri net for each lane
         lane_petri_nets = {}
@@ -398,57 +419,69 @@ class MultiLaneBpmnToPetriNetConverter:
         return merged_petri_net
 
 
-def convert_bpmn_to_petri_net(bpmn_file_path: str):
+def convert_bpmn_root_to_petri_net(root: ET.Element) -> Dict[str, Any]:
     """
-    Convert BPMN to Petri net (supports single process and multi-lane collaboration)
+    Convert a parsed BPMN document to Petri net (supports single process and
+    multi-lane collaboration)
 
     Args:
-        bpmn_file_path: BPMN file path
+        root: Root element of the BPMN document
+
+    Returns:
+        Petri net with places, transitions, arcs and initial_marking
     """
     # Check if it's a collaboration diagram
-    tree = ET.parse(bpmn_file_path)
-    root = tree.getroot()
     bpmn_ns = {'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL'}
-
     collaboration = root.find('.//bpmn:collaboration', bpmn_ns)
 
     if collaboration is not None:
         # Multi-lane collaboration diagram
         print("Collaboration diagram detected, using multi-lane conversion algorithm...")
-        converter = MultiLaneBpmnToPetriNetConverter()
-        petri_net = converter.convert_collaboration_bpmn_to_petri_net(
-            bpmn_file_path)
+    else:
+        # Single process BPMN, treated as collaboration with one lane
+        print("Single process BPMN detected, using simplified conversion...")
+    converter = MultiLaneBpmnToPetriNetConverter()
+    petri_net = converter.convert_bpmn_root_to_petri_net(root)
 
-        print("Conversion completed!")
-        print(f"Number of places: {len(petri_net['places'])}")
-        print(f"Number of transitions: {len(petri_net['transitions'])}")
-        print(f"Number of arcs: {len(petri_net['arcs'])}")
-        print(f"Initial marking: {petri_net['initial_marking']}")
+    print("Conversion completed!")
+    print(f"Number of places: {len(petri_net['places'])}")
+    print(f"Number of transitions: {len(petri_net['transitions'])}")
+    print(f"Number of arcs: {len(petri_net['arcs'])}")
+    print(f"Initial marking: {petri_net['initial_marking']}")
+    return petri_net
 
-        # Save results as PNML
-        output_file = bpmn_file_path.replace('.bpmn', '_petri_net.pnml')
-        save_petri_net_as_pnml(petri_net, output_file)
-        print(f"Petri net saved to: {output_file}")
 
-    else:
-        # Single process BPMN
-        print("Single process BPMN detected, using simplified conversion...")
-        # Implement simplified single process conversion logic
-        converter = MultiLaneBpmnToPetriNetConverter()
-        # Treat single process as collaboration with one lane
-        petri_net = converter.convert_collaboration_bpmn_to_petri_net(
-            bpmn_file_path)
-
-        print("Conversion completed!")
-        print(f"Number of places: {len(petri_net['places'])}")
-        print(f"Number of transitions: {len(petri_net['transitions'])}")
-        print(f"Number of arcs: {len(petri_net['arcs'])}")
-        print(f"Initial marking: {petri_net['initial_marking']}")
-
-        # Save results as PNML
-        output_file = bpmn_file_path.replace('.bpmn', '_petri_net.pnml')
-        save_petri_net_as_pnml(petri_net, output_file)
-        print(f"Petri net saved to: {output_file}")
+def build_petri_net(bpmn_xml: str) -> Dict[str, Any]:
+    """
+    Convert BPMN XML held in memory to Petri net, without reading or writing files
+
+    Args:
+        bpmn_xml: BPMN 2.0 XML string
+
+    Returns:
+        Petri net with places, transitions, arcs and initial_marking
+    """
+    return convert_bpmn_root_to_petri_net(ET.fromstring(bpmn_xml))
+
+
+def convert_bpmn_to_petri_net(bpmn_file_path: str):
+    """
+    Convert BPMN to Petri net (supports single process and multi-lane collaboration)
+
+    Args:
+        bpmn_file_path: BPMN file path
+
+    Returns:
+        Path to the saved PNML file
+    """
+    petri_net = convert_bpmn_root_to_petri_net(ET.parse(bpmn_file_path).getroot())
+
+    # Save results as PNML
+    output_file = bpmn_file_path.replace('.bpmn', '_petri_net.pnml')
+    save_petri_net_as_pnml(petri_net, output_file)
+    print(f"Petri net saved to: {output_file}")
+
+    return output_file
 
 
 if __name__ == "__main__":
@@ -8,30 +8,14 @@ and existing symbol and flow data for formal verification.
 import json
 import os
 import xml.etree.ElementTree as ET
-from utils.agent import generate_prompt_from_config
-from utils.configure import get_workplace
+from utils.agent import generate_prompt_from_config, single_flight_run
+from utils.configure import get_workplace, get_verification_config_path, get_output_file_name
 from utils.load_requirement import get_reqstring
-from utils.dump import get_data_from_file_or_generate, save_result
+from utils.dump import get_data_from_file_or_generate, is_dump_enabled, save_result
 from generation.symbol import get_symbol_data
 from generation.seq import generate_sequence
 
 
-# Configuration paths loaded from configure.yml
-from utils.configure import get_verification_config_path, get_output_file_name
-
-CTL_CONFIG_PATH = get_verification_config_path(
-    "CTL_CONFIG_PATH") or "verification/config/ctl.json"
-CTL_OUTPUT_FILE = get_output_file_name("CTL_OUTPUT_FILE") or "ctl_output.json"
-SYMBOL_OUTPUT_FILE = get_output_file_name(
-    "SYMBOL_OUTPUT_FILE") or "symbol_output.json"
-SEQ_OUTPUT_FILE = get_output_file_name("SEQ_OUTPUT_FILE") or "seq_output.json"
-STANDARD_CTL_CONSTRAINTS_FILE = get_output_file_name(
-    "STANDARD_CTL_CONSTRAINTS_FILE") or "standard_ctl_constraints.json"
-DEFAULT_PETRI_NET_FILE = get_verification_config_path(
-    "DEFAULT_PETRI_NET_FILE") or "bpmn_output_petri_net.pnml"
-ENABLE_DUMP = True
-
-
 def get_ctl_data():
     """
     Get CTL data either from file or by generating.
@@ -39,7 +23,7 @@ def get_ctl_data():
     Returns:
         Dictionary containing CTL constraints data
     """
-    return get_data_from_file_or_generate(CTL_OUTPUT_FILE, generate_ctl, "CTL data")
+    return get_data_from_file_or_generate(get_output_file_name("CTL_OUTPUT_FILE"), generate_ctl, "CTL data")
 
 
 def get_symbol_data_for_ctl():
@@ -49,10 +33,10 @@ def get_symbol_data_for_ctl():
     Returns:
         Dictionary containing symbol data
     """
-    if ENABLE_DUMP:
+    if is_dump_enabled():
         # Read from existing file
         workplace = get_workplace()
-        symbol_file_path = os.path.join(workplace, SYMBOL_OUTPUT_FILE)
+        symbol_file_path = os.path.join(workplace, get_output_file_name("SYMBOL_OUTPUT_FILE"))
 
         try:
             with open(symbol_file_path, 'r', encoding='utf-8') as f:
@@ -74,10 +58,10 @@ def get_flow_data_for_ctl():
     Returns:
         Dictionary containing flow data
     """
-    if ENABLE_DUMP:
+    if is_dump_enabled():
         # Read from existing file
         workplace = get_workplace()
-        seq_file_path = os.path.join(workplace, SEQ_OUTPUT_FILE)
+        seq_file_path = os.path.join(workplace, get_output_file_name("SEQ_OUTPUT_FILE"))
 
         try:
             with open(seq_file_path, 'r', encoding='utf-8') as f:
@@ -170,31 +154,44 @@ def validate_and_format_ctl_constraints(ctl_constraints, symbol_data):
     return formatted_constraints
 
 
-def generate_ctl():
+def generate_ctl(requirement=None, symbol_data=None, flow_data=None, dump=None):
     """
     Generate CTL constraints from requirements, symbol table, and flow data.
 
+    Args:
+        requirement: Requirement text to avoid reloading it
+        symbol_data: Pre-generated symbol data to avoid duplicate calls
+        flow_data: Pre-generated sequence data to avoid duplicate calls
+        dump: Save the full result to the workplace (default: is_dump_enabled())
+
     Returns:
         Dictionary containing extracted CTL constraints
     """
-    # Get requirement string
-    requirement = get_reqstring()
+    # Get requirement string - use provided text or load it
+    if requirement is None:
+        requirement = get_reqstring()
 
-    # Get symbol data
-    symbol_result = get_symbol_data_for_ctl()
+    # Get symbol data - use provided data or get from file/generate
+    if symbol_data is not None:
+        symbol_result = symbol_data
+    else:
+        symbol_result = get_symbol_data_for_ctl()
 
-    # Get flow data
-    flow_result = get_flow_data_for_ctl()
+    # Get flow data - use provided data or get from file/generate
+    if flow_data is not None:
+        flow_result = flow_data
+    else:
+        flow_result = get_flow_data_for_ctl()
 
     # Prepare input variables
     input_vars = {
         "REQUIREMENT": requirement,
-        "SYMBOL": json.dumps(symbol_result, ensure_ascii=False, indent=2),
-        "FLOW": json.dumps(flow_result, ensure_ascii=False, indent=2)
+        "SYMBOL": symbol_result,
+        "FLOW": flow_result
     }
 
     # Generate CTL output using agent
-    result = generate_prompt_from_config(CTL_CONFIG_PATH, input_vars)
+    result = generate_prompt_from_config(get_verification_config_path("CTL_CONFIG_PATH"), input_vars)
 
     # Extract the output and validate format
     extracted_output = result.get('extracted_output', {})
@@ -206,7 +203,7 @@ def generate_ctl():
         )
 
     # Save results
-    save_result(result, CTL_OUTPUT_FILE, "CTL generation")
+    save_result(result, get_output_file_name("CTL_OUTPUT_FILE"), "CTL generation", dump=dump)
 
     print("Extracted output:")
     print(json.dumps(extracted_output, ensure_ascii=False, indent=2))
@@ -214,6 +211,7 @@ def generate_ctl():
     return extracted_output
 
 
+@single_flight_run()
 def generate_ctl_with_dependencies():
     """
     Generate CTL constraints with proper dependency handling.
@@ -246,7 +244,7 @@ def generate_ctl_with_dependencies():
     return ctl_result
 
 
-def transform_ctl_on_pt(petri_net_path=None):
+def transform_ctl_on_pt(petri_net_path=None, symbol_data=None, petri_net=None):
     """
     Transform CTL constraints to work with Petri net places.
 
@@ -259,6 +257,9 @@ def transform_ctl_on_pt(petri_net_path=None):
     Args:
         petri_net_path: Path to the Petri net PNML file (output of bpmn_to_pt.py). 
                        If None, uses default path: workplace/bpmn_output_petri_net.pnml
+        symbol_data: Pre-generated symbol data to avoid reloading it
+        petri_net: Petri net returned by bpmn_to_pt.build_petri_net, used instead
+                   of reading the PNML file
 
     Returns:
         Dictionary containing variable substitution expressions E = {(s_k, e_k)}
@@ -266,16 +267,20 @@ def transform_ctl_on_pt(petri_net_path=None):
     # Initialize substitution expressions set
     E = {}
 
-    # Load Petri net data
-    if petri_net_path is None:
-        workplace = get_workplace()
-        petri_net_path = os.path.join(workplace, DEFAULT_PETRI_NET_FILE)
+    if petri_net is not None:
+        petri_net_data = petri_net_to_data(petri_net)
+    else:
+        # Load Petri net data
+        if petri_net_path is None:
+            workplace = get_workplace()
+            petri_net_path = os.path.join(workplace, get_verification_config_path("DEFAULT_PETRI_NET_FILE"))
 
-    # Load Petri net structure (assuming it's in a structured format)
-    petri_net_data = load_petri_net(petri_net_path)
+        # Load Petri net structure (assuming it's in a structured format)
+        petri_net_data = load_petri_net(petri_net_path)
 
-    # Get BPMN symbols from symbol data
-    symbol_data = get_symbol_data_for_ctl()
+    # Get BPMN symbols from symbol data - use provided data or get from file/generate
+    if symbol_data is None:
+        symbol_data = get_symbol_data_for_ctl()
     bpmn_symbols = extract_bpmn_symbols(symbol_data)
 
     # For each BPMN symbol s_k
@@ -380,6 +385,24 @@ def load_petri_net(petri_net_path):
         return {}
 
 
+def petri_net_to_data(petri_net):
+    """
+    Convert a Petri net as built by bpmn_to_pt.py to the structure of load_petri_net.
+
+    Args:
+        petri_net: Petri net with places, transitions and arcs lists
+
+    Returns:
+        Dictionary containing Petri net structure as returned by load_petri_net
+    """
+    return {
+        'transitions': {t: {'id': t, 'name': t} for t in petri_net.get('transitions', [])},
+        'places': {p: {'id': p, 'name': p} for p in petri_net.get('places', [])},
+        'arcs': {f"arc_{i}": {'id': f"arc_{i}", 'source': arc['source'], 'target': arc['target']}
+                 for i, arc in enumerate(petri_net.get('arcs', []))}
+    }
+
+
 def extract_bpmn_symbols(symbol_data):
     """
     Extract BPMN symbols from symbol data.
@@ -461,19 +484,21 @@ def get_post_places(transition_id, petri_net_data):
     return post_places
 
 
-def apply_ctl_transformation(ctl_constraints, petri_net_path=None):
+def apply_ctl_transformation(ctl_constraints, petri_net_path=None, symbol_data=None, petri_net=None):
     """
     Apply CTL transformation to work with Petri net places.
 
     Args:
         ctl_constraints: Original CTL constraints (list of dictionaries)
         petri_net_path: Path to Petri net PNML file
+        symbol_data: Pre-generated symbol data to avoid reloading it
+        petri_net: In-memory Petri net from bpmn_to_pt.build_petri_net instead of the PNML file
 
     Returns:
         Transformed CTL constraints suitable for Petri net verification
     """
     # Get variable substitution expressions
-    substitutions = transform_ctl_on_pt(petri_net_path)
+    substitutions = transform_ctl_on_pt(petri_net_path, symbol_data, petri_net)
 
     # Transform CTL constraints by replacing BPMN symbols with Petri net places
     transformed_constraints = []
@@ -513,7 +538,7 @@ def save_standard_ctl_constraints(constraints_list, output_file=None):
 
     if output_file is None:
         workplace = get_workplace()
-        output_file = os.path.join(workplace, STANDARD_CTL_CONSTRAINTS_FILE)
+        output_file = os.path.join(workplace, get_output_file_name("STANDARD_CTL_CONSTRAINTS_FILE"))
 
     standard_output = {
         "metadata": {
@@ -567,7 +592,7 @@ if __name__ == '__main__':
             # Transform CTL constraints for Petri net verification
             # Uses the same output file as bpmn_to_pt.py
             workplace = get_workplace()
-            petri_net_path = os.path.join(workplace, DEFAULT_PETRI_NET_FILE)
+            petri_net_path = os.path.join(workplace, get_verification_config_path("DEFAULT_PETRI_NET_FILE"))
 
             print(f"\nLooking for Petri net file: {petri_net_path}")
             if os.path.exists(petri_net_path):